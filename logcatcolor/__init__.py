@@ -0,0 +1,14 @@
+"""
+logcat-color
+
+Copyright 2012, Marshall Culpepper
+Licensed under the Apache License, Version 2.0
+"""
+__all__ = ["aiter_records", "iter_records"]
+
+def __getattr__(name):
+    # records is only imported when it is used, not by every run of the cli
+    if name in __all__:
+        from logcatcolor import records
+        return getattr(records, name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -0,0 +1,342 @@
+"""
+logcat-color
+
+Copyright 2012, Marshall Culpepper
+Licensed under the Apache License, Version 2.0
+
+A broker that reads one logcat stream and serves it to any number of
+subscribers over a Unix domain socket.
+
+A subscriber connects and sends a single JSON line:
+
+    {"profile": "name or null", "layout": "brief", "width": 120}
+
+The broker answers with {"ok": true} (or {"error": "..."} before closing the
+connection), and from then on sends the lines the profile includes, rendered
+with the layout. Every line is parsed once, and each distinct profile is
+evaluated once per line however many subscribers use it. The json layout
+ships the parsed records for other tools to process.
+"""
+from __future__ import unicode_literals
+from logcatcolor.layout import Layout
+from logcatcolor.profile import Profile
+from logcatcolor.reader import LogcatReader, ThreadedLogcatReader
+from logcatcolor.sink import Sink
+import json
+import os
+import socket
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+DEFAULT_LAYOUT = "brief"
+
+class Subscriber(Sink):
+    """A sink that renders into batches, which are sent to the subscriber's
+    socket by a thread of its own. Batches are kept in a bounded queue, when
+    the subscriber falls that far behind new batches are dropped rather than
+    slowing down the broker and the other subscribers, and it is sent a
+    marker with the number of lines it missed once it catches up."""
+    DEFAULT_QUEUE_SIZE = 64
+    DROPPED_MARKER = LogcatReader.DROPPED_MARKER
+    CLOSE_TIMEOUT = 1.0
+
+    def __init__(self, sock, layout, profile=None, config=None, width=2000,
+                 queue_size=DEFAULT_QUEUE_SIZE, on_close=None):
+        Sink.__init__(self, self, layout, profile=profile, config=config,
+                      width=width)
+        self.sock = sock
+        self.queue = queue.Queue(queue_size)
+        self.on_close = on_close
+        self.chunks = []
+        self.dropped = 0
+        self.lines_dropped = 0
+        self.closed = False
+
+        self.thread = threading.Thread(target=self.send_chunks)
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def write(self, data):
+        self.chunks.append(data)
+
+    def flush(self):
+        # lines are sent once per batch, by send()
+        pass
+
+    def send(self):
+        if not self.chunks or self.closed:
+            self.chunks = []
+            return
+
+        chunk = b"".join(self.chunks)
+        self.chunks = []
+        try:
+            if self.dropped:
+                self.queue.put_nowait(self.dropped_marker(self.dropped))
+                self.dropped = 0
+            self.queue.put_nowait(chunk)
+        except queue.Full:
+            lines = chunk.count(b"\n")
+            self.dropped += lines
+            self.lines_dropped += lines
+
+    def dropped_marker(self, dropped):
+        result = self.layout.layout_marker(self.DROPPED_MARKER % dropped)
+        if not result:
+            return b""
+        return (result + "\n").encode("utf-8", self.encode_errors)
+
+    def send_chunks(self):
+        try:
+            while True:
+                chunk = self.queue.get()
+                if chunk is None:
+                    break
+                self.sock.sendall(chunk)
+        except (IOError, OSError):
+            # the subscriber went away
+            pass
+        finally:
+            self.closed = True
+            try:
+                self.sock.close()
+            except (IOError, OSError):
+                pass
+            if self.on_close:
+                self.on_close(self)
+
+    def close(self):
+        # the subscriber gets what is already queued if it keeps up, a stuck
+        # subscriber doesn't hold up shutting down
+        try:
+            self.queue.put(None, timeout=self.CLOSE_TIMEOUT)
+        except queue.Full:
+            self.closed = True
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except (IOError, OSError):
+                pass
+        if self.thread.is_alive():
+            self.thread.join(self.CLOSE_TIMEOUT)
+
+class BrokerReader(ThreadedLogcatReader):
+    """Parses the logcat stream once and renders it for every subscriber,
+    without any output of its own. Subscribers are added and removed by
+    other threads, and swapped in before the next line is processed."""
+
+    def __init__(self, file, config, format=None, stats=None, recorder=None):
+        self.pending_sinks = None
+        ThreadedLogcatReader.__init__(self, file, config, format=format,
+                                      stats=stats, recorder=recorder,
+                                      writer=NullWriter())
+
+    def set_subscribers(self, subscribers):
+        self.pending_sinks = list(subscribers)
+
+    def apply_sinks(self):
+        self.sinks, self.pending_sinks = self.pending_sinks, None
+        self.decode_errors = self.DECODE_ERRORS
+        for sink in self.sinks:
+            if sink.layout.DECODE_ERRORS == "surrogateescape":
+                self.decode_errors = "surrogateescape"
+        self.init_routes()
+
+    def process_line(self, line):
+        if self.pending_sinks is not None:
+            self.apply_sinks()
+        ThreadedLogcatReader.process_line(self, line)
+
+    def output_data(self, data, timer=None):
+        pass
+
+    def render_marker(self, line):
+        pass
+
+    def send_batch(self):
+        for sink in self.sinks:
+            sink.send()
+
+class NullWriter(object):
+    def write(self, data):
+        pass
+
+    def flush(self):
+        pass
+
+class Broker(threading.Thread):
+    """Accepts subscribers on a Unix domain socket, and hands them to the
+    reader of the current logcat connection. Subscribers stay subscribed
+    across reconnections to the device."""
+    HANDSHAKE_TIMEOUT = 5.0
+    MAX_REQUEST_SIZE = 4096
+
+    def __init__(self, path, config, queue_size=Subscriber.DEFAULT_QUEUE_SIZE):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.path = path
+        self.config = config
+        self.queue_size = queue_size
+        self.reader = None
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.server = self.listen(path)
+
+    @staticmethod
+    def listen(path):
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except (IOError, OSError):
+                # left behind by a broker that is gone
+                os.unlink(path)
+            else:
+                raise ValueError("A broker is already serving %s" % path)
+            finally:
+                probe.close()
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen(16)
+        return server
+
+    def attach(self, reader):
+        with self.lock:
+            self.reader = reader
+            reader.set_subscribers(self.subscribers)
+
+    def reload(self, config):
+        with self.lock:
+            self.config = config
+
+    def add(self, subscriber):
+        with self.lock:
+            self.subscribers.append(subscriber)
+            if self.reader is not None:
+                self.reader.set_subscribers(self.subscribers)
+
+    def remove(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+            if self.reader is not None:
+                self.reader.set_subscribers(self.subscribers)
+
+    def run(self):
+        while True:
+            try:
+                sock, address = self.server.accept()
+            except (IOError, OSError):
+                # the server socket was closed
+                break
+
+            # a slow handshake doesn't hold up other subscribers connecting
+            thread = threading.Thread(target=self.handshake, args=(sock,))
+            thread.daemon = True
+            thread.start()
+
+    def handshake(self, sock):
+        try:
+            sock.settimeout(self.HANDSHAKE_TIMEOUT)
+            request = json.loads(read_line(sock, self.MAX_REQUEST_SIZE))
+            subscriber = self.subscribe(sock, request)
+            sock.settimeout(None)
+        except ValueError as e:
+            send_error(sock, str(e))
+            return
+        except (IOError, OSError):
+            sock.close()
+            return
+
+        # the answer goes out before any line, and once the subscriber has
+        # it every following line is sent to it
+        subscriber.queue.put(b'{"ok": true}\n')
+        self.add(subscriber)
+        subscriber.start()
+
+    def subscribe(self, sock, request):
+        if not isinstance(request, dict):
+            raise ValueError("Expected a JSON object")
+
+        profile = None
+        name = request.get("profile")
+        if name is not None:
+            profile = Profile.get_profile(name)
+            if not profile:
+                raise ValueError("Unknown profile: %s" % name)
+
+        layout = request.get("layout") or self.default_layout()
+        if layout not in Layout.TYPES:
+            raise ValueError("Unknown layout: %s" % layout)
+
+        width = request.get("width") or 2000
+        if not isinstance(width, int) or width <= 0:
+            raise ValueError("Invalid width: %r" % width)
+
+        return Subscriber(sock, layout, profile=profile, config=self.config,
+                          width=width, queue_size=self.queue_size,
+                          on_close=self.remove)
+
+    def default_layout(self):
+        # the same as the logcat format, as without the broker
+        reader = self.reader
+        if reader is not None and reader.format is not None and \
+                reader.format.NAME in Layout.TYPES:
+            return reader.format.NAME
+        return DEFAULT_LAYOUT
+
+    def close(self):
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)
+        except (IOError, OSError):
+            pass
+        self.server.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        with self.lock:
+            subscribers = self.subscribers[:]
+        for subscriber in subscribers:
+            subscriber.close()
+
+def read_line(sock, max_size):
+    # byte by byte, so that nothing after the line is consumed
+    line = []
+    while len(line) < max_size:
+        byte = sock.recv(1)
+        if not byte or byte == b"\n":
+            break
+        line.append(byte)
+    return b"".join(line).decode("utf-8")
+
+def send_error(sock, message):
+    try:
+        sock.sendall((json.dumps({"error": message}) + "\n").encode("utf-8"))
+    except (IOError, OSError):
+        pass
+    sock.close()
+
+def subscribe(path, profile=None, layout=None, width=None):
+    """Connects to a broker, and returns the socket that the rendered lines
+    will be read from. Raises ValueError when the broker refuses the
+    subscription."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    request = {"profile": profile, "layout": layout, "width": width}
+    sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+
+    line = read_line(sock, Broker.MAX_REQUEST_SIZE)
+    try:
+        response = json.loads(line)
+    except ValueError:
+        response = {"error": "Invalid response from broker: %r" % line}
+    if not response.get("ok"):
+        sock.close()
+        raise ValueError(response.get("error") or "Subscription refused")
+    return sock
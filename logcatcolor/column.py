@@ -7,12 +7,10 @@ Licensed under the Apache License, Version 2.0
 Columns for displaying logcat log data
 """
 from __future__ import unicode_literals
-import colorama
+from collections import OrderedDict
 from colorama import Fore, Back, Style
 from io import StringIO
 
-colorama.init()
-
 class Column(object):
     def __init__(self, layout):
         self.width = layout.config.get_column_width(self)
@@ -32,6 +30,38 @@ class TimeColumn(Column):
              "%s" + Style.RESET_ALL
     DEFAULT_WIDTH = 14
 
+class ElapsedColumn(Column):
+    "Seconds since the first line"
+    NAME = "elapsed"
+    DEFAULT_WIDTH = 10
+    FORMAT = Fore.WHITE + Back.BLACK + Style.DIM + \
+             "%s" + Style.RESET_ALL
+    SECONDS_FORMAT = "%.3f"
+
+    def format(self, seconds):
+        text = ""
+        if seconds is not None:
+            text = self.SECONDS_FORMAT % seconds
+        return Column.format(self, text.rjust(self.width))
+
+class DeltaColumn(ElapsedColumn):
+    "Seconds since the previous line of the same pid and tag"
+    NAME = "delta"
+    SECONDS_FORMAT = "+%.3f"
+
+class SourceColumn(Column):
+    "The capture a merged line comes from"
+    NAME = "source"
+    DEFAULT_WIDTH = 12
+    FORMAT = Fore.WHITE + Back.BLACK + Style.DIM + \
+             "%s" + Style.RESET_ALL
+
+    def format(self, source):
+        source = source or ""
+        if self.width > 2 and len(source) > self.width:
+            source = source[0:self.width-2] + ".."
+        return Column.format(self, source.ljust(self.width))
+
 class PIDColumn(Column):
     NAME = "pid"
     DEFAULT_WIDTH = 8
@@ -66,6 +96,10 @@ class TagColumn(Column):
         for color in cls.COLOR_NAMES:
             cls.COLOR_MAP[color] = getattr(Fore, color)
 
+    # colors allocated to tags the profile doesn't color are only kept for
+    # this many of the most recently seen tags
+    MAX_ALLOCATED = 1024
+
     def __init__(self, layout):
         Column.__init__(self, layout)
 
@@ -73,16 +107,23 @@ class TagColumn(Column):
         if layout.profile:
             tag_colors = layout.profile.tag_colors
 
-        self.tag_colors = tag_colors or {}
+        self.tag_colors = dict(tag_colors or {})
+        self.allocated = OrderedDict()
         self.last_used = list(self.COLOR_MAP.values())
 
     # This will allocate a unique format for the given tag since we dont have
     # very many colors, we always keep track of the LRU
     def allocate_color(self, tag):
-        if tag not in self.tag_colors:
-            self.tag_colors[tag] = self.last_used[0]
+        color = self.tag_colors.get(tag)
+        if color is None:
+            color = self.allocated.get(tag)
+            if color is None:
+                color = self.allocated[tag] = self.last_used[0]
+                if len(self.allocated) > self.MAX_ALLOCATED:
+                    self.allocated.popitem(last=False)
+            else:
+                self.allocated.move_to_end(tag)
 
-        color = self.tag_colors[tag]
         self.last_used.remove(color)
         self.last_used.append(color)
         return color
@@ -135,6 +176,14 @@ class MessageColumn(Column):
         if not self.width:
             return message
 
+        # each line of a multi-line message (long format) starts in the
+        # message column
+        if "\n" in message:
+            return ("\n" + " " * self.left).join(
+                [self.wrap(line) for line in message.split("\n")])
+        return self.wrap(message)
+
+    def wrap(self, message):
         messagebuf = StringIO()
         current = 0
         while current < len(message):
@@ -1,18 +1,28 @@
 from __future__ import print_function, unicode_literals
 from logcatcolor.column import TagColumn
 from logcatcolor.profile import Profile
+import marshal
 import os
-import platform
+import struct
 import sys
-import traceback
+import threading
+import zlib
 
 class LogcatColorConfig(object):
     DEFAULT_LAYOUT = "brief"
     DEFAULT_WRAP = True
     DEFAULT_ADB = None
     DEFAULT_STAY_CONNECTED = False
+    DEFAULT_TIME_COLUMNS = ()
+    DEFAULT_SOURCE_COLUMN = False
 
-    def __init__(self, options):
+    # compiled config code objects are cached here, keyed by the config path,
+    # its mtime and size, and the exact version of the running interpreter
+    CACHE_DIR_ENV = "LOGCAT_COLOR_CACHE_DIR"
+    CACHE_MAGIC = b"LCC1"
+    CACHE_HEADER = struct.Struct("<4sIqq")
+
+    def __init__(self, options, exit_on_error=True, publish=True):
         self.options = options
         self.path = options.config or self.get_default_config()
         self.filters = {}
@@ -24,19 +34,101 @@ class LogcatColorConfig(object):
 
         self.config.update(TagColumn.COLOR_MAP)
 
+        # the profiles defined by this config, by name
+        self.profiles = {}
+
         if os.path.exists(self.path) and os.path.isfile(self.path):
             # config file is just a python script that globals are imported from
             try:
-                with open(self.path) as f:
-                    code = compile(f.read(), os.path.basename(self.path), 'exec')
-                    exec(code, self.config)
+                self.exec_config()
             except:
                 self.report_config_error()
-                sys.exit(1)
+                if exit_on_error:
+                    sys.exit(1)
+                raise
 
         self.post_load()
+        if publish:
+            self.publish()
+
+    def exec_config(self):
+        # profiles register themselves when they are created, so they are
+        # registered into this config's own registry, which is only merged
+        # into the registry other threads look profiles up in when the
+        # config is published
+        Profile.__loading__.profiles = self.profiles
+        try:
+            exec(self.load_code(), self.config)
+        finally:
+            Profile.__loading__.profiles = None
+
+    def publish(self):
+        """Makes this config's profiles the ones found by name, along with
+        the profiles created outside of a config"""
+        Profile.__profiles__.update(self.profiles)
+
+    def load_code(self):
+        stat = os.stat(self.path)
+        cache_path = self.get_cache_path()
+        header = self.CACHE_HEADER.pack(self.CACHE_MAGIC, sys.hexversion,
+            stat.st_mtime_ns, stat.st_size)
+        # the absolute path is part of the key, so hash collisions between
+        # config files don't load the wrong code
+        key = header + os.path.abspath(self.path).encode("utf-8") + b"\0"
+
+        if cache_path:
+            try:
+                with open(cache_path, "rb") as f:
+                    data = f.read()
+                if data.startswith(key):
+                    return marshal.loads(data[len(key):])
+            except (IOError, OSError, EOFError, ValueError, TypeError):
+                pass
+
+        with open(self.path) as f:
+            code = compile(f.read(), os.path.basename(self.path), 'exec')
+
+        if cache_path:
+            self.store_code(cache_path, key + marshal.dumps(code))
+        return code
+
+    def store_code(self, cache_path, data):
+        # caching is best effort, a read-only home directory shouldn't
+        # keep logcat-color from starting
+        try:
+            cache_dir = os.path.dirname(cache_path)
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+
+            tmp_path = "%s.%d" % (cache_path, os.getpid())
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.rename(tmp_path, cache_path)
+        except (IOError, OSError):
+            pass
+
+    def get_cache_dir(self):
+        cache_dir = os.environ.get(self.CACHE_DIR_ENV)
+        if cache_dir is not None:
+            # an empty LOGCAT_COLOR_CACHE_DIR disables the cache
+            return cache_dir or None
+
+        cache_home = os.environ.get("XDG_CACHE_HOME")
+        if not cache_home:
+            cache_home = os.path.join(os.path.expanduser("~"), ".cache")
+        return os.path.join(cache_home, "logcat-color")
+
+    def get_cache_path(self):
+        cache_dir = self.get_cache_dir()
+        if not cache_dir:
+            return None
+
+        path = os.path.abspath(self.path).encode("utf-8")
+        return os.path.join(cache_dir, "config-%08x" % (zlib.crc32(path) & 0xffffffff))
 
     def report_config_error(self):
+        import traceback
+
         config_error = """
 ########################################
 # There was an error loading config from
@@ -52,7 +144,7 @@ class LogcatColorConfig(object):
 
     def get_default_config(self):
         env_key = "HOME"
-        if platform.system() == "Windows":
+        if sys.platform == "win32":
             env_key = "USERPROFILE"
 
         home_dir = os.environ[env_key]
@@ -63,6 +155,11 @@ class LogcatColorConfig(object):
             self.config["wrap"] = self.options.wrap
         if self.options.stay_connected is not None:
             self.config["stay_connected"] = self.options.stay_connected
+        time_columns = getattr(self.options, "time_columns", None)
+        if time_columns is not None:
+            self.config["time_columns"] = time_columns
+        if getattr(self.options, "source_column", None):
+            self.config["source_column"] = True
 
     def get_default_layout(self):
         return self.config.get("default_layout", self.DEFAULT_LAYOUT)
@@ -73,8 +170,66 @@ class LogcatColorConfig(object):
     def get_wrap(self):
         return self.config.get("wrap", self.DEFAULT_WRAP)
 
+    def get_time_columns(self):
+        return self.config.get("time_columns", self.DEFAULT_TIME_COLUMNS)
+
+    def get_source_column(self):
+        return self.config.get("source_column", self.DEFAULT_SOURCE_COLUMN)
+
     def get_stay_connected(self):
         return self.config.get("stay_connected", self.DEFAULT_STAY_CONNECTED)
 
     def get_adb(self):
         return self.config.get("adb", self.DEFAULT_ADB)
+
+class ConfigWatcher(threading.Thread):
+    """Polls the config file for changes, and loads it again whenever it
+    changed. The new config is passed to `callback` only if it loaded without
+    errors, otherwise the error is reported and the current config is kept.
+    Its profiles replace the current ones unless `callback` returns False."""
+    DEFAULT_INTERVAL = 1.0
+
+    def __init__(self, config, callback, interval=DEFAULT_INTERVAL):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.config = config
+        self.callback = callback
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.last_stat = self.get_stat()
+
+    def get_stat(self):
+        try:
+            stat = os.stat(self.config.path)
+        except OSError:
+            return None
+        # editors often save by replacing the file, so the inode counts too
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.check()
+
+    def check(self):
+        stat = self.get_stat()
+        if stat is None or stat == self.last_stat:
+            return False
+
+        self.last_stat = stat
+        try:
+            config = LogcatColorConfig(self.config.options, exit_on_error=False,
+                                       publish=False)
+        except:
+            print("Keeping the previous config", file=sys.stderr)
+            return False
+
+        if self.callback(config) is False:
+            return False
+
+        config.publish()
+        self.config = config
+        return True
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
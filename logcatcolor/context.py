@@ -0,0 +1,76 @@
+"""
+logcat-color
+
+Copyright 2012, Marshall Culpepper
+Licensed under the Apache License, Version 2.0
+
+grep style context lines around the lines a profile includes
+"""
+from __future__ import unicode_literals
+from collections import deque, OrderedDict
+
+class ContextState(object):
+    __slots__ = ("before", "after", "seen", "printed")
+
+    def __init__(self, before):
+        # the last rejected lines, kept parsed but not rendered
+        self.before = deque(maxlen=before) if before else None
+        # how many of the next rejected lines are shown after an included one
+        self.after = 0
+        # numbers of the last line seen and the last line shown
+        self.seen = 0
+        self.printed = None
+
+class ContextBuffer(object):
+    """Tracks the lines around the included lines, like grep's -A, -B and -C.
+    With a scope ("pid" or "tid"), context is only taken from the lines of
+    the same process or thread as the included line. Groups of lines that
+    aren't next to each other are separated by SEPARATOR."""
+    SEPARATOR = "--"
+    SCOPES = ("pid", "tid")
+    MAX_KEYS = 1024
+
+    def __init__(self, before=0, after=0, scope=None):
+        self.before = before
+        self.after = after
+        self.scope = scope
+        self.states = OrderedDict()
+
+    def get_state(self, data):
+        key = data.get(self.scope) if self.scope else None
+        state = self.states.get(key)
+        if state is None:
+            if len(self.states) >= self.MAX_KEYS:
+                self.states.popitem(last=False)
+            state = self.states[key] = ContextState(self.before)
+        elif self.scope:
+            self.states.move_to_end(key)
+        state.seen += 1
+        return state
+
+    def reject(self, data):
+        """Returns True when a rejected line should be shown as context after
+        an included line. Otherwise it is kept as context for the next one."""
+        state = self.get_state(data)
+        if state.after:
+            state.after -= 1
+            state.printed = state.seen
+            return True
+        if state.before is not None:
+            state.before.append(dict(data))
+        return False
+
+    def include(self, data):
+        """Returns (separator, context): whether a separator goes before
+        this group, and the context records to show before the line"""
+        state = self.get_state(data)
+        context = []
+        if state.before:
+            context = list(state.before)
+            state.before.clear()
+
+        first = state.seen - len(context)
+        separator = state.printed is not None and first > state.printed + 1
+        state.printed = state.seen
+        state.after = self.after
+        return separator, context
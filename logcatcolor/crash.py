@@ -0,0 +1,301 @@
+"""
+logcat-color
+
+Copyright 2012, Marshall Culpepper
+Licensed under the Apache License, Version 2.0
+
+Extraction of Java crashes, native crashes (tombstones) and ANRs from
+logcat output
+"""
+from __future__ import unicode_literals
+from logcatcolor.format import BriefFormat, Format, detect_format
+import hashlib
+import json
+import os
+import re
+import sys
+
+class CrashReport(object):
+    """The lines of one crash, from the line that triggered it and the
+    following lines of the same pid, tid and tag that continue it"""
+    PROCESS_REGEXES = (
+        re.compile(r"^Process: ([^,\s]+)"),
+        re.compile(r">>> (\S+) <<<"),
+        re.compile(r"^ANR in (\S+)"),
+    )
+
+    # the lines that identify a crash, as opposed to the pids, times and
+    # addresses that change every time it happens
+    SIGNATURE_REGEX = re.compile(r"^(?:at |Caused by: |\.\.\. \d+ more|" +
+                                 r"#\d+ pc |Abort message: |signal \d+|" +
+                                 r"Reason: |ANR in |[\w$.]+(?:Exception|Error)\b)")
+    ADDRESS_REGEX = re.compile(r"0x[0-9a-fA-F]+")
+    DIGITS_REGEX = re.compile(r"\d+")
+
+    # java crashes and ANRs are logged all at once, so their lines share the
+    # time of the first one, and a java stack trace only goes on with frames
+    # and their causes. messages are parsed without their indentation.
+    SAME_TIME_KINDS = ("java_crash", "anr")
+    STACK_CONTINUATIONS = ("at ", "Caused by:", "...")
+
+    def __init__(self, kind, data):
+        self.kind = kind
+        self.fields = dict((name, data.get(name)) for name in
+                           ("date", "time", "pid", "tid", "tag", "priority"))
+        self.process = None
+        self.lines = []
+        self.messages = []
+        self.in_stack = False
+        self.idle = 0
+        self.add(data)
+
+    def continues(self, data):
+        """Returns whether a line of the same pid and tag is part of this
+        report, rather than one logged after it"""
+        fields = self.fields
+        if data.get("tid") != fields["tid"]:
+            return False
+        if self.kind in self.SAME_TIME_KINDS and \
+                (data.get("time") != fields["time"] or
+                 data.get("date") != fields["date"]):
+            return False
+        if self.in_stack:
+            message = (data.get("message") or "").lstrip()
+            return message.startswith(self.STACK_CONTINUATIONS)
+        return True
+
+    def add(self, data):
+        message = data.get("message") or ""
+        self.lines.append(data.get("line") or message)
+        self.idle = 0
+        # long format records have all of their lines in one message
+        for message in message.split("\n"):
+            self.messages.append(message)
+            if self.kind == "java_crash" and \
+                    message.lstrip().startswith("at "):
+                self.in_stack = True
+            if self.process is None:
+                for regex in self.PROCESS_REGEXES:
+                    match = regex.search(message)
+                    if match:
+                        self.process = match.group(1)
+                        break
+
+    def signature(self):
+        lines = [self.ADDRESS_REGEX.sub("0x?", message) for message in
+                 self.messages if self.SIGNATURE_REGEX.match(message)]
+        if not lines:
+            lines = [self.DIGITS_REGEX.sub("#", message)
+                     for message in self.messages]
+        lines.insert(0, self.kind)
+        digest = hashlib.sha1("\n".join(lines).encode("utf-8",
+                                                      "backslashreplace"))
+        return digest.hexdigest()[:12]
+
+class CrashExtractor(object):
+    """Finds the crash reports in logcat output, and writes each distinct
+    report once, followed by a line for each time it happens again.
+
+    Most of a capture has nothing to do with crashes, so blocks of input are
+    searched for the trigger signatures as bytes, and only parsed from the
+    line of a trigger until the reports it started are complete. A report
+    is complete at the first line of its pid and tag that doesn't continue
+    it, when IDLE_LINES lines go by without a line from its pid and tag, or
+    at the end of the input."""
+    SIGNATURES = (
+        ("java_crash", "FATAL EXCEPTION"),
+        ("native_crash", "*** *** *** *** *** *** *** *** *** *** *** ***"),
+        ("anr", "ANR in "),
+    )
+    PREFILTER = re.compile(b"|".join(re.escape(signature.encode("utf-8"))
+                                     for kind, signature in SIGNATURES))
+    READ_SIZE = 1024 * 1024
+    DETECT_COUNT = 3
+    IDLE_LINES = 100
+    MAX_REPORT_LINES = 5000
+    DECODE_ERRORS = "backslashreplace"
+
+    HEADER = "--------- %s in %s (pid %s) at %s %s [%s]"
+    REPEAT = HEADER + " seen %d times"
+    SUMMARY = "--------- %d crash reports, %d distinct"
+    SUMMARY_ROW = "%8d  %s  %s in %s"
+
+    def __init__(self, file, writer, format=None, json=False, crash_dir=None):
+        try:
+            file = file.fileno()
+        except AttributeError:
+            pass
+        self.fd = file
+        self.writer = writer
+        self.json = json
+        self.crash_dir = crash_dir
+
+        self.format = None
+        if format is not None:
+            self.format = Format.TYPES[format]()
+        self.detect_lines = []
+
+        # (pid, tag) -> report still collecting lines
+        self.open = {}
+        # signature -> [count, kind, process], without the lines of the
+        # reports that are already written
+        self.reports = {}
+        self.total = 0
+
+    def run(self):
+        partial = b""
+        while True:
+            data = os.read(self.fd, self.READ_SIZE)
+            if not data:
+                break
+
+            end = data.rfind(b"\n") + 1
+            if not end:
+                partial += data
+                continue
+            if partial:
+                data = partial + data
+                end += len(partial)
+            partial = data[end:]
+            self.scan(data, end)
+
+        if partial:
+            self.scan(partial + b"\n", len(partial) + 1)
+        self.finish()
+
+    def can_skip(self):
+        # multi-line records have to be parsed from their header
+        return not self.open and self.format is not None and \
+            not self.format.MULTILINE
+
+    def scan(self, block, end):
+        pos = 0
+        while pos < end:
+            if self.can_skip():
+                match = self.PREFILTER.search(block, pos, end)
+                if match is None:
+                    return
+                pos = block.rfind(b"\n", pos, match.start()) + 1 or pos
+
+            newline = block.index(b"\n", pos)
+            self.add_line(block[pos:newline].decode("utf-8",
+                                                    self.DECODE_ERRORS))
+            pos = newline + 1
+
+    def add_line(self, line):
+        line = line.strip()
+        if self.format is None:
+            self.detect_lines.append(line)
+            if len(self.detect_lines) > self.DETECT_COUNT:
+                self.flush_detect_lines()
+            return
+
+        if Format.MARKER_REGEX.match(line):
+            return
+
+        data = self.format.data
+        try:
+            if self.format.match(line):
+                self.add_record(data)
+        finally:
+            data.clear()
+
+    def flush_detect_lines(self):
+        format_name = detect_format(self.detect_lines) or BriefFormat.NAME
+        self.format = Format.TYPES[format_name]()
+        lines, self.detect_lines = self.detect_lines, []
+        for line in lines:
+            self.add_line(line)
+
+    def add_record(self, data):
+        key = (data.get("pid"), data.get("tag"))
+        report = self.open.get(key)
+        if report is not None and not report.continues(data):
+            self.close(report)
+            report = None
+        for other in list(self.open.values()):
+            if other is not report:
+                other.idle += 1
+                if other.idle > self.IDLE_LINES:
+                    self.close(other)
+
+        message = data.get("message") or ""
+        for kind, signature in self.SIGNATURES:
+            if signature in message:
+                if report is not None:
+                    self.close(report)
+                self.open[key] = CrashReport(kind, data)
+                return
+
+        if report is not None:
+            report.add(data)
+            if len(report.lines) >= self.MAX_REPORT_LINES:
+                self.close(report)
+
+    def close(self, report):
+        fields = report.fields
+        del self.open[(fields["pid"], fields["tag"])]
+        self.total += 1
+
+        signature = report.signature()
+        entry = self.reports.get(signature)
+        if entry is None:
+            entry = self.reports[signature] = [0, report.kind, report.process]
+            if self.crash_dir:
+                self.save(report, signature)
+        entry[0] += 1
+        self.write_report(report, signature, entry[0])
+
+    def save(self, report, signature):
+        path = os.path.join(self.crash_dir, "%s-%s.txt" % (report.kind,
+                                                           signature))
+        with open(path, "wb") as f:
+            f.write("".join(line + "\n" for line in report.lines).encode(
+                "utf-8", "backslashreplace"))
+
+    def write_report(self, report, signature, count):
+        fields = report.fields
+        if self.json:
+            record = dict(fields, kind=report.kind, process=report.process,
+                          signature=signature, count=count)
+            if count == 1:
+                record["lines"] = report.lines
+            text = json.dumps(record, sort_keys=True) + "\n"
+        else:
+            values = (report.kind, report.process or "?", fields["pid"],
+                      fields["date"] or "", fields["time"] or "", signature)
+            if count == 1:
+                text = self.HEADER % values + "\n" + \
+                       "".join(line + "\n" for line in report.lines)
+            else:
+                text = self.REPEAT % (values + (count,)) + "\n"
+
+        self.writer.write(text.encode("utf-8", "backslashreplace"))
+
+    def finish(self):
+        if self.format is None and self.detect_lines:
+            self.flush_detect_lines()
+        if self.format is not None and self.format.flush():
+            try:
+                self.add_record(self.format.data)
+            finally:
+                self.format.data.clear()
+
+        for report in list(self.open.values()):
+            self.close(report)
+
+        # json records already carry their counts
+        summary = self.format_summary()
+        if self.json:
+            sys.stderr.write(summary)
+        else:
+            self.writer.write(summary.encode("utf-8", "backslashreplace"))
+        self.writer.flush()
+
+    def format_summary(self):
+        lines = [self.SUMMARY % (self.total, len(self.reports))]
+        for signature, (count, kind, process) in sorted(self.reports.items(),
+                key=lambda item: -item[1][0]):
+            lines.append(self.SUMMARY_ROW % (count, signature, kind,
+                                             process or "?"))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,59 @@
+"""
+logcat-color
+
+Copyright 2012, Marshall Culpepper
+Licensed under the Apache License, Version 2.0
+
+Collapsing of repeated log lines into "repeated N times" summaries
+"""
+from __future__ import unicode_literals
+from collections import OrderedDict
+
+class Deduplicator(object):
+    """Suppresses lines whose tag and message are identical to one of the
+    last `window` distinct lines. Once a repeated line falls out of the
+    window, a single summary record is produced for all of its repeats."""
+    DEFAULT_WINDOW = 1
+    REPEATED_MESSAGE = "repeated %d more times: %s"
+    REPEATED_LINE = "--------- repeated %d more times: %s"
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = max(1, window)
+        # (tag, message) -> [repeat count, last repeated record]
+        self.entries = OrderedDict()
+        self.suppressed = 0
+
+    def add(self, data):
+        """Returns a tuple of (duplicate, summaries): whether the line should
+        be suppressed, and the summary records to render before it"""
+        key = (data.get("tag"), data.get("message"))
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry[0] += 1
+            if entry[1] is None:
+                # only repeated lines are ever copied
+                entry[1] = dict(data)
+            self.suppressed += 1
+            return True, ()
+
+        self.entries[key] = [0, None]
+        if len(self.entries) <= self.window:
+            return False, ()
+
+        count, repeated = self.entries.popitem(last=False)[1]
+        if not count:
+            return False, ()
+        return False, (self.summary(repeated, count),)
+
+    def flush(self):
+        """Returns the summaries of every repeated line still in the window"""
+        summaries = [self.summary(repeated, count)
+                     for count, repeated in self.entries.values() if count]
+        self.entries.clear()
+        return summaries
+
+    def summary(self, data, count):
+        summary = dict(data)
+        summary["message"] = self.REPEATED_MESSAGE % (count, data.get("message"))
+        summary["line"] = self.REPEATED_LINE % (count, data.get("line"))
+        return summary
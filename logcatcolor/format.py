@@ -8,11 +8,11 @@ Support for reading various logcat logging formats into an easier to consume
 data map.
 """
 from __future__ import unicode_literals
+from collections import OrderedDict
 import re
 
 def format(cls):
     Format.TYPES[cls.NAME] = cls
-    Format.REGEXES[cls.NAME] = re.compile(cls.PATTERN) if cls.PATTERN else None
     return cls
 
 class Format(object):
@@ -20,11 +20,32 @@ class Format(object):
     REGEXES = {}
     MARKER_REGEX = re.compile(r"^--------- beginning of")
 
+    # whether records can span several lines
+    MULTILINE = False
+
+    # tags are interned so that the records retained by ring buffers and
+    # the like share a single copy of each tag, up to this many tags
+    MAX_INTERNED_TAGS = 4096
+
     def __init__(self):
         self.data = {}
-        self.regex = self.REGEXES[self.NAME]
+        self.tags = OrderedDict()
+        self.regex = self.get_regex(self.NAME)
+
+    @classmethod
+    def get_regex(cls, name):
+        # patterns are compiled on first use, most runs only ever need one
+        try:
+            return Format.REGEXES[name]
+        except KeyError:
+            pattern = Format.TYPES[name].PATTERN
+            regex = Format.REGEXES[name] = re.compile(pattern) if pattern else None
+            return regex
 
     def match(self, line):
+        """Parses a line into self.data. Returns True when data holds a
+        record, False for lines that can't be parsed, and None for lines that
+        are part of a record that isn't complete yet"""
         if not self.regex:
             return True
 
@@ -35,11 +56,32 @@ class Format(object):
 
         for name, value in match.groupdict().items():
             self.data[name] = value.strip()
+
+        tag = self.data.get("tag")
+        if tag is not None:
+            self.data["tag"] = self.intern_tag(tag)
         return True
 
+    def intern_tag(self, tag):
+        interned = self.tags.get(tag)
+        if interned is None:
+            # sys.intern() would keep every tag ever seen alive, so only the
+            # most recently seen tags are kept
+            interned = self.tags[tag] = tag
+            if len(self.tags) > self.MAX_INTERNED_TAGS:
+                self.tags.popitem(last=False)
+        else:
+            self.tags.move_to_end(tag)
+        return interned
+
     def get(self, name):
         return self.data.get(name)
 
+    def flush(self):
+        """Completes a record that is still being assembled at the end of
+        the input, returns True when it was put in self.data"""
+        return False
+
     def include(self, profile):
         if profile and not profile.include(self.data):
             return False
@@ -108,17 +150,58 @@ class ThreadTimeFormat(Format):
 
 @format
 class LongFormat(Format):
-    "[ MM-DD HH:MM:SS.mmm   PID:TID I/Tag ]\nmessage"
+    "[ MM-DD HH:MM:SS.mmm   PID:TID I/Tag ]\nmessage\nmore message\n"
     NAME = "long"
+    MULTILINE = True
+    # older versions of logcat print the tid in hex
+    PID_TID_PATTERN = BriefFormat.PID_PATTERN + r":\s*" + \
+                      r"(?P<tid>0x[0-9a-f]+|\d+)"
     PATTERN = r"^\[ " + TimeFormat.DATE_TIME_PATTERN + r"\s+" + \
-                   ThreadFormat.PID_TID_HEX_PATTERN + r"\s+" + \
+                   PID_TID_PATTERN + r"\s+" + \
                    BriefFormat.PRIORITY_TAG_PATTERN + r"\s+\]$"
 
+    def __init__(self):
+        Format.__init__(self)
+        # the header line and match of the record being assembled, and its
+        # message lines so far
+        self.header = None
+        self.message = []
+
     def match(self, line):
-        if not Format.match(self, line):
-            self.data["message"] = line
+        """A header and the message lines up to the blank line after them
+        are assembled into a single record, which is returned by the blank
+        line (or by the next header, when the blank line is missing)"""
+        header = self.regex.match(line)
+        if header is not None:
+            complete = self.flush()
+            self.header = (line, header)
+            return True if complete else None
+
+        if self.header is None:
+            return False
+
+        if not line:
+            return self.flush()
+
+        self.message.append(line)
+        return None
 
-        return "message" in self.data and "tag" in self.data
+    def flush(self):
+        if self.header is None:
+            return False
+
+        line, header = self.header
+        message = self.message
+        self.header = None
+        self.message = []
+
+        data = self.data
+        for name, value in header.groupdict().items():
+            data[name] = value.strip()
+        data["tag"] = self.intern_tag(data["tag"])
+        data["message"] = "\n".join(message)
+        data["line"] = "\n".join([line] + message)
+        return True
 
 """
 A helper to detect the log format from a list of lines
@@ -131,8 +214,9 @@ def detect_format(lines):
         if Format.MARKER_REGEX.match(line):
             continue
 
-        for name, regex in Format.REGEXES.items():
-            if regex.match(line):
+        for name in Format.TYPES:
+            regex = Format.get_regex(name)
+            if regex and regex.match(line):
                 return name
 
     return None
@@ -10,48 +10,122 @@ from __future__ import unicode_literals
 from colorama import Fore, Back, Style
 from logcatcolor.column import (
     DateColumn,
+    DeltaColumn,
+    ElapsedColumn,
     MessageColumn,
     PIDColumn,
     PriorityColumn,
+    SourceColumn,
     TagColumn,
     TIDColumn,
     TimeColumn,
 )
+from logcatcolor.timestamp import TimeTracker
 from io import StringIO
+import codecs
+from json.encoder import encode_basestring
 
 def layout(cls):
     Layout.TYPES[cls.NAME] = cls
     return cls
 
+def json_surrogate_escape(error):
+    # Bytes that weren't valid UTF-8 are decoded to lone surrogates by
+    # "surrogateescape", write them as JSON \u escapes so that the output
+    # stays valid UTF-8, and decoding it with surrogateescape again gives
+    # back the original bytes
+    escaped = "".join("\\u%04x" % ord(c) for c in error.object[error.start:error.end])
+    return escaped, error.end
+
+def backslash_surrogate_escape(error):
+    # Text layouts show invalid UTF-8 as \\xNN escapes. Lines decoded with
+    # "surrogateescape" (because a json or csv sink shares them) are written
+    # exactly as if they had been decoded with "backslashreplace".
+    escaped = "".join("\\x%02x" % (ord(c) - 0xdc00)
+                      for c in error.object[error.start:error.end])
+    return escaped, error.end
+
+codecs.register_error("logcatcolor-json", json_surrogate_escape)
+codecs.register_error("logcatcolor-backslash", backslash_surrogate_escape)
+
+TIME_COLUMNS = {
+    ElapsedColumn.NAME: ElapsedColumn,
+    DeltaColumn.NAME: DeltaColumn,
+}
+
+def config_time_columns(config):
+    if not config:
+        return ()
+    return [name for name in config.get_time_columns() if name in TIME_COLUMNS]
+
+def json_template(fields):
+    return "{" + ",".join('"%s":%%s' % field for field in fields) + "}"
+
+def config_source_column(config):
+    return bool(config) and config.get_source_column()
+
 class Layout(object):
     TYPES = {}
     MARKER_LAYOUT = Fore.WHITE + Back.BLACK + Style.DIM + "%s" + Style.RESET_ALL
 
+    # how input lines are decoded, and rendered lines are encoded
+    DECODE_ERRORS = "backslashreplace"
+    ENCODE_ERRORS = "logcatcolor-backslash"
+
     def __init__(self, config=None, profile=None, width=2000):
         self.columns = []
         self.config = config
         self.profile = profile
         self.width = width
 
+        column_types = self.get_column_types()
         self.total_column_width = 0
-        if self.COLUMNS:
+        if column_types:
             # first get the total column width, then construct each column
-            for ColumnType in self.COLUMNS:
+            for ColumnType in column_types:
                 if config:
                     self.total_column_width += config.get_column_width(ColumnType)
                 else:
                     self.total_column_width += ColumnType.DEFAULT_WIDTH
 
-            for ColumnType in self.COLUMNS:
+            for ColumnType in column_types:
                 column = ColumnType(self)
                 self.columns.append(column)
 
         self.column_count = len(self.columns)
 
+        # the elapsed and delta columns are computed from the date and time
+        self.times = None
+        if any(column.NAME in TIME_COLUMNS for column in self.columns):
+            self.times = TimeTracker()
+
+    def get_column_types(self):
+        # the source of merged lines goes first
+        columns = self.COLUMNS
+        if columns and config_source_column(self.config):
+            columns = (SourceColumn,) + columns
+
+        # time columns go right after the time of layouts that have one
+        time_columns = config_time_columns(self.config)
+        if not columns or not time_columns or TimeColumn not in columns:
+            return columns
+
+        index = columns.index(TimeColumn) + 1
+        return columns[:index] + \
+               tuple(TIME_COLUMNS[name] for name in time_columns) + \
+               columns[index:]
+
+    def reload(self, config, profile=None):
+        """Returns a layout of the same type for a reloaded config"""
+        return type(self)(config, profile, self.width)
+
     def layout_marker(self, line):
         return self.MARKER_LAYOUT % line
 
     def layout_data(self, data):
+        if self.times is not None:
+            self.times.update(data)
+
         formatted = StringIO()
         for index in range(0, self.column_count):
             column = self.columns[index]
@@ -106,3 +180,74 @@ class ThreadTimeLayout(Layout):
 class LongLayout(Layout):
     NAME = "long"
     COLUMNS = ThreadTimeLayout.COLUMNS
+
+class FieldLayout(Layout):
+    """Base for layouts that serialize the parsed fields of each line,
+    skipping all of the column formatting"""
+    COLUMNS = None
+    FIELDS = ("date", "time", "pid", "tid", "priority", "tag", "message")
+
+    # keep invalid UTF-8 as-is rather than escaping it into the text
+    DECODE_ERRORS = "surrogateescape"
+    ENCODE_ERRORS = "surrogateescape"
+
+    def __init__(self, config=None, profile=None, width=2000):
+        Layout.__init__(self, config, profile, width)
+        if config_source_column(config):
+            self.FIELDS = (SourceColumn.NAME,) + self.FIELDS
+
+@layout
+class JsonLayout(FieldLayout):
+    "One JSON object per line (JSON Lines)"
+    NAME = "json"
+    ENCODE_ERRORS = "logcatcolor-json"
+    TEMPLATE = json_template(FieldLayout.FIELDS)
+    MARKER_TEMPLATE = '{"marker":%s}'
+
+    def __init__(self, config=None, profile=None, width=2000):
+        FieldLayout.__init__(self, config, profile, width)
+        if self.FIELDS is not JsonLayout.FIELDS:
+            self.TEMPLATE = json_template(self.FIELDS)
+
+    def layout_marker(self, line):
+        return self.MARKER_TEMPLATE % encode_basestring(line)
+
+    def layout_data(self, data):
+        get = data.get
+        return self.TEMPLATE % tuple([
+            "null" if value is None else encode_basestring(value)
+            for value in [get(field) for field in self.FIELDS]])
+
+@layout
+class CsvLayout(FieldLayout):
+    "Comma separated values, with a header row"
+    NAME = "csv"
+    QUOTE_CHARS = (",", "\"", "\n", "\r")
+
+    def __init__(self, config=None, profile=None, width=2000):
+        FieldLayout.__init__(self, config, profile, width)
+        self.header = ",".join(self.FIELDS)
+
+    def reload(self, config, profile=None):
+        layout = FieldLayout.reload(self, config, profile)
+        layout.header = self.header
+        return layout
+
+    def layout_marker(self, line):
+        return None
+
+    def quote(self, value):
+        if value is None:
+            return ""
+        for char in self.QUOTE_CHARS:
+            if char in value:
+                return '"' + value.replace('"', '""') + '"'
+        return value
+
+    def layout_data(self, data):
+        get = data.get
+        row = ",".join([self.quote(get(field)) for field in self.FIELDS])
+        if self.header:
+            row = self.header + "\n" + row
+            self.header = None
+        return row
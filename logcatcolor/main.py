@@ -14,16 +14,31 @@ import errno
 import fcntl
 import optparse
 import os
+import re
+import signal
 import struct
 import sys
 import termios
 
+import colorama
 from colorama import Fore, Back, Style
-from subprocess import check_call, Popen, PIPE
 
-from logcatcolor.config import LogcatColorConfig
+# the modules of features that most runs don't use are imported where the
+# features are set up
+from logcatcolor.config import ConfigWatcher, LogcatColorConfig
+from logcatcolor.context import ContextBuffer
+from logcatcolor.layout import Layout, TIME_COLUMNS
+from logcatcolor.dedup import Deduplicator
 from logcatcolor.profile import Profile
-from logcatcolor.reader import LogcatReader
+from logcatcolor.recorder import FlightRecorder
+from logcatcolor.reader import (
+    LogcatReader,
+    PassThroughReader,
+    ThreadedLogcatReader,
+)
+from logcatcolor.ring import RingBuffer
+from logcatcolor.stats import PipelineStats, StatsWriter
+from logcatcolor.top import TopView
 
 class LogcatColor(object):
     def __init__(self, args=None):
@@ -31,6 +46,8 @@ class LogcatColor(object):
         self.width = self.get_term_width()
         self.config = LogcatColorConfig(self.options)
 
+        # with --connect, the profile is looked up by the broker
+        self.profile_name = self.args[0] if self.args else None
         self.profile = None
         if len(self.args) >= 1:
             self.profile = Profile.get_profile(self.args[0])
@@ -46,11 +63,72 @@ class LogcatColor(object):
         elif self.profile and self.profile.format:
             self.format = self.profile.format
 
+        self.sinks = []
+        route_layout = self.options.layout or "raw"
+        if self.options.tee or self.options.route:
+            from logcatcolor.sink import Sink
+        try:
+            for spec in self.options.tee or []:
+                self.sinks.append(Sink.parse(spec, self.config,
+                                             Profile.get_profile))
+            for spec in self.options.route or []:
+                self.sinks.append(Sink.parse_route(spec, route_layout,
+                                  self.config, Profile.get_profile))
+        except ValueError as e:
+            print(str(e), file=sys.stderr)
+            sys.exit(2)
+
         self.layout = self.format
         if self.options.plain:
             self.layout = "raw"
+        if self.options.layout:
+            self.layout = self.options.layout
 
         self.proc = None
+        self.reader = None
+        self.top = None
+        if self.options.top:
+            self.top = TopView(self.output, interval=self.options.top_interval,
+                width=self.width, height=self.get_term_height(),
+                clear=self.output.isatty())
+        self.pushdown_args = None
+        self.broker = None
+        self.init_recorder()
+        self.init_stats()
+
+    def init_recorder(self):
+        self.recorder = None
+        if not self.options.flight_recorder and \
+                not self.options.flight_recorder_size:
+            return
+
+        self.recorder = FlightRecorder(
+            max_lines=self.options.flight_recorder,
+            max_bytes=self.options.flight_recorder_size,
+            triggers=self.options.triggers or FlightRecorder.DEFAULT_TRIGGERS,
+            after=self.options.trigger_after,
+            directory=self.options.dump_dir, on_dump=self.report_dump)
+
+    def report_dump(self, path, lines):
+        print("--- Dumped %d lines to %s" % (lines, path), file=sys.stderr)
+
+    def init_stats(self):
+        self.stats = None
+        self.stats_writer = None
+        if not self.options.stats and not self.options.stats_file:
+            return
+
+        self.stats = PipelineStats(sample_rate=self.options.stats_sample_rate)
+        self.stats.add_profile(self.profile)
+        if self.options.stats_file:
+            self.stats_writer = StatsWriter(self.stats,
+                self.options.stats_file, self.options.stats_interval)
+
+        if self.options.stats and hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, self.dump_stats)
+
+    def dump_stats(self, signum=None, frame=None):
+        self.stats.report(sys.stderr)
 
     def get_term_width(self):
         out_fd = self.output.fileno()
@@ -64,30 +142,206 @@ class LogcatColor(object):
 
         return width
 
+    def get_term_height(self):
+        out_fd = self.output.fileno()
+        if os.isatty(out_fd):
+            data = fcntl.ioctl(out_fd, termios.TIOCGWINSZ, '1234')
+            height, width = struct.unpack('hh', data)
+        else:
+            height = 24
+
+        return height
+
     def parse_args(self, args=None):
         parser = optparse.OptionParser()
 
         # logcat-color options
         parser.add_option("--config", dest="config", default=None,
             help="path to logcat-color config file (default: ~/.logcat-config)")
+        parser.add_option("--reload-config", action="store_true",
+            dest="reload_config", default=False,
+            help="watch the config file, and apply changes to it (profiles, " +
+                 "column widths, colors) without reconnecting to adb")
         parser.add_option("--plain", action="store_true",
             dest="plain", default=False,
             help="apply profiles and filters, but don't colorize / format" +
                  " output (useful for logging to a file)")
+        parser.add_option("--layout", dest="layout", default=None,
+            type="choice", choices=sorted(Layout.TYPES.keys()),
+            help="how to display log lines: " +
+                 ", ".join(sorted(Layout.TYPES.keys())) + ". json and csv " +
+                 "write the parsed fields of each line for processing by " +
+                 "other tools (default: same as the logcat format)")
+        parser.add_option("--time-columns", metavar="COLUMNS",
+            dest="time_columns", default=None,
+            help="comma separated time columns to show after the time of " +
+                 "each line: elapsed (seconds since the first line), delta " +
+                 "(seconds since the previous line of the same pid and tag)")
         parser.add_option("--no-wrap", action="store_false", dest="wrap",
             default=None, help="don't wrap console text into a column " +
                                "(makes for better copy/paste)")
+        parser.add_option("--no-pushdown", action="store_false",
+            dest="pushdown", default=True,
+            help="don't translate the profile's tags, priorities and simple " +
+                 "regex filters into logcat filters that run on the device")
+        parser.add_option("--pushdown-pid", action="store_true",
+            dest="pushdown_pid", default=False,
+            help="when the profile has a single package that is already " +
+                 "running, only read its logs from the device with --pid. " +
+                 "logs of the package after it restarts will be missed")
         parser.add_option("--stay-connected", action="store_true", default=None,
             dest="stay_connected", help="keep logcat-color running when the "
                                         "device disconnects, and automatically "
                                         "wait for the device to reconnect")
         parser.add_option("-i", "--input", metavar="FILE", dest="input",
-            default=None,
+            action="append", default=None,
             help="read input from FILE, instead of starting adb. this is " +
-                 "equivalent to piping FILE to logcat-color. (default: start " +
-                 "adb, and read from it's stdout)")
+                 "equivalent to piping FILE to logcat-color. may be given " +
+                 "more than once, to merge several captures by time " +
+                 "(default: start adb, and read from it's stdout)")
+        parser.add_option("--merge-window", metavar="LINES",
+            dest="merge_window", type="int", default=None,
+            help="when merging several --input files, put lines that are " +
+                 "up to LINES lines out of order in their capture back in " +
+                 "order (default: 256)")
+        parser.add_option("--source-column", action="store_true",
+            dest="source_column", default=False,
+            help="show the --input file that each line comes from")
         parser.add_option("-o", "--output", metavar="FILE", dest="output",
             default=None, help="write output to FILE (default: stdout)")
+        parser.add_option("--tee", metavar="LAYOUT:FILE[:PROFILE]",
+            action="append", dest="tee", default=None,
+            help="also write lines to FILE with another LAYOUT, and " +
+                 "optionally filtered by another PROFILE. lines are only " +
+                 "parsed once. may be given more than once")
+        parser.add_option("--route", metavar="PROFILE:FILE[:LAYOUT]",
+            action="append", dest="route", default=None,
+            help="write the lines included by PROFILE to FILE (with the " +
+                 "--layout layout, or raw by default). may be given more " +
+                 "than once, all routed profiles are evaluated in a single " +
+                 "pass over each line")
+        parser.add_option("--output-max-size", metavar="SIZE",
+            dest="output_max_size", default=None,
+            help="rotate the --output file when it reaches SIZE bytes " +
+                 "(K, M and G suffixes are accepted)")
+        parser.add_option("--output-max-age", metavar="SECONDS",
+            dest="output_max_age", type="float", default=None,
+            help="rotate the --output file every SECONDS seconds")
+        parser.add_option("--output-keep", metavar="N", dest="output_keep",
+            type="int", default=None,
+            help="number of rotated --output files to keep (default: 5)")
+        parser.add_option("--output-compress", action="store_true",
+            dest="output_compress", default=False,
+            help="gzip rotated --output files in the background")
+        parser.add_option("--ring-size", metavar="LINES", dest="ring_size",
+            type="int", default=0,
+            help="read adb output into a ring buffer of LINES lines, and " +
+                 "render it on a separate thread so that a slow terminal " +
+                 "doesn't stall reading (default: disabled)")
+        parser.add_option("--ring-policy", dest="ring_policy",
+            type="choice", choices=RingBuffer.POLICIES,
+            default=RingBuffer.DEFAULT_POLICY,
+            help="what to do when the ring buffer is full: " +
+                 ", ".join(RingBuffer.POLICIES) + " (default: %default)")
+        parser.add_option("--dedup", action="store_true", dest="dedup",
+            default=False,
+            help="collapse repeated lines with the same tag and message " +
+                 "into a single \"repeated N more times\" line")
+        parser.add_option("--dedup-window", metavar="LINES",
+            dest="dedup_window", type="int",
+            default=Deduplicator.DEFAULT_WINDOW,
+            help="with --dedup, also collapse lines repeating one of the " +
+                 "last LINES distinct lines (default: %default, only " +
+                 "consecutive repeats)")
+        parser.add_option("-A", "--after-context", metavar="LINES",
+            dest="after_context", type="int", default=0,
+            help="also show LINES lines after each line the profile " +
+                 "includes, like grep -A")
+        parser.add_option("-B", "--before-context", metavar="LINES",
+            dest="before_context", type="int", default=0,
+            help="also show LINES lines before each line the profile " +
+                 "includes, like grep -B")
+        parser.add_option("-C", "--context", metavar="LINES",
+            dest="context", type="int", default=None,
+            help="same as -A LINES -B LINES")
+        parser.add_option("--context-scope", dest="context_scope",
+            type="choice", choices=ContextBuffer.SCOPES, default=None,
+            help="only take context lines from the same " +
+                 " or ".join(ContextBuffer.SCOPES) + " as the included line")
+        parser.add_option("--threaded", action="store_true", dest="threaded",
+            default=False,
+            help="read, process and write lines on separate threads, " +
+                 "passing batches of lines between them")
+        parser.add_option("--top", action="store_true", dest="top",
+            default=False,
+            help="instead of printing lines, show a live table of the " +
+                 "tags and pids logging the most lines per second")
+        parser.add_option("--top-interval", metavar="SECONDS",
+            dest="top_interval", type="float", default=TopView.DEFAULT_INTERVAL,
+            help="how often to redraw --top (default: %default)")
+        parser.add_option("--serve", metavar="SOCKET", dest="serve",
+            default=None,
+            help="read logcat once, and serve it to any number of " +
+                 "logcat-color --connect subscribers over the Unix domain " +
+                 "socket SOCKET, instead of printing it")
+        parser.add_option("--connect", metavar="SOCKET", dest="connect",
+            default=None,
+            help="show the logcat served by logcat-color --serve on SOCKET, " +
+                 "filtered by the broker with the profile given by name, and " +
+                 "rendered with --layout (default: the broker's format)")
+        parser.add_option("--client-queue-size", metavar="BATCHES",
+            dest="client_queue_size", type="int", default=None,
+            help="with --serve, the number of batches of lines queued for " +
+                 "each subscriber. lines for subscribers that fall further " +
+                 "behind are dropped (default: 64)")
+        parser.add_option("--crashes", action="store_true", dest="crashes",
+            default=False,
+            help="instead of the log, show each Java crash, native crash " +
+                 "and ANR once, with the number of times it happened. " +
+                 "with --layout json, crashes are written as JSON records")
+        parser.add_option("--crash-dir", metavar="DIR", dest="crash_dir",
+            default=None,
+            help="with --crashes, also write each distinct crash to its own " +
+                 "file in DIR")
+        parser.add_option("--flight-recorder", metavar="LINES",
+            dest="flight_recorder", type="int", default=None,
+            help="keep the last LINES lines of every tag, whether or not " +
+                 "the profile includes them, and dump them to a file when " +
+                 "a --trigger matches")
+        parser.add_option("--flight-recorder-size", metavar="SIZE",
+            dest="flight_recorder_size", default=None,
+            help="like --flight-recorder, but keeps the last SIZE bytes of " +
+                 "lines (K, M and G suffixes are accepted)")
+        parser.add_option("--trigger", metavar="REGEX", action="append",
+            dest="triggers", default=None,
+            help="with --flight-recorder, dump the recorded lines when a " +
+                 "line matches REGEX. may be given more than once " +
+                 "(default: FATAL EXCEPTION and ANR in)")
+        parser.add_option("--trigger-after", metavar="SECONDS",
+            dest="trigger_after", type="float",
+            default=FlightRecorder.DEFAULT_AFTER,
+            help="keep dumping the lines that follow a trigger for SECONDS " +
+                 "seconds (default: %default)")
+        parser.add_option("--dump-dir", metavar="DIR", dest="dump_dir",
+            default=".",
+            help="directory the flight recorder dumps are written to " +
+                 "(default: the current directory)")
+        parser.add_option("--stats", action="store_true", dest="stats",
+            default=False,
+            help="count and time each stage of the pipeline, and print the " +
+                 "stats to stderr on exit or when receiving SIGUSR1")
+        parser.add_option("--stats-file", metavar="FILE", dest="stats_file",
+            default=None,
+            help="periodically write pipeline stats as JSON to FILE")
+        parser.add_option("--stats-interval", metavar="SECONDS",
+            dest="stats_interval", type="float",
+            default=StatsWriter.DEFAULT_INTERVAL,
+            help="how often to write --stats-file (default: %default)")
+        parser.add_option("--stats-sample-rate", metavar="N",
+            dest="stats_sample_rate", type="int",
+            default=PipelineStats.DEFAULT_SAMPLE_RATE,
+            help="time the stages of one out of every N lines " +
+                 "(default: %default)")
 
         # ADB options
         parser.add_option("-d", "--device", action="store_const",
@@ -138,19 +392,86 @@ class LogcatColor(object):
         if options.config and not os.path.isfile(options.config):
             parser.error("Config file does not exist: %s" % options.config)
 
+        if options.time_columns is not None:
+            options.time_columns = [name.strip() for name in
+                                    options.time_columns.split(",") if name.strip()]
+            for name in options.time_columns:
+                if name not in TIME_COLUMNS:
+                    parser.error("Unknown time column: %s" % name)
+
+        if options.threaded and options.ring_size > 0:
+            parser.error("--threaded can't be combined with --ring-size")
+
+        if options.top and options.ring_size > 0:
+            parser.error("--top can't be combined with --ring-size")
+
+        if options.flight_recorder_size:
+            from logcatcolor.output import parse_size
+            try:
+                options.flight_recorder_size = \
+                    parse_size(options.flight_recorder_size)
+            except ValueError as e:
+                parser.error(str(e))
+
+        if options.triggers:
+            for trigger in options.triggers:
+                try:
+                    re.compile(trigger)
+                except re.error as e:
+                    parser.error("Invalid trigger %s: %s" % (trigger, e))
+
+        if not os.path.isdir(options.dump_dir):
+            parser.error("Dump directory does not exist: %s" % options.dump_dir)
+
+        if options.context is not None:
+            options.before_context = options.before_context or options.context
+            options.after_context = options.after_context or options.context
+
+        if options.crash_dir and not os.path.isdir(options.crash_dir):
+            parser.error("Crash directory does not exist: %s" % options.crash_dir)
+
+        if options.crashes and (options.serve or options.connect or
+                                options.top):
+            parser.error("--crashes can't be combined with --serve, " +
+                         "--connect or --top")
+
+        if options.input and len(options.input) > 1 and (options.ring_size > 0
+                or options.crashes or options.serve):
+            parser.error("merging several --input files can't be combined " +
+                         "with --ring-size, --crashes or --serve")
+
+        if options.serve and options.connect:
+            parser.error("--serve can't be combined with --connect")
+
+        if (options.serve or options.connect) and options.top:
+            parser.error("--top can't be combined with --serve or --connect")
+
         try:
             self.input = sys.stdin.buffer
         except AttributeError:
             self.input = sys.stdin
-        if options.input:
-            self.input = open(options.input, "rb")
+        # several inputs are opened by the merge reader
+        if options.input and len(options.input) == 1:
+            self.input = open(options.input[0], "rb")
 
         try:
             self.output = sys.stdout.buffer
         except AttributeError:
             self.output = sys.stdout
         if options.output:
-            self.output = open(options.output, "wb")
+            from logcatcolor.output import FileWriter, parse_size
+            max_size = None
+            if options.output_max_size:
+                try:
+                    max_size = parse_size(options.output_max_size)
+                except ValueError as e:
+                    parser.error(str(e))
+
+            self.output = FileWriter(options.output, max_size=max_size,
+                max_age=options.output_max_age,
+                keep=FileWriter.DEFAULT_KEEP if options.output_keep is None
+                     else options.output_keep,
+                compress=options.output_compress)
 
         self.adb_device = options.adb_device
         self.logcat_args = options.logcat_args or []
@@ -199,21 +520,80 @@ class LogcatColor(object):
 
     def get_logcat_args(self):
         logcat_args = self.logcat_args[:]
-        if self.format:
+        format = self.format
+        if not format and self.options.serve:
+            # gives subscribers every field to filter and render
+            format = "threadtime"
+        if format:
             # put format in front in case custom filters are used
-            logcat_args[0:0] = ["-v", self.format]
+            logcat_args[0:0] = ["-v", format]
 
         if self.profile:
             buffers = self.profile.buffers
             if buffers:
                 for b in buffers: logcat_args.extend(["-b", b])
 
+        logcat_args.extend(self.get_pushdown_args())
         return logcat_args
 
+    def get_pushdown_args(self):
+        # other outputs may need lines that this profile rejects
+        if not self.profile or not self.options.pushdown or self.sinks \
+                or self.options.serve:
+            return []
+        # context lines are lines that the profile rejects
+        if self.options.before_context > 0 or self.options.after_context > 0:
+            return []
+        # the flight recorder keeps every line, whatever the profile includes,
+        # and crashes are extracted from every line
+        if self.recorder or self.options.crashes:
+            return []
+
+        from logcatcolor import pushdown
+        pushdown_pid = self.options.pushdown_pid
+        sdk = pid = None
+        if pushdown.wants_sdk(self.profile, pushdown_pid):
+            sdk = self.get_device_sdk()
+
+        if pushdown_pid and len(self.profile.package_search) == 1:
+            package = list(self.profile.package_search.keys())[0]
+            pid = self.adb_shell("pidof", "-s", package)
+            if pid and pid.isdigit() and sdk and sdk >= pushdown.MIN_SDK_PID:
+                # lines from the pid are included without seeing it start
+                self.profile.pid_map[package] = pid
+            else:
+                pid = None
+
+        self.pushdown_sdk, self.pushdown_pid = sdk, pid
+        self.pushdown_args = pushdown.plan_logcat_args(self.profile, sdk=sdk,
+                                                       pid=pid)
+        return self.pushdown_args
+
+    def get_device_sdk(self):
+        sdk = self.adb_shell("getprop", "ro.build.version.sdk")
+        if sdk and sdk.isdigit():
+            return int(sdk)
+        return None
+
+    def adb_shell(self, *args):
+        from subprocess import Popen, PIPE
+        command = self.get_adb_args() + ["shell"] + list(args)
+        try:
+            proc = Popen(command, stdout=PIPE, stderr=PIPE)
+            out, err = proc.communicate()
+        except OSError:
+            return None
+
+        if proc.returncode != 0:
+            return None
+        return out.decode("utf-8", "replace").strip()
+
     def start_logcat(self):
         adb_command = self.get_adb_args()
         adb_command.append("logcat")
         adb_command.extend(self.get_logcat_args())
+
+        from subprocess import Popen, PIPE
         try:
             self.proc = Popen(adb_command, stdout=PIPE)
             if self.options.input:
@@ -233,19 +613,175 @@ class LogcatColor(object):
             sys.exit(e.errno)
 
     def init_reader(self):
-        LogcatReader(self.input, self.config, profile=self.profile,
-            format=self.format, layout=self.layout, writer=self.output,
-            width=self.width)
+        ring = None
+        if self.options.ring_size > 0:
+            ring = RingBuffer(self.options.ring_size, self.options.ring_policy)
+
+        dedup = None
+        if self.options.dedup:
+            dedup = Deduplicator(self.options.dedup_window)
+
+        context = None
+        if self.options.before_context > 0 or self.options.after_context > 0:
+            context = ContextBuffer(self.options.before_context,
+                self.options.after_context, self.options.context_scope)
+
+        if self.broker is not None:
+            # serves the input until it is closed
+            from logcatcolor import broker
+            self.reader = broker.BrokerReader(self.input, self.config,
+                format=self.format, stats=self.stats, recorder=self.recorder)
+            self.broker.attach(self.reader)
+            self.reader.run()
+            return
+
+        if self.options.crashes:
+            # extracts crashes until the input is closed
+            from logcatcolor.crash import CrashExtractor
+            CrashExtractor(self.input, self.output, format=self.format,
+                json=self.options.layout == "json",
+                crash_dir=self.options.crash_dir).run()
+            return
+
+        if self.options.input and len(self.options.input) > 1:
+            # merges the inputs until they all end
+            from logcatcolor.merge import MergeReader
+            window = self.options.merge_window
+            if window is None:
+                window = MergeReader.DEFAULT_WINDOW
+            self.reader = MergeReader(self.options.input, self.config,
+                window=window, profile=self.profile,
+                format=self.format, layout=self.layout, writer=self.output,
+                width=self.width, stats=self.stats, dedup=dedup,
+                sinks=self.sinks, top=self.top, recorder=self.recorder,
+                context=context)
+            self.reader.run()
+            return
+
+        if self.can_pass_through():
+            # copies the input until it is closed
+            PassThroughReader(self.input, writer=self.output,
+                              stats=self.stats, format=self.format).run()
+            return
+
+        if self.options.threaded:
+            # runs the whole pipeline until the input is closed
+            self.reader = ThreadedLogcatReader(self.input, self.config,
+                profile=self.profile, format=self.format, layout=self.layout,
+                writer=self.output, width=self.width, stats=self.stats,
+                dedup=dedup, sinks=self.sinks, top=self.top,
+                recorder=self.recorder, context=context)
+            self.reader.run()
+            return
+
+        self.reader = LogcatReader(self.input, self.config,
+            profile=self.profile, format=self.format, layout=self.layout,
+            writer=self.output, width=self.width, stats=self.stats, ring=ring,
+            dedup=dedup, sinks=self.sinks, top=self.top,
+            recorder=self.recorder, context=context)
+
+    def can_pass_through(self):
+        # raw lines that aren't filtered, deduplicated, buffered or counted
+        # can be copied without parsing them
+        return self.layout == "raw" and not self.profile and not self.sinks \
+            and not self.options.dedup and not self.options.ring_size \
+            and not self.top and not self.recorder
+
+    def reload_config(self, config):
+        # called on the config watcher thread
+        names = [profile.name for profile in
+                 [self.profile] + [sink.profile for sink in self.sinks]
+                 if profile is not None]
+        missing = sorted(set(name for name in names
+                             if name not in config.profiles))
+        if missing:
+            print("Profile %s is missing from %s, keeping the previous " \
+                  "config" % (", ".join(missing), config.path),
+                  file=sys.stderr)
+            return False
+
+        if self.profile:
+            self.profile = config.profiles[self.profile.name]
+            from logcatcolor import pushdown
+            if self.pushdown_args is not None and self.pushdown_args != \
+                    pushdown.plan_logcat_args(self.profile,
+                        sdk=self.pushdown_sdk, pid=self.pushdown_pid):
+                print("The logcat filters of profile %s changed, and will " \
+                      "only be applied on the device after reconnecting" % \
+                      self.profile.name, file=sys.stderr)
+
+        self.config = config
+        if self.broker is not None:
+            self.broker.reload(config)
+        if self.reader is not None:
+            self.reader.reload(config)
+        return True
+
+    def connect(self):
+        layout = self.options.layout
+        if self.options.plain:
+            layout = "raw"
+
+        from logcatcolor import broker
+        try:
+            sock = broker.subscribe(self.options.connect,
+                profile=self.profile_name, layout=layout, width=self.width)
+        except (IOError, OSError) as e:
+            print("Could not connect to %s: %s" % (self.options.connect, e),
+                  file=sys.stderr)
+            sys.exit(1)
+        except ValueError as e:
+            print(str(e), file=sys.stderr)
+            sys.exit(1)
+
+        # lines arrive filtered and rendered
+        try:
+            PassThroughReader(sock, writer=self.output, stats=self.stats,
+                              verbatim=True).run()
+        finally:
+            sock.close()
+
+    def serve(self):
+        from logcatcolor import broker
+        queue_size = self.options.client_queue_size
+        if queue_size is None:
+            queue_size = broker.Subscriber.DEFAULT_QUEUE_SIZE
+        try:
+            self.broker = broker.Broker(self.options.serve, self.config,
+                queue_size=queue_size)
+        except (IOError, OSError, ValueError) as e:
+            print("Could not serve %s: %s" % (self.options.serve, e),
+                  file=sys.stderr)
+            sys.exit(1)
+        self.broker.start()
 
     def start(self):
         # if someone is piping, use stdin as input. if not, invoke adb logcat
-        if self.input.isatty():
+        if not self.options.input and self.input.isatty():
             self.start_logcat()
 
         self.init_reader()
 
     def loop(self):
+        if self.stats_writer:
+            self.stats_writer.start()
+
+        if self.top:
+            self.top.start()
+
+        watcher = None
+        if self.options.reload_config:
+            watcher = ConfigWatcher(self.config, self.reload_config)
+            watcher.start()
+
         try:
+            if self.options.connect:
+                self.connect()
+                return
+
+            if self.options.serve:
+                self.serve()
+
             self.start()
             while True:
                 asyncore.loop()
@@ -259,6 +795,26 @@ class LogcatColor(object):
                     self.proc.wait()
         except KeyboardInterrupt:
             pass
+        finally:
+            if watcher:
+                watcher.stop()
+            if self.broker:
+                self.broker.close()
+            if self.recorder:
+                self.recorder.close()
+            if self.top:
+                self.top.stop()
+            self.finish_stats()
+            if self.options.output:
+                self.output.close()
+            for sink in self.sinks:
+                sink.close()
+
+    def finish_stats(self):
+        if self.stats_writer:
+            self.stats_writer.stop()
+        if self.options.stats:
+            self.dump_stats()
 
     WAIT_FOR_DEVICE = Fore.WHITE + Back.BLACK + Style.DIM + \
                       "--- Waiting for device" + Style.RESET_ALL + \
@@ -274,7 +830,10 @@ class LogcatColor(object):
             device_str = "\"%s\" " % self.adb_device
 
         print(self.WAIT_FOR_DEVICE % device_str)
+
+        from subprocess import check_call
         check_call(command)
 
 def main():
+    colorama.init()
     LogcatColor().loop()
@@ -0,0 +1,209 @@
+"""
+logcat-color
+
+Copyright 2012, Marshall Culpepper
+Licensed under the Apache License, Version 2.0
+
+Merging of several logcat captures (e.g. of different buffers or devices)
+into a single stream ordered by time
+"""
+from __future__ import print_function, unicode_literals
+from logcatcolor.format import BriefFormat, Format
+from logcatcolor.layout import FieldLayout, Layout
+from logcatcolor.reader import ThreadedLogcatReader
+from logcatcolor.records import LineSplitter, RecordParser, iter_chunks
+from logcatcolor.timestamp import TimestampParser
+import heapq
+import os
+import sys
+
+class MergeSource(object):
+    """Parses one capture into records, each with the time it was logged
+    and the name of the capture in its "source" field. The format of each
+    capture is detected separately unless it's given."""
+
+    def __init__(self, path, name, format=None, decode_errors="backslashreplace"):
+        self.path = path
+        self.name = name
+        self.parser = RecordParser(format, markers=True)
+        self.splitter = LineSplitter(decode_errors)
+        self.timestamps = TimestampParser()
+        self.seconds = 0.0
+        self.warned = False
+
+    def records(self):
+        """Yields (seconds, record) in the order of the capture"""
+        parser, splitter = self.parser, self.splitter
+        for chunk in iter_chunks(self.path):
+            for line in splitter.feed(chunk):
+                for record in parser.feed(line):
+                    yield self.stamp(record)
+
+        for line in splitter.close():
+            for record in parser.feed(line):
+                yield self.stamp(record)
+        for record in parser.close():
+            yield self.stamp(record)
+
+    def stamp(self, record):
+        record["source"] = self.name
+        if "marker" in record:
+            # markers stay with the line before them
+            return self.seconds, record
+
+        seconds = self.timestamps.parse(record.get("date"), record.get("time"))
+        if seconds is None:
+            if not self.warned:
+                print("%s has lines without timestamps, they are merged " \
+                      "along with the line before them, or before every " \
+                      "other line at the start of it" % self.path,
+                      file=sys.stderr)
+                self.warned = True
+            seconds = self.seconds
+        self.seconds = seconds
+        return seconds, record
+
+def reorder(records, window, index):
+    """Sorts records that are at most `window` records out of order, keeping
+    only that many in memory. Yields (seconds, index, sequence, record)
+    tuples that sort by time, then by source, then in the original order."""
+    heap = []
+    sequence = 0
+    for seconds, record in records:
+        heapq.heappush(heap, (seconds, index, sequence, record))
+        sequence += 1
+        if len(heap) > window:
+            yield heapq.heappop(heap)
+
+    while heap:
+        yield heapq.heappop(heap)
+
+def merge_records(sources, window):
+    """Merges the records of every source by time, holding at most `window`
+    records of each source in memory"""
+    streams = [reorder(source.records(), window, index)
+               for index, source in enumerate(sources)]
+    for seconds, index, sequence, record in heapq.merge(*streams):
+        yield record
+
+# formats with the most fields first
+RICHEST_FORMATS = ("threadtime", "long", "time", "thread", "brief", "process",
+                   "tag")
+
+def richest_format(names):
+    """The format of the captures whose layout can show the fields of all of
+    them, or at least the most fields"""
+    for name in RICHEST_FORMATS:
+        if name in names:
+            return name
+    return BriefFormat.NAME
+
+def source_names(paths):
+    # file names, unless two captures have the same one
+    names = [os.path.basename(path) for path in paths]
+    if len(set(names)) < len(names):
+        return list(paths)
+    return names
+
+class MergeReader(ThreadedLogcatReader):
+    """A ThreadedLogcatReader whose reading thread merges several captures
+    by time. The records are parsed once by the reading thread, and handed
+    to the profile, layout and other outputs already parsed."""
+    DEFAULT_WINDOW = 256
+    BATCH_SIZE = 256
+
+    def __init__(self, paths, config, window=DEFAULT_WINDOW, format=None,
+                 **kwargs):
+        self.window = max(1, window)
+        # the format of the layout, when the captures are in different ones
+        self.merged_format = format
+        self.pending_markers = []
+        ThreadedLogcatReader.__init__(self, None, config, **kwargs)
+
+        names = source_names(paths)
+        self.sources = [MergeSource(path, name, format, self.decode_errors)
+                        for path, name in zip(paths, names)]
+
+    def set_file(self, fd):
+        # each capture is read by merge_records()
+        pass
+
+    def read_lines(self):
+        batch = []
+        stats = self.stats
+        try:
+            for record in merge_records(self.sources, self.window):
+                batch.append(record)
+                if len(batch) >= self.BATCH_SIZE:
+                    self.put_batch(batch)
+                    batch = []
+            if batch:
+                self.put_batch(batch)
+        finally:
+            if stats:
+                for source in self.sources:
+                    try:
+                        stats.bytes_read += os.path.getsize(source.path)
+                    except OSError:
+                        pass
+            self.lines.put(None)
+
+    def put_batch(self, batch):
+        if self.merged_format is None:
+            # by the first batch, every capture with records was detected
+            self.merged_format = richest_format([source.parser.format.NAME
+                for source in self.sources if source.parser.format])
+        self.lines.put(batch)
+
+    def process_line(self, record):
+        if self.stats:
+            self.stats.lines_read += 1
+        if self.pending_config is not None:
+            self.apply_config()
+
+        marker = record.get("marker")
+        if marker is not None:
+            if self.format is None:
+                self.pending_markers.append(marker)
+            else:
+                self.layout_line(marker)
+            return
+
+        if self.format is None:
+            self.init_format(self.merged_format)
+
+        if self.recorder is not None:
+            self.recorder.add(record["line"])
+
+        data = self.format.data
+        try:
+            data.update(record)
+            for name in self.fields:
+                if name not in data:
+                    data[name] = ""
+            if self.stats: self.stats.lines_parsed += 1
+            self.handle_data(data)
+        finally:
+            data.clear()
+
+    def init_format(self, format_name):
+        # the records are already parsed, the format only filters them, and
+        # picks the default layout
+        self.format = Format.TYPES[format_name]()
+        if not self.layout:
+            self.layout = Layout.TYPES[format_name](self.config, self.profile,
+                                                    self.width)
+
+        # the columns of the layout need their fields, which the lines of
+        # captures in other formats may not have
+        self.fields = tuple(column.NAME for column in self.layout.columns
+                            if column.NAME in FieldLayout.FIELDS)
+
+        markers, self.pending_markers = self.pending_markers, []
+        for marker in markers:
+            self.layout_line(marker)
+
+    def finish(self):
+        if self.format is None and self.pending_markers:
+            self.init_format(self.merged_format or BriefFormat.NAME)
+        ThreadedLogcatReader.finish(self)
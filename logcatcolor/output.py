@@ -0,0 +1,178 @@
+"""
+logcat-color
+
+Copyright 2012, Marshall Culpepper
+Licensed under the Apache License, Version 2.0
+
+File output with large buffered writes, size / time based rotation and
+background compression of rotated segments
+"""
+from __future__ import unicode_literals
+import glob
+import os
+import re
+import shutil
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+SIZE_SUFFIXES = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+def parse_size(size):
+    """Parses a size in bytes, with an optional K, M or G suffix"""
+    match = re.match(r"^\s*(\d+)\s*([KMG]?)B?\s*$", size, re.IGNORECASE)
+    if not match:
+        raise ValueError("Invalid size: %s" % size)
+    return int(match.group(1)) * SIZE_SUFFIXES[match.group(2).upper()]
+
+class FileWriter(object):
+    """A binary file writer for --output. Writes are buffered in large blocks
+    and flushed to disk by a background thread once every FLUSH_INTERVAL
+    seconds, so buffered lines are written out even when the log goes quiet.
+    When max_size (bytes) or max_age (seconds) is set, the file is rotated to
+    a timestamped segment next to it once either limit is reached. Only the
+    newest `keep` segments are retained, and when `compress` is set segments
+    are gzipped on a worker thread."""
+    BUFFER_SIZE = 1024 * 1024
+    FLUSH_INTERVAL = 1.0
+    DEFAULT_KEEP = 5
+    SEGMENT_TIME_FORMAT = "%Y%m%d-%H%M%S"
+    SEGMENT_REGEX = re.compile(r"\.\d{8}-\d{6}(\.\d+)?(\.gz)?$")
+
+    def __init__(self, path, max_size=None, max_age=None, keep=DEFAULT_KEEP,
+                 compress=False, clock=time.time):
+        self.path = path
+        self.max_size = max_size
+        self.max_age = max_age
+        self.keep = keep
+        self.clock = clock
+
+        # held while the file is written, flushed or rotated, as the flusher
+        # thread flushes it
+        self.lock = threading.Lock()
+        self.dirty = False
+
+        self.compressor = None
+        if compress:
+            self.compressions = queue.Queue()
+            self.compressor = threading.Thread(target=self.compress_segments)
+            self.compressor.daemon = True
+            self.compressor.start()
+
+        self.open()
+
+        self.closed = threading.Event()
+        self.flusher = threading.Thread(target=self.flush_periodically)
+        self.flusher.daemon = True
+        self.flusher.start()
+
+    def open(self):
+        self.file = open(self.path, "wb", self.BUFFER_SIZE)
+        self.size = 0
+        self.opened = self.last_flush = self.clock()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def isatty(self):
+        return False
+
+    def write(self, data):
+        with self.lock:
+            if self.max_size and self.size + len(data) > self.max_size and \
+                    self.size:
+                self.rotate()
+            elif self.max_age and self.clock() - self.opened >= self.max_age:
+                self.rotate()
+
+            self.file.write(data)
+            self.size += len(data)
+            self.dirty = True
+
+    def flush(self):
+        # called after every line, so only actually flush every so often
+        now = self.clock()
+        if now - self.last_flush >= self.FLUSH_INTERVAL:
+            with self.lock:
+                self.flush_file()
+            self.last_flush = now
+
+    def flush_file(self):
+        if self.dirty:
+            self.file.flush()
+            self.dirty = False
+
+    def flush_periodically(self):
+        # writes out whatever is still buffered, however long it has been
+        # since the last line
+        while not self.closed.wait(self.FLUSH_INTERVAL):
+            with self.lock:
+                self.flush_file()
+
+    def rotate(self):
+        # called with the lock held
+        self.file.close()
+        self.dirty = False
+        segment = self.get_segment_path()
+        os.rename(self.path, segment)
+        self.open()
+
+        if self.compressor:
+            self.compressions.put(segment)
+        else:
+            self.remove_old_segments()
+
+    def get_segment_path(self):
+        base = "%s.%s" % (self.path, time.strftime(self.SEGMENT_TIME_FORMAT))
+        segment = base
+        index = 1
+        while os.path.exists(segment) or os.path.exists(segment + ".gz"):
+            segment = "%s.%d" % (base, index)
+            index += 1
+        return segment
+
+    def get_segments(self):
+        segments = [path for path in glob.glob(glob.escape(self.path) + ".*")
+                    if self.SEGMENT_REGEX.match(path[len(self.path):])]
+        # timestamps sort lexically, and so do the .N suffixes of segments
+        # rotated within the same second
+        segments.sort(key=lambda path: [int(n) for n in re.findall(r"\d+",
+                                        path[len(self.path):])])
+        return segments
+
+    def remove_old_segments(self):
+        if self.keep is None:
+            return
+
+        segments = self.get_segments()
+        for segment in segments[:max(0, len(segments) - self.keep)]:
+            try:
+                os.unlink(segment)
+            except OSError:
+                pass
+
+    def compress_segments(self):
+        import gzip
+        while True:
+            segment = self.compressions.get()
+            if segment is None:
+                break
+
+            with open(segment, "rb") as src:
+                with gzip.open(segment + ".gz", "wb") as dst:
+                    shutil.copyfileobj(src, dst, self.BUFFER_SIZE)
+            os.unlink(segment)
+            self.remove_old_segments()
+
+    def close(self):
+        self.closed.set()
+        self.flusher.join()
+        with self.lock:
+            self.file.close()
+        if self.compressor:
+            self.compressions.put(None)
+            self.compressor.join()
@@ -1,10 +1,127 @@
 from __future__ import unicode_literals
+from logcatcolor.ratelimit import RateLimiter
 import re
+import threading
+
+try:
+    from time import perf_counter
+except ImportError:
+    from time import time as perf_counter
 
 RegexType = type(re.compile(""))
 
+class FilterChain(object):
+    """The checks of a profile, evaluated in order until one rejects a line.
+
+    The `checks` (priorities, packages and regex filters) can run in any
+    order.
+    One out of every `sample_rate` lines is run through all of them while
+    timing each one, and every `reorder_samples` samples they are sorted so
+    that those rejecting the most lines for the least time run first. Since
+    a line has to pass every check, the order never changes which lines are
+    included.
+
+    The profile's function `filters` run after the checks, always in the
+    order they are declared in and only on the lines that got past
+    everything before them, as a filter may rely on an earlier one."""
+    DEFAULT_SAMPLE_RATE = 64
+    DEFAULT_REORDER_SAMPLES = 32
+
+    def __init__(self, checks, filters=(), sample_rate=DEFAULT_SAMPLE_RATE,
+                 reorder_samples=DEFAULT_REORDER_SAMPLES):
+        # each check is [name, function, time spent, lines rejected,
+        #                lines sampled]
+        self.checks = [[name, function, 0.0, 0.0, 0.0]
+                       for name, function in checks]
+        self.filters = [[name, function, 0.0, 0.0, 0.0]
+                        for name, function in filters]
+        self.sample_rate = max(1, sample_rate)
+        self.reorder_samples = max(1, reorder_samples)
+        self.countdown = self.sample_rate
+        self.samples = 0
+
+    def __len__(self):
+        return len(self.checks) + len(self.filters)
+
+    def first_rejection(self, data):
+        """Returns the name of the first check rejecting data, or None when
+        every check includes it"""
+        self.countdown -= 1
+        if not self.countdown:
+            self.countdown = self.sample_rate
+            return self.sample(data)
+
+        for check in self.checks:
+            if not check[1](data):
+                return check[0]
+        for filter in self.filters:
+            if not filter[1](data):
+                return filter[0]
+        return None
+
+    def sample(self, data):
+        rejected_by = None
+        for check in self.checks:
+            start = perf_counter()
+            included = check[1](data)
+            check[2] += perf_counter() - start
+            check[4] += 1
+
+            if not included:
+                check[3] += 1
+                if rejected_by is None:
+                    rejected_by = check[0]
+
+        # filters are only timed on the lines they would see anyway
+        if rejected_by is None:
+            for filter in self.filters:
+                start = perf_counter()
+                included = filter[1](data)
+                filter[2] += perf_counter() - start
+                filter[4] += 1
+                if not included:
+                    filter[3] += 1
+                    rejected_by = filter[0]
+                    break
+
+        self.samples += 1
+        if self.samples % self.reorder_samples == 0:
+            self.reorder()
+        return rejected_by
+
+    @staticmethod
+    def rank(check):
+        # every rejected line spares the checks after it, so the best check
+        # to run first is the one spending the least time per rejection
+        if not check[3]:
+            return (float("inf"), check[2])
+        return (check[2] / check[3], check[2])
+
+    def reorder(self):
+        # sorted into a new list, as the stats thread may be reading it
+        checks = sorted(self.checks, key=self.rank)
+
+        # halve the totals, so that the order follows changes in the log
+        for check in checks + self.filters:
+            check[2] /= 2
+            check[3] /= 2
+            check[4] /= 2
+        self.checks = checks
+
+    def describe(self):
+        """The checks in their current order, then the filters, with their
+        sampled time per line (in seconds) and rejection rate"""
+        return [{"name": name,
+                 "time": time / sampled if sampled else 0.0,
+                 "rejection_rate": rejected / sampled if sampled else 0.0}
+                for name, function, time, rejected, sampled in
+                self.checks + self.filters]
+
 class Profile(object):
     __profiles__ = {}
+    # while a config is loading, the profiles it creates on that thread are
+    # registered into the config's own registry instead
+    __loading__ = threading.local()
 
     @classmethod
     def get_profile(cls, name):
@@ -12,17 +129,25 @@ class Profile(object):
 
     def __init__(self, name=None, tags=None, priorities=None, filters=None,
             buffers=None, wrap=True, device=None, emulator=None, format=None,
-            packages=None):
+            packages=None, rate_limit=None, rate_limit_burst=None,
+            rate_limit_pid=False, reorder_filters=False):
         if not name:
             raise Exception("Profile is missing a name")
 
         self.name = name
-        self.__profiles__[name] = self
+        registry = getattr(self.__loading__, "profiles", None)
+        if registry is None:
+            registry = self.__profiles__
+        registry[name] = self
+        self.rejections = {}
 
         self.init_tags(tags)
         self.init_priorities(priorities)
         self.init_filters(filters)
         self.init_packages(packages)
+        self.init_rate_limit(rate_limit, rate_limit_burst, rate_limit_pid)
+        self.reorder_filters = reorder_filters
+        self.init_chain()
         self.buffers = buffers
         self.wrap = wrap
         self.device = device
@@ -42,6 +167,32 @@ class Profile(object):
 
                 self.package_search[package] = (search_string, regex, regex51)
 
+    def init_rate_limit(self, rate_limit, burst, by_pid):
+        self.rate_limiter = None
+        if rate_limit:
+            self.rate_limiter = RateLimiter(rate_limit, burst=burst,
+                                            by_pid=by_pid)
+
+    def init_chain(self):
+        checks = []
+        if self.priorities:
+            checks.append(("priorities",
+                lambda data: data.get("priority") in self.priorities))
+        if self.package_search:
+            checks.append(("packages",
+                lambda data: data.get("pid") in self.pid_map.values()))
+        filters = []
+        for filter in self.filters:
+            # regex filters only search the message, and function filters
+            # can be declared to be as independent of each other
+            name = getattr(filter, "__name__", "filter")
+            if self.reorder_filters or getattr(filter, "pattern", None):
+                checks.append((name, filter))
+            else:
+                filters.append((name, filter))
+
+        self.chain = FilterChain(checks, filters)
+
     def init_tags(self, tags):
         self.tags = None
         self.tag_colors = None
@@ -51,7 +202,7 @@ class Profile(object):
         elif isinstance(tags, (list, tuple)):
             self.tags = tags
         elif tags:
-            self.tags = (tags)
+            self.tags = (tags,)
 
     def init_priorities(self, priorities):
         self.priorities = None
@@ -83,6 +234,8 @@ class Profile(object):
             if "message" not in data:
                 return True
             return pattern.search(data["message"])
+        __filter.__name__ = "regex(%s)" % pattern.pattern
+        __filter.pattern = pattern
         return __filter
 
     def process_new_pid(self, data):
@@ -96,6 +249,21 @@ class Profile(object):
                 if match51:
                     self.pid_map[package] = match51.group(1)
 
+    def take_state(self, previous):
+        """Carries over what the profile this one replaces learned while
+        running, when the config is reloaded"""
+        for package in self.package_search:
+            if package in previous.pid_map:
+                self.pid_map[package] = previous.pid_map[package]
+
+        for rule, count in previous.rejections.items():
+            self.rejections[rule] = self.rejections.get(rule, 0) + count
+
+    def reject(self, rule):
+        # count which rule rejected the line, for --stats
+        self.rejections[rule] = self.rejections.get(rule, 0) + 1
+        return False
+
     def include(self, data):
         if not data:
             raise Exception("data should not be None")
@@ -103,19 +271,22 @@ class Profile(object):
         self.process_new_pid(data)  #process pid
 
         if self.tags and data.get("tag") not in self.tags:
-            return False
-
-        if self.priorities and data.get("priority") not in self.priorities:
-            return False
+            return self.reject("tags")
 
-        if self.package_search and data.get("pid") not in self.pid_map.values():
-            return False
+        return self.include_tagged(data)
 
-        if not self.filters:
-            return True
+    def include_tagged(self, data):
+        """The rest of include(), for callers that already processed new pids
+        and checked the tag of the line"""
+        # priorities and packages, cheapest and most selective first, then
+        # the filters in order
+        if len(self.chain):
+            rule = self.chain.first_rejection(data)
+            if rule is not None:
+                return self.reject(rule)
 
-        for filter in self.filters:
-            if not filter(data):
-                return False
+        # only lines that would otherwise be shown use up the rate limit
+        if self.rate_limiter and not self.rate_limiter.allow(data):
+            return self.reject("rate_limit")
 
         return True
@@ -0,0 +1,95 @@
+"""
+logcat-color
+
+Copyright 2012, Marshall Culpepper
+Licensed under the Apache License, Version 2.0
+
+Translates the parts of a profile that logcat can evaluate on the device into
+logcat arguments, so that fewer lines are sent over USB. The profile is still
+applied in full to every line that comes back.
+"""
+from __future__ import unicode_literals
+import re
+
+PRIORITY_ORDER = "VDIWEF"
+
+# the tag "Start proc" messages are logged with, which profiles tracking
+# packages need to see
+START_PROC_TAG = "ActivityManager"
+
+# --pid and -e / --regex were added to logcat in Android 7.0
+MIN_SDK_PID = 24
+MIN_SDK_REGEX = 24
+
+# tags that can't be written in a TAG:PRIORITY filterspec
+UNSAFE_TAG_REGEX = re.compile(r"[\s:*]")
+
+# only regexes that mean the same in Python and in logcat's ECMAScript
+# regex dialect: plain text without any special characters
+SIMPLE_REGEX = re.compile(r"^[\w ,;=/-]+$")
+
+def min_priority(priorities):
+    known = [p for p in priorities or () if p in PRIORITY_ORDER]
+    if not known:
+        return None
+    return min(known, key=PRIORITY_ORDER.index)
+
+def plan_filterspecs(profile):
+    """Returns TAG:PRIORITY filterspecs for the profile's tags and
+    priorities, or an empty list when nothing can be pushed down"""
+    priority = min_priority(profile.priorities)
+    tags = list(profile.tags) if profile.tags else None
+
+    if tags:
+        if any(not tag or UNSAFE_TAG_REGEX.search(tag) for tag in tags):
+            return []
+
+        specs = ["%s:%s" % (tag, priority or "V") for tag in tags]
+        if profile.package_search and START_PROC_TAG not in tags:
+            specs.append("%s:I" % START_PROC_TAG)
+        return specs + ["*:S"]
+
+    if priority and priority != "V":
+        if profile.package_search:
+            return ["%s:I" % START_PROC_TAG, "*:%s" % priority]
+        return ["*:%s" % priority]
+
+    return []
+
+def plan_regex(profile, sdk):
+    # "Start proc" messages would be filtered out by the regex
+    if not sdk or sdk < MIN_SDK_REGEX or profile.package_search:
+        return []
+
+    for filter in profile.filters:
+        pattern = getattr(filter, "pattern", None)
+        # flags like re.IGNORECASE can't be passed on to logcat
+        if pattern is not None and not pattern.flags & ~re.UNICODE and \
+           SIMPLE_REGEX.match(pattern.pattern):
+            return ["--regex", pattern.pattern]
+    return []
+
+def plan_pid(pid, sdk):
+    if not pid or not sdk or sdk < MIN_SDK_PID:
+        return []
+    return ["--pid", pid]
+
+def plan_logcat_args(profile, sdk=None, pid=None):
+    """Returns the logcat arguments that filter out lines the profile would
+    reject anyway. sdk is the device's SDK version, if known, and pid is the
+    pid of the profile's single package if it should be pushed down too."""
+    if not profile:
+        return []
+
+    # options have to come before filterspecs
+    return plan_pid(pid, sdk) + plan_regex(profile, sdk) + \
+           plan_filterspecs(profile)
+
+def wants_sdk(profile, pid_pushdown=False):
+    """Whether planning for the profile depends on the device's SDK version"""
+    if not profile:
+        return False
+    if pid_pushdown and len(profile.package_search) == 1:
+        return True
+    return not profile.package_search and \
+        any(getattr(f, "pattern", None) is not None for f in profile.filters)
@@ -0,0 +1,127 @@
+"""
+logcat-color
+
+Copyright 2012, Marshall Culpepper
+Licensed under the Apache License, Version 2.0
+
+Per-tag (and optionally per-pid) rate limiting with token buckets
+"""
+from __future__ import unicode_literals
+from collections import OrderedDict
+
+try:
+    from time import monotonic
+except ImportError:
+    from time import time as monotonic
+
+class RateLimiter(object):
+    """Limits each tag to `rate` lines per second, with bursts of up to
+    `burst` lines. `rate` is either a number applying to every tag, or a dict
+    of tag to rate where the "*" key, if present, applies to all other tags.
+
+    Lines over the limit are suppressed and counted, and every
+    `summary_interval` seconds a summary record is made available for each
+    tag that had lines suppressed."""
+    DEFAULT_MAX_KEYS = 4096
+    DEFAULT_SUMMARY_INTERVAL = 5.0
+    SUPPRESSED_MESSAGE = "%d lines suppressed by rate limit"
+    SUPPRESSED_LINE = "--------- tag %s: %d lines suppressed by rate limit"
+
+    def __init__(self, rate, burst=None, by_pid=False,
+                 max_keys=DEFAULT_MAX_KEYS,
+                 summary_interval=DEFAULT_SUMMARY_INTERVAL, clock=monotonic):
+        if isinstance(rate, dict):
+            self.rates = dict(rate)
+            self.default_rate = self.rates.pop("*", None)
+        else:
+            self.rates = {}
+            self.default_rate = rate
+
+        self.burst = burst
+        self.by_pid = by_pid
+        self.max_keys = max_keys
+        self.summary_interval = summary_interval
+        self.clock = clock
+
+        # key -> [tokens, last refill time, rate, burst, suppressed count,
+        #         first suppressed record]
+        self.buckets = OrderedDict()
+        self.summaries = []
+        self.summary_due = False
+        self.next_summary = clock() + summary_interval
+
+    def get_rate(self, tag):
+        return self.rates.get(tag, self.default_rate)
+
+    def allow(self, data):
+        tag = data.get("tag")
+        if self.by_pid:
+            key = (tag, data.get("pid"))
+        else:
+            key = tag
+
+        now = self.clock()
+        if now >= self.next_summary:
+            self.collect_summaries()
+            self.next_summary = now + self.summary_interval
+
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            rate = self.get_rate(tag)
+            if rate is None:
+                return True
+
+            burst = self.burst or max(1, rate)
+            bucket = self.buckets[key] = [burst, now, rate, burst, 0, None]
+            if len(self.buckets) > self.max_keys:
+                self.evict()
+        else:
+            self.buckets.move_to_end(key)
+
+        tokens = bucket[0] + (now - bucket[1]) * bucket[2]
+        if tokens > bucket[3]:
+            tokens = bucket[3]
+        bucket[1] = now
+
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return True
+
+        bucket[0] = tokens
+        if not bucket[4]:
+            bucket[5] = dict(data)
+        bucket[4] += 1
+        return False
+
+    def evict(self):
+        # the least recently seen key goes, but its suppressed lines are
+        # still reported
+        key, bucket = self.buckets.popitem(last=False)
+        if bucket[4]:
+            self.add_summary(key, bucket)
+
+    def add_summary(self, key, bucket):
+        count, data = bucket[4], bucket[5]
+        summary = dict(data)
+        summary["message"] = self.SUPPRESSED_MESSAGE % count
+        summary["line"] = self.SUPPRESSED_LINE % (data.get("tag"), count)
+        self.summaries.append(summary)
+        self.summary_due = True
+
+        bucket[4] = 0
+        bucket[5] = None
+
+    def collect_summaries(self):
+        for key, bucket in self.buckets.items():
+            if bucket[4]:
+                self.add_summary(key, bucket)
+
+    def take_summaries(self):
+        summaries = self.summaries
+        self.summaries = []
+        self.summary_due = False
+        return summaries
+
+    def flush(self):
+        self.collect_summaries()
+        return self.take_summaries()
@@ -13,18 +13,27 @@ from io import StringIO
 import fcntl
 from logcatcolor.format import BriefFormat, Format, detect_format
 from logcatcolor.layout import BriefLayout, Layout
+from logcatcolor.ring import RingBuffer
+from logcatcolor.router import ProfileRouter
 import os
 import sys
-import traceback
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 # Parts copied from asyncore.file_dispatcher
 class FileLineReader(asynchat.async_chat):
     LINE_TERMINATOR = b"\n"
+    DECODE_ERRORS = "backslashreplace"
 
     def __init__(self, fd):
         asynchat.async_chat.__init__(self)
         self.connected = True
         self.log_buffer = StringIO()
+        self.decode_errors = self.DECODE_ERRORS
 
         self.set_file(fd)
         self.set_terminator(self.LINE_TERMINATOR)
@@ -47,13 +56,14 @@ class FileLineReader(asynchat.async_chat):
     def collect_incoming_data(self, data):
         # some logcat message may not be valid UTF-8. For example, Magisk Manager after
         # hiding uses title Manager\xc0\x80\xc0\x80\xc0\x80\xc0\x80\xc0\x80\xc0\x80\xc0\x80
-        self.log_buffer.write(data.decode('utf-8', errors='backslashreplace'))
+        self.log_buffer.write(data.decode('utf-8', errors=self.decode_errors))
 
     def found_terminator(self):
         line = self.log_buffer.getvalue()
         try:
             self.process_line(line)
         except:
+            import traceback
             traceback.print_exc()
             sys.exit(1)
 
@@ -65,13 +75,25 @@ class FileLineReader(asynchat.async_chat):
 class LogcatReader(FileLineReader):
     DETECT_COUNT = 3
 
+    DROPPED_MARKER = "--------- logcat-color dropped %d lines"
+
     def __init__(self, file, config, profile=None, format=None, layout=None,
-                 writer=None, width=80):
+                 writer=None, width=80, stats=None, ring=None, dedup=None,
+                 sinks=None, top=None, recorder=None, context=None):
         FileLineReader.__init__(self, file)
         self.detect_lines = []
         self.config = config
         self.profile = profile
         self.width = width
+        self.dedup = dedup
+        self.top = top
+        self.recorder = recorder
+        self.context = context
+        self.rate_limiter = profile.rate_limiter if profile else None
+        self.stats = stats
+        if stats:
+            stats.set_input(file)
+            stats.add_profile(profile)
         self.writer = writer or sys.stdout
         try:
             self.writer = self.writer.buffer
@@ -87,8 +109,120 @@ class LogcatReader(FileLineReader):
         if layout is not None:
             LayoutType = Layout.TYPES[layout]
             self.layout = LayoutType(config, profile, width)
+            self.decode_errors = LayoutType.DECODE_ERRORS
+
+        # Extra outputs, each with their own layout and optionally their own
+        # profile. Lines are only parsed once, and only decoded losslessly
+        # if any output wants it.
+        self.sinks = sinks or []
+        for sink in self.sinks:
+            if sink.layout.DECODE_ERRORS == "surrogateescape":
+                self.decode_errors = "surrogateescape"
+
+        self.init_routes()
+
+        # a reloaded config waiting to be swapped in before the next line
+        self.pending_config = None
+        self.reloaded_layout = None
+
+        # With a ring buffer, lines are rendered and written on a separate
+        # thread so that a slow terminal never stops us from draining adb
+        self.ring = ring
+        self.render_thread = None
+        if ring is not None:
+            self.render_thread = threading.Thread(target=self.render_ring)
+            self.render_thread.daemon = True
+            self.render_thread.start()
+
+    def init_routes(self):
+        # sinks without their own profile share the reader's, all other
+        # profiles are evaluated together by a router
+        self.shared_sinks = [sink for sink in self.sinks if sink.profile is None
+                             or sink.profile is self.profile]
+        self.routes = {}
+        for sink in self.sinks:
+            if sink not in self.shared_sinks:
+                self.routes.setdefault(sink.profile, []).append(sink)
+        self.router = None
+        if self.routes:
+            self.router = ProfileRouter([sink.profile for sink in self.sinks
+                                         if sink.profile in self.routes])
+
+    def reload(self, config):
+        """Schedules a reloaded config to replace the current one. It's
+        swapped in by the reading thread, before the next line is processed."""
+        self.pending_config = config
+
+    def apply_config(self):
+        config = self.pending_config
+        self.pending_config = None
+
+        # profiles are replaced by the reloaded profiles with the same name,
+        # keeping the pids of the packages they already saw start, and the
+        # lines they rejected
+        if self.router is not None:
+            self.router.count_rejections()
+        replaced = {}
+        def replace(profile):
+            if profile is None:
+                return None
+            if profile not in replaced:
+                new_profile = config.profiles.get(profile.name)
+                if new_profile is None:
+                    new_profile = profile
+                elif new_profile is not profile:
+                    new_profile.take_state(profile)
+                replaced[profile] = new_profile
+            return replaced[profile]
+
+        if self.rate_limiter is not None:
+            for summary in self.rate_limiter.flush():
+                self.output_data(summary)
+
+        self.config = config
+        self.profile = replace(self.profile)
+        self.rate_limiter = self.profile.rate_limiter if self.profile else None
+        if self.stats:
+            self.stats.add_profile(self.profile)
+
+        for sink in self.sinks:
+            sink.reload(config, replace(sink.profile))
+        self.init_routes()
+
+        if self.layout is not None:
+            layout = (self.reloaded_layout or self.layout).reload(config,
+                                                                  self.profile)
+            if self.ring is not None:
+                # the render thread picks it up between batches
+                self.reloaded_layout = layout
+            else:
+                self.layout = layout
 
     def __del__(self):
+        self.flush_detect_lines()
+
+    def handle_close(self):
+        self.finish()
+        FileLineReader.handle_close(self)
+
+    def finish(self):
+        self.flush_detect_lines()
+        self.flush_record()
+        if self.dedup is not None:
+            for summary in self.dedup.flush():
+                self.output_data(summary)
+        if self.rate_limiter is not None:
+            for summary in self.rate_limiter.flush():
+                self.output_data(summary)
+        self.flush_output()
+        if self.router is not None:
+            self.router.count_rejections()
+
+        if self.ring is not None:
+            self.ring.close()
+            self.render_thread.join()
+
+    def flush_detect_lines(self):
         # Clear the "detect" lines if we weren't able to detect a format
         if len(self.detect_lines) > 0 and not self.format:
             self.format = BriefFormat()
@@ -97,6 +231,7 @@ class LogcatReader(FileLineReader):
 
             for line in self.detect_lines:
                 self.layout_line(line)
+            self.detect_lines = []
 
     def detect_format(self, line):
         if len(self.detect_lines) < self.DETECT_COUNT:
@@ -115,7 +250,17 @@ class LogcatReader(FileLineReader):
         self.detect_lines = []
         return True
 
+    def collect_incoming_data(self, data):
+        if self.stats:
+            self.stats.bytes_read += len(data)
+        FileLineReader.collect_incoming_data(self, data)
+
     def process_line(self, line):
+        if self.stats:
+            self.stats.lines_read += 1
+        if self.pending_config is not None:
+            self.apply_config()
+
         line = line.strip()
         if not self.format:
             if not self.detect_format(line):
@@ -124,21 +269,454 @@ class LogcatReader(FileLineReader):
         self.layout_line(line)
 
     def layout_line(self, line):
+        stats = self.stats
+        timer = stats and stats.timer()
+        if self.recorder is not None:
+            # every line is recorded, whatever the profile includes
+            self.recorder.add(line)
         if Format.MARKER_REGEX.match(line):
-            result = self.layout.layout_marker(line)
-            if result:
-                self.writer.write(result.encode('utf-8'))
+            self.flush_record()
+            if stats: stats.markers += 1
+            for sink in self.sinks:
+                sink.write_marker(line)
+            if self.top is not None:
+                return
+            self.output_marker(line)
             return
 
+        data = self.format.data
         try:
-            if not self.format.match(line) or not self.format.include(self.profile):
+            matched = self.format.match(line)
+            if not matched:
+                # None is a line of a record that isn't complete yet
+                if stats and matched is not None: stats.lines_unparsed += 1
                 return
 
-            result = self.layout.layout_data(self.format.data)
-            if not result:
+            if stats: stats.lines_parsed += 1
+            if timer: timer.mark("parse")
+            self.handle_data(data, timer)
+        finally:
+            data.clear()
+
+    def flush_record(self):
+        # a multi-line record still being assembled is complete at the end
+        # of the input, or at a marker
+        if self.format is None:
+            return
+        data = self.format.data
+        try:
+            if self.format.flush():
+                if self.stats: self.stats.lines_parsed += 1
+                self.handle_data(data)
+        finally:
+            data.clear()
+
+    def handle_data(self, data, timer=None):
+        stats = self.stats
+        included = self.format.include(self.profile)
+        if timer: timer.mark("filter")
+        if self.sinks:
+            self.tee(data, included)
+        if self.rate_limiter is not None and self.rate_limiter.summary_due:
+            for summary in self.rate_limiter.take_summaries():
+                self.output_data(summary)
+        if not included:
+            if stats: stats.lines_rejected += 1
+            if self.context is not None and self.top is None and \
+                    self.context.reject(data):
+                self.output_data(data, timer)
+                self.flush_output()
+            return
+
+        if self.top is not None:
+            # counted instead of printed
+            self.top.add(data)
+            return
+
+        if self.context is not None:
+            separator, context = self.context.include(data)
+            if separator:
+                self.output_marker(self.context.SEPARATOR)
+            for record in context:
+                self.output_data(record)
+
+        if self.dedup is not None:
+            duplicate, summaries = self.dedup.add(data)
+            for summary in summaries:
+                self.output_data(summary)
+            if duplicate:
+                if stats: stats.lines_repeated += 1
                 return
 
-            self.writer.write((result + "\n").encode('utf-8'))
+        self.output_data(data, timer)
+        self.flush_output()
+
+    def flush_output(self):
+        # with a ring buffer, the render thread flushes once per batch
+        if self.ring is None:
             self.writer.flush()
+
+    def tee(self, data, included):
+        if included:
+            for sink in self.shared_sinks:
+                sink.write_data(data)
+                sink.flush()
+
+        if self.router is not None:
+            for profile in self.router.route(data):
+                for sink in self.routes[profile]:
+                    sink.write_data(data)
+                    sink.flush()
+
+    def output_data(self, data, timer=None):
+        if self.top is not None:
+            return
+        if self.ring is not None:
+            self.ring.put((None, dict(data)),
+                          RingBuffer.rank(data.get("priority")))
+        else:
+            self.render_data(data, timer)
+
+    def output_marker(self, line):
+        if self.ring is not None:
+            self.ring.put((line, None), RingBuffer.MARKER_RANK)
+        else:
+            self.render_marker(line)
+
+    def render_marker(self, line):
+        result = self.layout.layout_marker(line)
+        if result:
+            self.write_output((result + "\n").encode('utf-8',
+                                                     self.layout.ENCODE_ERRORS))
+
+    def render_data(self, data, timer=None):
+        result = self.layout.layout_data(data)
+        if timer: timer.mark("render")
+        if not result:
+            return
+
+        self.write_output((result + "\n").encode('utf-8',
+                                                 self.layout.ENCODE_ERRORS))
+        if timer: timer.mark("write")
+        if self.stats: self.stats.lines_rendered += 1
+
+    def render_ring(self):
+        stats = self.stats
+        while True:
+            batch = self.ring.get()
+            if batch is None:
+                break
+
+            items, dropped = batch
+            if self.reloaded_layout is not None:
+                self.layout, self.reloaded_layout = self.reloaded_layout, None
+
+            if dropped:
+                if stats: stats.lines_dropped += dropped
+                self.render_marker(self.DROPPED_MARKER % dropped)
+
+            for marker, data in items:
+                if marker is not None:
+                    self.render_marker(marker)
+                else:
+                    timer = stats and stats.timer(stats.lines_rendered)
+                    self.render_data(data, timer)
+
+            # flush once per batch rather than once per line
+            self.writer.flush()
+
+    def write_output(self, data):
+        self.writer.write(data)
+        if self.stats:
+            self.stats.bytes_written += len(data)
+
+class QueueWriter(object):
+    """Collects the output rendered for a batch of lines, so it can be handed
+    to the writer thread in one piece"""
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+
+    def flush(self):
+        pass
+
+    def send(self):
+        if self.chunks:
+            self.queue.put(b"".join(self.chunks))
+            self.chunks = []
+
+class ThreadedLogcatReader(LogcatReader):
+    """A LogcatReader that runs as a three stage pipeline instead of an
+    asyncore channel: a thread reading adb output, the calling thread parsing,
+    filtering and rendering batches of lines, and a thread writing the
+    rendered output. Stages are connected by bounded queues of batches."""
+    READ_SIZE = 64 * 1024
+    QUEUE_SIZE = 16
+
+    def __init__(self, file, config, **kwargs):
+        self.lines = queue.Queue(self.QUEUE_SIZE)
+        self.output = queue.Queue(self.QUEUE_SIZE)
+        LogcatReader.__init__(self, file, config, **kwargs)
+
+        self.out_writer = self.writer
+        self.writer = QueueWriter(self.output)
+
+    def set_file(self, fd):
+        # reads are done by a blocking thread, not by asyncore
+        try:
+            fd = fd.fileno()
+        except AttributeError:
+            pass
+        self.fd = fd
+
+    def run(self):
+        threads = [threading.Thread(target=self.read_lines),
+                   threading.Thread(target=self.write_chunks)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        try:
+            while True:
+                lines = self.lines.get()
+                if lines is None:
+                    break
+
+                for line in lines:
+                    self.process_line(line)
+                self.send_batch()
+
+            self.finish()
+            self.send_batch()
         finally:
-            self.format.data.clear()
+            self.output.put(None)
+            threads[1].join()
+
+    def send_batch(self):
+        self.writer.send()
+
+    def read_lines(self):
+        partial = b""
+        stats = self.stats
+        try:
+            while True:
+                data = os.read(self.fd, self.READ_SIZE)
+                if not data:
+                    break
+
+                if stats:
+                    stats.bytes_read += len(data)
+
+                lines = (partial + data).split(self.LINE_TERMINATOR)
+                partial = lines.pop()
+                if lines:
+                    self.lines.put([line.decode('utf-8', errors=self.decode_errors)
+                                    for line in lines])
+        finally:
+            self.lines.put(None)
+
+    def write_chunks(self):
+        while True:
+            chunk = self.output.get()
+            if chunk is None:
+                break
+
+            self.out_writer.write(chunk)
+            self.out_writer.flush()
+
+class PassThroughReader(object):
+    """Copies logcat output to the writer in large blocks of whole lines,
+    for the raw layout when there is nothing to filter or transform.
+
+    The output is the same as LogcatReader's: lines are stripped, and blank
+    lines and lines that can't be parsed are dropped. Each block is still
+    checked line by line, but when every line of it is valid UTF-8 that is
+    kept as it is, the block is written out as it was read.
+
+    With `verbatim`, blocks are copied without looking at their lines, for
+    output that was already rendered (like that of a --serve broker)."""
+    READ_SIZE = 256 * 1024
+    DECODE_ERRORS = "backslashreplace"
+    DETECT_COUNT = LogcatReader.DETECT_COUNT
+
+    def __init__(self, file, writer=None, stats=None, format=None,
+                 verbatim=False):
+        try:
+            file = file.fileno()
+        except AttributeError:
+            pass
+        self.fd = file
+        self.stats = stats
+        if stats:
+            stats.set_input(file)
+        self.verbatim = verbatim
+
+        self.format = None
+        if format is not None:
+            self.format = Format.TYPES[format]()
+        self.detect_lines = []
+
+        self.writer = writer or sys.stdout
+        try:
+            self.writer = self.writer.buffer
+        except AttributeError:
+            pass
+
+    def run(self):
+        partial = b""
+        while True:
+            data = os.read(self.fd, self.READ_SIZE)
+            if not data:
+                break
+            if self.stats:
+                self.stats.bytes_read += len(data)
+
+            end = data.rfind(b"\n") + 1
+            if not end:
+                partial += data
+                continue
+
+            if partial:
+                data = partial + data
+                end += len(partial)
+            partial = data[end:]
+            self.write_block(data[:end] if partial else data)
+        # like LogcatReader, a trailing line without a newline is dropped
+        self.finish()
+
+    def write_block(self, block):
+        if self.verbatim:
+            if self.stats:
+                lines = block.count(b"\n")
+                self.stats.lines_read += lines
+                self.stats.lines_rendered += lines
+            self.write(block)
+            return
+
+        try:
+            text = block.decode("utf-8")
+            changed = False
+        except UnicodeDecodeError:
+            text = block.decode("utf-8", self.DECODE_ERRORS)
+            changed = True
+
+        lines = text.split("\n")
+        lines.pop()
+        if self.stats:
+            self.stats.lines_read += len(lines)
+
+        output = []
+        format = self.format
+        if format is None or format.MULTILINE or format.regex is None:
+            for line in lines:
+                self.process_line(line.strip(), output)
+            changed = True
+        else:
+            changed = self.copy_lines(lines, format.regex, output) or changed
+
+        if changed:
+            block = "".join([line + "\n" for line in output]).encode("utf-8")
+        self.write(block)
+
+    def copy_lines(self, lines, regex, output):
+        # layout_line() inlined for formats of single lines, returns whether
+        # any line was changed or dropped
+        changed = False
+        markers = parsed = unparsed = 0
+        is_marker = Format.MARKER_REGEX.match
+        match = regex.match
+        for line in lines:
+            stripped = line.strip()
+            if len(stripped) != len(line):
+                changed = True
+                if not stripped:
+                    unparsed += 1
+                    continue
+
+            if is_marker(stripped):
+                markers += 1
+            elif match(stripped):
+                parsed += 1
+            else:
+                unparsed += 1
+                changed = True
+                continue
+            output.append(stripped)
+
+        stats = self.stats
+        if stats:
+            stats.markers += markers
+            stats.lines_parsed += parsed
+            stats.lines_unparsed += unparsed
+            stats.lines_rendered += parsed
+        return changed
+
+    def process_line(self, line, output):
+        if self.format is None:
+            if len(self.detect_lines) < self.DETECT_COUNT:
+                self.detect_lines.append(line)
+                return
+            self.init_format(detect_format(self.detect_lines) or
+                             BriefFormat.NAME, output)
+        self.layout_line(line, output)
+
+    def init_format(self, format_name, output):
+        self.format = Format.TYPES[format_name]()
+        lines, self.detect_lines = self.detect_lines, []
+        for line in lines:
+            self.layout_line(line, output)
+
+    def layout_line(self, line, output):
+        # LogcatReader.layout_line, for the raw layout
+        stats = self.stats
+        if Format.MARKER_REGEX.match(line):
+            self.flush_record(output)
+            if stats: stats.markers += 1
+            output.append(line)
+            return
+
+        data = self.format.data
+        try:
+            matched = self.format.match(line)
+            if matched:
+                self.output_data(data, output)
+            elif stats and matched is not None:
+                stats.lines_unparsed += 1
+        finally:
+            data.clear()
+
+    def flush_record(self, output):
+        data = self.format.data
+        try:
+            if self.format.flush():
+                self.output_data(data, output)
+        finally:
+            data.clear()
+
+    def output_data(self, data, output):
+        stats = self.stats
+        if stats:
+            stats.lines_parsed += 1
+            stats.lines_rendered += 1
+        output.append(data["line"])
+
+    def write(self, block):
+        if not block:
+            return
+        self.writer.write(block)
+        self.writer.flush()
+        if self.stats:
+            self.stats.bytes_written += len(block)
+
+    def finish(self):
+        output = []
+        if self.format is None and self.detect_lines:
+            self.init_format(BriefFormat.NAME, output)
+        if self.format is not None:
+            self.flush_record(output)
+        self.write("".join([line + "\n" for line in output]).encode("utf-8"))
+        self.writer.flush()
@@ -0,0 +1,110 @@
+"""
+logcat-color
+
+Copyright 2012, Marshall Culpepper
+Licensed under the Apache License, Version 2.0
+
+A flight recorder that keeps the most recent lines of every tag, and dumps
+them to a file when a trigger (like a crash) is seen
+"""
+from __future__ import unicode_literals
+from collections import deque
+import os
+import re
+import time
+
+try:
+    from time import monotonic
+except ImportError:
+    from time import time as monotonic
+
+class FlightRecorder(object):
+    """Keeps the last `max_lines` lines, and / or the last `max_bytes` bytes
+    of lines, whether or not the profile includes them. Lines are kept as
+    the encoded raw line, and the size of each one includes a fixed estimate
+    of its overhead so that memory use stays bounded however small the lines
+    are.
+
+    When a line matches one of the trigger patterns, the recorded lines are
+    written to a new timestamped file in `directory`, followed by every line
+    for the next `after` seconds. Another trigger within that time extends
+    the same dump."""
+    DEFAULT_TRIGGERS = ("FATAL EXCEPTION", "ANR in ")
+    DEFAULT_AFTER = 10.0
+    DUMP_TIME_FORMAT = "%Y%m%d-%H%M%S"
+    DUMP_NAME = "logcat-color-%s%s.log"
+
+    # bytes object header and deque slot, roughly
+    LINE_OVERHEAD = 48
+
+    def __init__(self, max_lines=None, max_bytes=None, triggers=DEFAULT_TRIGGERS,
+                 after=DEFAULT_AFTER, directory=".", clock=monotonic,
+                 wall_clock=time.time, on_dump=None):
+        if not max_lines and not max_bytes:
+            raise ValueError("The flight recorder needs a size in lines or bytes")
+
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.trigger = re.compile("|".join("(?:%s)" % pattern
+                                           for pattern in triggers))
+        self.after = after
+        self.directory = directory
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self.on_dump = on_dump
+
+        self.lines = deque()
+        self.size = 0
+
+        self.dump = None
+        self.dump_path = None
+        self.dump_lines = 0
+        self.deadline = None
+        self.dumps = 0
+
+    def add(self, line):
+        data = line.encode("utf-8", "surrogateescape") + b"\n"
+        lines = self.lines
+        lines.append(data)
+        self.size += len(data) + self.LINE_OVERHEAD
+        while (self.max_lines and len(lines) > self.max_lines) or \
+              (self.max_bytes and self.size > self.max_bytes and len(lines) > 1):
+            self.size -= len(lines.popleft()) + self.LINE_OVERHEAD
+
+        if self.dump is not None:
+            if self.clock() >= self.deadline:
+                self.close()
+            else:
+                self.dump.write(data)
+                self.dump_lines += 1
+
+        if self.trigger.search(line):
+            if self.dump is None:
+                self.open_dump()
+            self.deadline = self.clock() + self.after
+
+    def open_dump(self):
+        stamp = time.strftime(self.DUMP_TIME_FORMAT,
+                              time.localtime(self.wall_clock()))
+        path = os.path.join(self.directory, self.DUMP_NAME % (stamp, ""))
+        index = 0
+        while os.path.exists(path):
+            index += 1
+            path = os.path.join(self.directory,
+                                self.DUMP_NAME % (stamp, ".%d" % index))
+
+        self.dump = open(path, "wb")
+        self.dump_path = path
+        self.dump.writelines(self.lines)
+        self.dump.flush()
+        self.dump_lines = len(self.lines)
+
+    def close(self):
+        if self.dump is None:
+            return
+
+        self.dump.close()
+        self.dump = None
+        self.dumps += 1
+        if self.on_dump:
+            self.on_dump(self.dump_path, self.dump_lines)
@@ -0,0 +1,229 @@
+"""
+logcat-color
+
+Copyright 2012, Marshall Culpepper
+Licensed under the Apache License, Version 2.0
+
+A streaming API for reading parsed logcat records in Python, without going
+through a terminal:
+
+    from logcatcolor import iter_records
+
+    for record in iter_records("device.log", profile="myProfile"):
+        print(record["tag"], record["message"])
+
+Sources can be file paths, file objects, file descriptors, bytes, or any
+iterable of bytes or str chunks (which don't have to be split into lines).
+aiter_records() does the same for asyncio streams and async iterables.
+"""
+from __future__ import unicode_literals
+from logcatcolor.format import BriefFormat, Format, detect_format
+from logcatcolor.profile import Profile
+import os
+
+READ_SIZE = 64 * 1024
+DECODE_ERRORS = "backslashreplace"
+
+class LineSplitter(object):
+    """Splits chunks of bytes or text into decoded lines, keeping partial
+    lines until the rest of them arrives"""
+
+    def __init__(self, errors=DECODE_ERRORS):
+        self.errors = errors
+        self.partial = None
+
+    def decode(self, line):
+        if isinstance(line, bytes):
+            return line.decode("utf-8", self.errors)
+        return line
+
+    def feed(self, chunk):
+        if self.partial:
+            chunk = self.partial + chunk
+        lines = chunk.split(b"\n" if isinstance(chunk, bytes) else "\n")
+        self.partial = lines.pop()
+        return [self.decode(line) for line in lines]
+
+    def close(self):
+        partial, self.partial = self.partial, None
+        if partial:
+            return [self.decode(partial)]
+        return []
+
+class RecordParser(object):
+    """Turns lines into records the same way LogcatReader does: the format
+    is detected from the first few lines unless it's given, and records are
+    only returned when the profile includes them"""
+    DETECT_COUNT = 3
+
+    def __init__(self, format=None, profile=None, markers=False):
+        if isinstance(format, str):
+            format = Format.TYPES[format]()
+        self.format = format
+
+        if isinstance(profile, str):
+            name = profile
+            profile = Profile.get_profile(name)
+            if not profile:
+                raise ValueError("Unknown profile: %s" % name)
+        self.profile = profile
+        self.markers = markers
+        self.detect_lines = []
+
+    def feed(self, line):
+        """Returns the records for a line, the lines held back while the
+        format is being detected are returned along with a later line"""
+        line = line.strip()
+        if not self.format:
+            self.detect_lines.append(line)
+            if len(self.detect_lines) <= self.DETECT_COUNT:
+                return []
+
+            format_name = detect_format(self.detect_lines[:-1]) or "brief"
+            self.format = Format.TYPES[format_name]()
+            return self.flush_detect_lines()
+
+        return self.parse(line)
+
+    def close(self):
+        """Returns the records for any lines still held back, and the
+        record still being assembled from several lines"""
+        records = []
+        if not self.format and self.detect_lines:
+            self.format = BriefFormat()
+            records = self.flush_detect_lines()
+        if self.format:
+            records.extend(self.flush_record())
+        return records
+
+    def flush_record(self):
+        data = self.format.data
+        try:
+            if self.format.flush() and self.format.include(self.profile):
+                return [dict(data)]
+            return []
+        finally:
+            data.clear()
+
+    def flush_detect_lines(self):
+        records = []
+        for line in self.detect_lines:
+            records.extend(self.parse(line))
+        self.detect_lines = []
+        return records
+
+    def parse(self, line):
+        if Format.MARKER_REGEX.match(line):
+            records = self.flush_record()
+            if self.markers:
+                records.append({"marker": line})
+            return records
+
+        data = self.format.data
+        try:
+            if not self.format.match(line):
+                return []
+            if not self.format.include(self.profile):
+                return []
+            return [dict(data)]
+        finally:
+            data.clear()
+
+def iter_chunks(source):
+    if isinstance(source, (bytes, bytearray)):
+        yield bytes(source)
+        return
+
+    if isinstance(source, int):
+        while True:
+            chunk = os.read(source, READ_SIZE)
+            if not chunk:
+                return
+            yield chunk
+        return
+
+    if isinstance(source, str) or hasattr(source, "__fspath__"):
+        with open(source, "rb") as f:
+            for chunk in iter_chunks(f):
+                yield chunk
+        return
+
+    # read1() returns whatever a pipe has available, rather than waiting
+    # for a whole block
+    read1 = getattr(source, "read1", None)
+    if read1 is not None:
+        while True:
+            chunk = read1(READ_SIZE)
+            if not chunk:
+                return
+            yield chunk
+    elif hasattr(source, "__iter__"):
+        # text files, and iterables of chunks
+        for chunk in source:
+            yield chunk
+    elif hasattr(source, "read"):
+        while True:
+            chunk = source.read(READ_SIZE)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        raise TypeError("Can't read logcat output from %r" % source)
+
+def iter_records(source, format=None, profile=None, markers=False,
+                 errors=DECODE_ERRORS):
+    """Lazily yields the records parsed from source, as dicts with the
+    fields of the format (see the README for the fields of each format) and
+    a "line" field with the whole line.
+
+    format is a logcat format name, and is detected when it's None. profile
+    is a Profile or the name of one defined by a config that was loaded, and
+    only records it includes are yielded. When markers is True, "---------
+    beginning of" lines are yielded as {"marker": line}. Invalid UTF-8 is
+    decoded with the `errors` error handler."""
+    splitter = LineSplitter(errors)
+    parser = RecordParser(format, profile, markers)
+
+    for chunk in iter_chunks(source):
+        for line in splitter.feed(chunk):
+            for record in parser.feed(line):
+                yield record
+
+    for line in splitter.close():
+        for record in parser.feed(line):
+            yield record
+    for record in parser.close():
+        yield record
+
+async def aiter_chunks(source):
+    if hasattr(source, "__aiter__"):
+        # asyncio.StreamReader, or any async iterable of chunks
+        async for chunk in source:
+            yield chunk
+    elif hasattr(source, "read"):
+        while True:
+            chunk = await source.read(READ_SIZE)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        raise TypeError("Expected an async iterable or stream, got %r" % source)
+
+async def aiter_records(source, format=None, profile=None, markers=False,
+                        errors=DECODE_ERRORS):
+    """The async version of iter_records(), for asyncio.StreamReader sources
+    (like the stdout of asyncio.create_subprocess_exec()) and async
+    iterables of bytes or str chunks"""
+    splitter = LineSplitter(errors)
+    parser = RecordParser(format, profile, markers)
+
+    async for chunk in aiter_chunks(source):
+        for line in splitter.feed(chunk):
+            for record in parser.feed(line):
+                yield record
+
+    for line in splitter.close():
+        for record in parser.feed(line):
+            yield record
+    for record in parser.close():
+        yield record
@@ -0,0 +1,137 @@
+"""
+logcat-color
+
+Copyright 2012, Marshall Culpepper
+Licensed under the Apache License, Version 2.0
+
+A bounded ring buffer that decouples reading logcat output from rendering it
+"""
+from __future__ import unicode_literals
+from collections import deque
+import threading
+
+class RingBuffer(object):
+    BLOCK = "block"
+    DROP_OLDEST = "drop-oldest"
+    DROP_LOWEST = "drop-lowest"
+    POLICIES = (BLOCK, DROP_OLDEST, DROP_LOWEST)
+    DEFAULT_POLICY = DROP_OLDEST
+
+    # Higher ranks are kept longer by the drop-lowest policy. Lines with an
+    # unknown priority rank as verbose, markers are never dropped first.
+    PRIORITY_RANKS = {"V": 0, "D": 1, "I": 2, "W": 3, "E": 4, "F": 5, "S": 6}
+    MARKER_RANK = 7
+
+    def __init__(self, capacity, policy=DEFAULT_POLICY):
+        if capacity < 1:
+            raise ValueError("Ring buffer capacity must be at least 1")
+        if policy not in self.POLICIES:
+            raise ValueError("Unknown ring buffer policy: %s" % policy)
+
+        self.capacity = capacity
+        self.policy = policy
+        self.size = 0
+        self.sequence = 0
+        self.dropped = 0
+        self.total_dropped = 0
+        self.closed = False
+
+        # drop-lowest keeps one queue per rank, every other policy only
+        # needs a single FIFO
+        ranks = self.MARKER_RANK + 1 if policy == self.DROP_LOWEST else 1
+        self.queues = [deque() for i in range(ranks)]
+
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+
+    @classmethod
+    def rank(cls, priority):
+        return cls.PRIORITY_RANKS.get(priority, 0)
+
+    def put(self, item, rank=0):
+        with self.lock:
+            if self.closed:
+                return
+
+            if self.size >= self.capacity:
+                if self.policy == self.BLOCK:
+                    while self.size >= self.capacity and not self.closed:
+                        self.not_full.wait()
+                    if self.closed:
+                        return
+                elif not self.drop(rank):
+                    return
+
+            if len(self.queues) == 1:
+                rank = 0
+            self.queues[rank].append((self.sequence, item))
+            self.sequence += 1
+            self.size += 1
+            self.not_empty.notify()
+
+    def drop(self, rank):
+        """Makes room for an item with the given rank. Returns False when the
+        new item itself is the one that should be dropped."""
+        if self.policy == self.DROP_OLDEST:
+            queue = self.queues[0]
+        else:
+            for lowest, queue in enumerate(self.queues):
+                if queue:
+                    break
+            if lowest > rank:
+                self.count_dropped()
+                return False
+
+        queue.popleft()
+        self.size -= 1
+        self.count_dropped()
+        return True
+
+    def count_dropped(self):
+        self.dropped += 1
+        self.total_dropped += 1
+
+    def get(self, max_items=None):
+        """Waits for items, and returns a tuple of (items, dropped) where
+        dropped is the number of lines dropped since the last call. Returns
+        None once the buffer is closed and drained."""
+        with self.lock:
+            while not self.size and not self.dropped and not self.closed:
+                self.not_empty.wait()
+
+            if not self.size and not self.dropped:
+                return None
+
+            count = self.size
+            if max_items is not None:
+                count = min(count, max_items)
+
+            if len(self.queues) == 1:
+                queue = self.queues[0]
+                items = [queue.popleft()[1] for i in range(count)]
+            else:
+                items = [self.pop_next() for i in range(count)]
+
+            self.size -= count
+            dropped = self.dropped
+            self.dropped = 0
+            self.not_full.notify_all()
+            return items, dropped
+
+    def pop_next(self):
+        # the oldest item across all ranks is the one with the lowest sequence
+        oldest = None
+        for queue in self.queues:
+            if queue and (oldest is None or queue[0][0] < oldest[0][0]):
+                oldest = queue
+        return oldest.popleft()[1]
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.not_empty.notify_all()
+            self.not_full.notify_all()
+
+    def __len__(self):
+        return self.size
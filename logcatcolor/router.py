@@ -0,0 +1,73 @@
+"""
+logcat-color
+
+Copyright 2012, Marshall Culpepper
+Licensed under the Apache License, Version 2.0
+
+Evaluation of several profiles against each line in a single pass
+"""
+from __future__ import unicode_literals
+
+class ProfileRouter(object):
+    """Finds every profile that includes a line. Instead of running each
+    profile's include() in turn, the tag of the line is looked up once in an
+    index of all the profiles' tags, and "Start proc" messages are only
+    recognized once for all the profiles tracking packages."""
+
+    def __init__(self, profiles):
+        self.profiles = []
+        for profile in profiles:
+            if profile not in self.profiles:
+                self.profiles.append(profile)
+
+        self.package_profiles = [p for p in self.profiles if p.package_search]
+
+        # tag -> profiles that include it, in their original order, along
+        # with the profiles that include every tag
+        self.untagged = [p for p in self.profiles if not p.tags]
+        self.by_tag = {}
+        for profile in self.profiles:
+            for tag in profile.tags or ():
+                self.by_tag[tag] = None
+
+        for tag in self.by_tag:
+            self.by_tag[tag] = [p for p in self.profiles
+                                if not p.tags or tag in p.tags]
+
+        # lines routed, in total and by indexed tag. each profile's
+        # rejections by tag are derived from them when they're counted, rather
+        # than counted for every profile on every line
+        self.lines_routed = 0
+        self.lines_by_tag = dict.fromkeys(self.by_tag, 0)
+        self.counted = {}
+
+    def route(self, data):
+        message = data.get("message")
+        if message and message.startswith("Start proc"):
+            for profile in self.package_profiles:
+                profile.process_new_pid(data)
+
+        self.lines_routed += 1
+        tag = data.get("tag")
+        candidates = self.by_tag.get(tag)
+        if candidates is None:
+            candidates = self.untagged
+        else:
+            self.lines_by_tag[tag] += 1
+
+        return [profile for profile in candidates
+                if profile.include_tagged(data)]
+
+    def count_rejections(self):
+        """Adds the lines each profile rejected by their tag since the last
+        call to the profile's rejections"""
+        for profile in self.profiles:
+            if not profile.tags:
+                continue
+            rejected = self.lines_routed - sum(self.lines_by_tag[tag]
+                                               for tag in profile.tags)
+            new = rejected - self.counted.get(profile, 0)
+            self.counted[profile] = rejected
+            if new:
+                profile.rejections["tags"] = \
+                    profile.rejections.get("tags", 0) + new
@@ -0,0 +1,86 @@
+"""
+logcat-color
+
+Copyright 2012, Marshall Culpepper
+Licensed under the Apache License, Version 2.0
+
+Additional outputs that share the lines parsed by a LogcatReader
+"""
+from __future__ import unicode_literals
+from logcatcolor.layout import Layout
+import re
+
+class Sink(object):
+    """Renders the lines parsed by a reader with its own layout, and
+    optionally its own profile, to its own writer"""
+    # the last field of a spec is a profile or layout name when it looks like
+    # one, rather than the end of a file name with ":" in it, so that
+    # misspelled names are still reported
+    NAME_REGEX = re.compile(r"^[\w-]+$")
+
+    def __init__(self, writer, layout, profile=None, config=None, width=2000):
+        self.writer = writer
+        self.profile = profile
+        self.layout = Layout.TYPES[layout](config, profile, width)
+        self.encode_errors = self.layout.ENCODE_ERRORS
+        self.lines_written = 0
+
+    @classmethod
+    def parse(cls, spec, config=None, get_profile=None):
+        """Creates a sink writing to a file from a LAYOUT:FILE[:PROFILE]
+        spec, as given to --tee. FILE may contain ":" itself."""
+        layout, _, path = spec.partition(":")
+        profile_name = None
+        head, separator, tail = path.rpartition(":")
+        if separator and head and cls.NAME_REGEX.match(tail):
+            path, profile_name = head, tail
+        if not layout or not path:
+            raise ValueError("Invalid sink, expected LAYOUT:FILE[:PROFILE]: %s" % spec)
+        return cls.open(spec, layout, path, profile_name, config, get_profile)
+
+    @classmethod
+    def parse_route(cls, spec, layout, config=None, get_profile=None):
+        """Creates a sink from a PROFILE:FILE[:LAYOUT] spec, as given to
+        --route. FILE may contain ":" itself."""
+        profile_name, _, path = spec.partition(":")
+        head, separator, tail = path.rpartition(":")
+        if separator and head and cls.NAME_REGEX.match(tail):
+            path, layout = head, tail
+        if not profile_name or not path:
+            raise ValueError("Invalid route, expected PROFILE:FILE[:LAYOUT]: %s" % spec)
+        return cls.open(spec, layout, path, profile_name, config, get_profile)
+
+    @classmethod
+    def open(cls, spec, layout, path, profile_name, config, get_profile):
+        if layout not in Layout.TYPES:
+            raise ValueError("Unknown layout in sink %s: %s" % (spec, layout))
+
+        profile = None
+        if profile_name is not None:
+            profile = get_profile(profile_name) if get_profile else None
+            if not profile:
+                raise ValueError("Unknown profile in sink %s: %s" % (spec, profile_name))
+
+        from logcatcolor.output import FileWriter
+        return cls(FileWriter(path), layout, profile=profile, config=config)
+
+    def reload(self, config, profile=None):
+        self.profile = profile
+        self.layout = self.layout.reload(config, profile)
+
+    def write_marker(self, line):
+        result = self.layout.layout_marker(line)
+        if result:
+            self.writer.write((result + "\n").encode('utf-8', self.encode_errors))
+
+    def write_data(self, data):
+        result = self.layout.layout_data(data)
+        if result:
+            self.writer.write((result + "\n").encode('utf-8', self.encode_errors))
+            self.lines_written += 1
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
@@ -0,0 +1,224 @@
+"""
+logcat-color
+
+Copyright 2012, Marshall Culpepper
+Licensed under the Apache License, Version 2.0
+
+Counters and sampled stage timers for the read / parse / filter / render /
+write pipeline
+"""
+from __future__ import unicode_literals
+import fcntl
+import os
+import struct
+import termios
+import threading
+import time
+
+try:
+    from time import perf_counter
+except ImportError:
+    from time import time as perf_counter
+
+class StageTimer(object):
+    """Times consecutive pipeline stages of a single sampled line"""
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.last = perf_counter()
+
+    def mark(self, stage):
+        now = perf_counter()
+        self.stats.stage_time[stage] += now - self.last
+        self.stats.stage_samples[stage] += 1
+        self.last = now
+
+class PipelineStats(object):
+    STAGES = ("parse", "filter", "render", "write")
+    DEFAULT_SAMPLE_RATE = 64
+
+    def __init__(self, input=None, sample_rate=DEFAULT_SAMPLE_RATE):
+        self.sample_rate = max(1, sample_rate)
+        self.input_fd = None
+        if input is not None:
+            self.set_input(input)
+
+        self.start_time = time.time()
+        self.lines_read = 0
+        self.bytes_read = 0
+        self.lines_parsed = 0
+        self.lines_unparsed = 0
+        self.lines_rejected = 0
+        self.lines_rendered = 0
+        self.lines_dropped = 0
+        self.lines_repeated = 0
+        self.markers = 0
+        self.bytes_written = 0
+        self.pending_bytes = 0
+        self.max_pending_bytes = 0
+
+        self.stage_time = dict.fromkeys(self.STAGES, 0.0)
+        self.stage_samples = dict.fromkeys(self.STAGES, 0)
+        self.profiles = []
+
+    def set_input(self, input):
+        try:
+            self.input_fd = input.fileno()
+        except AttributeError:
+            self.input_fd = input
+
+    def add_profile(self, profile):
+        if profile is None:
+            return
+
+        # a reloaded profile replaces the one with the same name
+        for index, existing in enumerate(self.profiles):
+            if existing.name == profile.name:
+                self.profiles[index] = profile
+                return
+        self.profiles.append(profile)
+
+    def timer(self, count=None):
+        """Returns a StageTimer for every sample_rate'th line, None otherwise.
+        Must be called once per line, after lines_read (or the given count)
+        has been counted."""
+        if count is None:
+            count = self.lines_read
+        if count % self.sample_rate:
+            return None
+
+        self.sample_pending()
+        return StageTimer(self)
+
+    def sample_pending(self):
+        # The number of bytes still queued in the input pipe is how far the
+        # reader lags behind the writer on the other end (adb)
+        if self.input_fd is None:
+            return
+
+        try:
+            data = fcntl.ioctl(self.input_fd, termios.FIONREAD, b"\0\0\0\0")
+        except (IOError, OSError, ValueError):
+            self.input_fd = None
+            return
+
+        self.pending_bytes = struct.unpack("i", data)[0]
+        if self.pending_bytes > self.max_pending_bytes:
+            self.max_pending_bytes = self.pending_bytes
+
+    def estimate_stage_time(self, stage):
+        # Scale the sampled time up to an estimate for every line that
+        # went through the stage
+        samples = self.stage_samples[stage]
+        if not samples:
+            return 0.0
+
+        counts = {
+            "parse": self.lines_read,
+            "filter": self.lines_parsed,
+            "render": self.lines_parsed - self.lines_rejected -
+                      self.lines_repeated,
+            "write": self.lines_rendered,
+        }
+        return self.stage_time[stage] / samples * counts[stage]
+
+    def snapshot(self):
+        elapsed = time.time() - self.start_time
+        rejections = {}
+        filter_order = {}
+        for profile in self.profiles:
+            rejections[profile.name] = dict(profile.rejections)
+            if len(profile.chain):
+                filter_order[profile.name] = profile.chain.describe()
+
+        return {
+            "elapsed": elapsed,
+            "lines_read": self.lines_read,
+            "bytes_read": self.bytes_read,
+            "lines_parsed": self.lines_parsed,
+            "lines_unparsed": self.lines_unparsed,
+            "lines_rejected": self.lines_rejected,
+            "lines_rendered": self.lines_rendered,
+            "lines_dropped": self.lines_dropped,
+            "lines_repeated": self.lines_repeated,
+            "markers": self.markers,
+            "bytes_written": self.bytes_written,
+            "lines_per_second": self.lines_read / elapsed if elapsed else 0.0,
+            "pending_bytes": self.pending_bytes,
+            "max_pending_bytes": self.max_pending_bytes,
+            "sample_rate": self.sample_rate,
+            "stage_time": dict((stage, self.estimate_stage_time(stage))
+                               for stage in self.STAGES),
+            "rejections": rejections,
+            "filter_order": filter_order,
+        }
+
+    def format_report(self):
+        snapshot = self.snapshot()
+        lines = [
+            "--------- logcat-color stats (%.1fs)" % snapshot["elapsed"],
+            "lines read:     %d (%d bytes, %.0f lines/s)" % (
+                snapshot["lines_read"], snapshot["bytes_read"],
+                snapshot["lines_per_second"]),
+            "lines parsed:   %d (%d unparsed, %d markers)" % (
+                snapshot["lines_parsed"], snapshot["lines_unparsed"],
+                snapshot["markers"]),
+            "lines rejected: %d" % snapshot["lines_rejected"],
+            "lines rendered: %d (%d bytes written)" % (
+                snapshot["lines_rendered"], snapshot["bytes_written"]),
+            "lines dropped:  %d" % snapshot["lines_dropped"],
+            "lines repeated: %d" % snapshot["lines_repeated"],
+            "reader lag:     %d bytes pending (max %d)" % (
+                snapshot["pending_bytes"], snapshot["max_pending_bytes"]),
+        ]
+
+        for stage in self.STAGES:
+            lines.append("%-15s %.3fs (sampled 1/%d)" % (
+                stage + " time:", snapshot["stage_time"][stage],
+                self.sample_rate))
+
+        for name, rejections in sorted(snapshot["rejections"].items()):
+            for rule, count in sorted(rejections.items()):
+                lines.append("rejected by %s/%s: %d" % (name, rule, count))
+
+        for name, checks in sorted(snapshot["filter_order"].items()):
+            for index, check in enumerate(checks):
+                lines.append("filter order %s/%d: %s (rejects %.0f%%, %.2fus)" % (
+                    name, index + 1, check["name"],
+                    check["rejection_rate"] * 100, check["time"] * 1e6))
+
+        return "\n".join(lines) + "\n"
+
+    def report(self, stream):
+        stream.write(self.format_report())
+        stream.flush()
+
+    def write_json(self, path):
+        # write to a temporary file and rename so readers never see a
+        # partially written snapshot
+        import json
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2, sort_keys=True)
+        os.rename(tmp_path, path)
+
+class StatsWriter(threading.Thread):
+    """Periodically dumps a JSON snapshot of the stats to a file"""
+    DEFAULT_INTERVAL = 5.0
+
+    def __init__(self, stats, path, interval=DEFAULT_INTERVAL):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.stats = stats
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.stats.write_json(self.path)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.stats.write_json(self.path)
@@ -0,0 +1,114 @@
+"""
+logcat-color
+
+Copyright 2012, Marshall Culpepper
+Licensed under the Apache License, Version 2.0
+
+Conversion of logcat dates and times to seconds, and the time passed since
+the first line and between lines
+"""
+from __future__ import unicode_literals
+from collections import OrderedDict
+import calendar
+import time as _time
+
+class TimestampParser(object):
+    """Converts logcat "MM-DD" dates and "HH:MM:SS.mmm" times to seconds.
+
+    Lines logged in the same second share everything but the milliseconds,
+    so the seconds of the last date and "HH:MM:SS" prefix are cached, and
+    only the milliseconds are parsed for every line. Times are treated as UTC,
+    so that differences are never skewed by daylight saving time."""
+    MAX_CACHED = 1024
+
+    def __init__(self, year=None):
+        self.year = year or _time.localtime().tm_year
+        self.last_month = None
+        self.last_date = None
+        self.last_prefix = None
+        self.last_seconds = None
+
+        # seconds of recently seen prefixes, for lines that arrive out of
+        # order (e.g. from different buffers), least recently used first
+        self.cache = OrderedDict()
+
+    def parse(self, date, time):
+        if not date or not time:
+            return None
+        if date == self.last_date and time.startswith(self.last_prefix):
+            return self.last_seconds + float(time[8:])
+
+        prefix = time[:9]
+        key = (date, prefix)
+        seconds = self.cache.get(key)
+        if seconds is None:
+            seconds = self.parse_prefix(date, prefix)
+            if seconds is None:
+                return None
+
+            self.cache[key] = seconds
+            if len(self.cache) > self.MAX_CACHED:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+
+        try:
+            fraction = float(time[8:] or 0)
+        except ValueError:
+            return None
+
+        if prefix.endswith("."):
+            self.last_date = date
+            self.last_prefix = prefix
+            self.last_seconds = seconds
+        return seconds + fraction
+
+    def parse_prefix(self, date, prefix):
+        try:
+            month, day = date.split("-")
+            hours, minutes, seconds = prefix.rstrip(".").split(":")
+            month = int(month)
+
+            # logcat dates have no year, so follow the log into the next one
+            if self.last_month is not None and month < self.last_month - 6:
+                self.year += 1
+            self.last_month = month
+
+            return calendar.timegm((self.year, month, int(day), int(hours),
+                                    int(minutes), int(seconds), 0, 0, 0))
+        except (ValueError, OverflowError):
+            return None
+
+class TimeTracker(object):
+    """Adds the seconds since the first line ("elapsed"), and since the
+    previous line of the same pid and tag ("delta") to parsed lines"""
+    DEFAULT_MAX_KEYS = 4096
+
+    def __init__(self, parser=None, max_keys=DEFAULT_MAX_KEYS):
+        self.parser = parser or TimestampParser()
+        self.max_keys = max_keys
+        self.start = None
+        # (pid, tag) -> seconds of its last line, least recently seen first
+        self.previous = OrderedDict()
+
+    def update(self, data):
+        seconds = self.parser.parse(data.get("date"), data.get("time"))
+        if seconds is None:
+            data["elapsed"] = data["delta"] = None
+            return
+
+        if self.start is None:
+            self.start = seconds
+        data["elapsed"] = seconds - self.start
+
+        key = (data.get("pid"), data.get("tag"))
+        previous = self.previous.get(key)
+        data["delta"] = None if previous is None else seconds - previous
+
+        self.previous[key] = seconds
+        if previous is None:
+            # the deltas of long gone processes aren't worth keeping
+            if len(self.previous) > self.max_keys:
+                self.previous.popitem(last=False)
+        else:
+            self.previous.move_to_end(key)
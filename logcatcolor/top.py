@@ -0,0 +1,157 @@
+"""
+logcat-color
+
+Copyright 2012, Marshall Culpepper
+Licensed under the Apache License, Version 2.0
+
+A live view of who is logging the most, by tag, pid and priority
+"""
+from __future__ import unicode_literals
+from colorama import Fore, Back, Style
+import threading
+
+try:
+    from time import monotonic
+except ImportError:
+    from time import time as monotonic
+
+class RateCounter(object):
+    """Counts lines by key, and keeps an exponentially decaying rate of lines
+    per second for each key. Counting a line is a single dict update, rates
+    are only updated once per tick()."""
+    MIN_RATE = 0.01
+
+    def __init__(self, half_life):
+        self.half_life = half_life
+
+        # lines counted since the last tick
+        self.counts = {}
+
+        # key -> [lines per second, total lines]
+        self.rates = {}
+
+    def add(self, key):
+        counts = self.counts
+        counts[key] = counts.get(key, 0) + 1
+
+    def tick(self, elapsed):
+        # the counts are swapped out rather than locked, the reading thread
+        # may at worst count a line into the previous tick
+        counts, self.counts = self.counts, {}
+        if elapsed <= 0:
+            return 0
+
+        decay = 0.5 ** (elapsed / self.half_life)
+        for entry in self.rates.values():
+            entry[0] *= decay
+
+        total = 0
+        for key, count in list(counts.items()):
+            entry = self.rates.get(key)
+            if entry is None:
+                entry = self.rates[key] = [0.0, 0]
+            entry[0] += count / elapsed * (1 - decay)
+            entry[1] += count
+            total += count
+
+        # keys that went quiet don't take up memory or rows
+        for key in [key for key, entry in self.rates.items()
+                    if entry[0] < self.MIN_RATE]:
+            del self.rates[key]
+        return total
+
+    def total_rate(self):
+        return sum(entry[0] for entry in self.rates.values())
+
+    def top(self, count):
+        return sorted(self.rates.items(), key=lambda item: -item[1][0])[:count]
+
+class TopView(threading.Thread):
+    """Counts the lines included by the reader instead of printing them, and
+    redraws a table of the busiest tags and pids every `interval` seconds on
+    its own thread, however many lines are coming in."""
+    DEFAULT_INTERVAL = 1.0
+    DEFAULT_HALF_LIFE = 5.0
+    PRIORITIES = "VDIWEF"
+
+    CLEAR = "\x1b[H\x1b[2J"
+    HEADER = Fore.WHITE + Back.BLACK + Style.DIM + "%s" + Style.RESET_ALL
+    ROW = "%10.1f %10d  %s"
+    COLUMNS = "%10s %10s  %s"
+
+    def __init__(self, writer, interval=DEFAULT_INTERVAL,
+                 half_life=DEFAULT_HALF_LIFE, width=80, height=24, clear=True,
+                 clock=monotonic):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.writer = writer
+        self.interval = interval
+        self.width = width
+        self.height = height
+        self.clear = clear
+        self.clock = clock
+
+        self.tags = RateCounter(half_life)
+        self.pids = RateCounter(half_life)
+        self.priorities = RateCounter(half_life)
+        self.lines = 0
+        self.last_tick = clock()
+        self.stopped = threading.Event()
+
+    def add(self, data):
+        self.tags.add(data.get("tag"))
+        self.pids.add(data.get("pid"))
+        self.priorities.add(data.get("priority"))
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.refresh()
+
+    def stop(self):
+        self.stopped.set()
+        if self.is_alive():
+            self.join()
+        self.refresh()
+
+    def tick(self):
+        now = self.clock()
+        elapsed, self.last_tick = now - self.last_tick, now
+        self.lines += self.priorities.tick(elapsed)
+        self.tags.tick(elapsed)
+        self.pids.tick(elapsed)
+
+    def refresh(self):
+        self.tick()
+        text = self.format_table()
+        if self.clear:
+            text = self.CLEAR + text
+        else:
+            text += "\n"
+        self.writer.write(text.encode("utf-8", "replace"))
+        self.writer.flush()
+
+    def format_priorities(self):
+        rates = self.priorities.rates
+        return "  ".join("%s %.1f/s" % (priority, rates[priority][0]
+                                       if priority in rates else 0.0)
+                         for priority in self.PRIORITIES)
+
+    def format_section(self, counter, name, rows):
+        lines = [self.HEADER % (self.COLUMNS % ("LINES/S", "TOTAL", name))]
+        for key, (rate, total) in counter.top(rows):
+            lines.append((self.ROW % (rate, total, key))[:self.width])
+        return lines
+
+    def format_table(self):
+        # the header and priorities take 3 rows, the column headers 2 and the
+        # cursor one, the rest is split between the tags and pids
+        rows = max(1, (self.height - 6) // 2)
+        header = "logcat-color top: %.1f lines/s, %d lines, %d tags, %d pids" % (
+            self.priorities.total_rate(), self.lines, len(self.tags.rates),
+            len(self.pids.rates))
+
+        lines = [self.HEADER % header[:self.width],
+                 self.format_priorities()[:self.width], ""]
+        lines += self.format_section(self.tags, "TAG", rows)
+        lines += self.format_section(self.pids, "PID", rows)
+        return "\n".join(lines) + "\n"
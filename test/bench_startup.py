@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Measures logcat-color startup time: the time to import logcatcolor.main, and
+the wall clock time of a full run over a tiny log, with a cold and a warm
+config code cache.
+
+usage: python test/bench_startup.py [--runs N] [--config FILE]
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+this_dir = os.path.abspath(os.path.dirname(__file__))
+top_dir = os.path.dirname(this_dir)
+brief_log = os.path.join(this_dir, "logs", "brief_log")
+default_config = os.path.join(this_dir, "configs", "brief_filter_config")
+
+def time_command(args, env, runs, setup=None):
+    timings = []
+    for i in range(runs):
+        if setup:
+            setup()
+        start = time.time()
+        subprocess.check_call(args, env=env, cwd=top_dir,
+                              stdout=subprocess.DEVNULL)
+        timings.append(time.time() - start)
+
+    timings.sort()
+    return timings[len(timings) // 2], timings[0]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--config", default=default_config)
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp()
+    env = dict(os.environ)
+    env["LOGCAT_COLOR_CACHE_DIR"] = cache_dir
+
+    def clear_cache():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    run_args = [sys.executable, "-c",
+                "from logcatcolor.main import main; main()",
+                "--config", args.config, "--plain", "--input", brief_log]
+
+    benchmarks = (
+        ("python startup", [sys.executable, "-c", "pass"], None),
+        ("import logcatcolor.main",
+         [sys.executable, "-c", "import logcatcolor.main"], None),
+        ("run, cold config cache", run_args, clear_cache),
+        ("run, warm config cache", run_args, None),
+    )
+
+    try:
+        for name, command, setup in benchmarks:
+            median, best = time_command(command, env, args.runs, setup)
+            print("%-26s median %6.1fms  best %6.1fms" % (
+                name, median * 1000, best * 1000))
+    finally:
+        clear_cache()
+
+if __name__ == "__main__":
+    main()
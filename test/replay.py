@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+"""
+Replays a recorded time or threadtime capture through logcat-color at its
+original pace, sped up, or as fast as possible, and reports how far
+logcat-color lags behind.
+
+Lines are written to logcat-color's stdin at the times given by their
+timestamps divided by --speed (0 replays as fast as possible). Lines due at
+the same time are written together in bursts of up to --burst lines, like adb
+delivers them, and --max-gap shortens long idle periods. Every line printed
+by logcat-color is matched to the line that was sent, so by default
+logcat-color runs with --plain, and any arguments after "--" are passed on.
+
+With --stdout, the paced lines are printed instead, to be piped into any
+command.
+
+usage: python test/replay.py CAPTURE [--speed N] [--burst N] [--max-gap S]
+                             [--loops N] [--stdout] [-- logcat-color args]
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+this_dir = os.path.abspath(os.path.dirname(__file__))
+top_dir = os.path.dirname(this_dir)
+sys.path.insert(0, top_dir)
+
+from logcatcolor.timestamp import TimestampParser
+
+TIMESTAMP_REGEX = re.compile(r"^\[?\s*(\d\d-\d\d)\s+(\d\d:\d\d:\d\d\.\d+)")
+
+def read_capture(path):
+    """Returns (seconds, line) for each line of a capture. Lines without a
+    timestamp, like markers, are due with the line before them"""
+    parser = TimestampParser()
+    lines = []
+    seconds = None
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.rstrip(b"\r\n")
+            match = TIMESTAMP_REGEX.match(line.decode("utf-8", "replace"))
+            if match:
+                parsed = parser.parse(match.group(1), match.group(2))
+                if parsed is not None:
+                    seconds = parsed
+            lines.append((seconds, line))
+
+    # lines before the first timestamp are due right away
+    first = next((s for s, line in lines if s is not None), 0.0)
+    return [(first if s is None else s, line) for s, line in lines]
+
+def schedule(capture, speed=1.0, burst=1, max_gap=None, loops=1):
+    """Yields (offset, lines) bursts, offset being the number of seconds
+    since the start of the replay that the lines are due"""
+    if not capture:
+        return
+
+    start = capture[0][0]
+    offset = 0.0
+    for loop in range(loops):
+        previous = start
+        pending = []
+        pending_offset = offset
+        for seconds, line in capture:
+            # time may go backwards, e.g. between buffers
+            gap = max(0.0, seconds - previous)
+            previous = max(previous, seconds)
+            if speed:
+                gap /= speed
+                if max_gap is not None:
+                    gap = min(gap, max_gap)
+            else:
+                gap = 0.0
+            offset += gap
+
+            if pending and (offset > pending_offset or len(pending) >= burst):
+                yield pending_offset, pending
+                pending = []
+            if not pending:
+                pending_offset = offset
+            pending.append(line)
+
+        if pending:
+            yield pending_offset, pending
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+class Replay(object):
+    def __init__(self, bursts, output):
+        self.bursts = bursts
+        self.output = output
+        self.sent = 0
+        self.max_slip = 0.0
+
+        # line -> send times of the copies of it not received yet
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.received = 0
+        self.unmatched = 0
+        self.lags = []
+
+    def send(self):
+        start = time.time()
+        for offset, lines in self.bursts:
+            delay = start + offset - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # a full pipe means the reader isn't keeping up
+                self.max_slip = max(self.max_slip, -delay)
+
+            now = time.time()
+            with self.lock:
+                for line in lines:
+                    self.pending.setdefault(line.strip(), []).append(now)
+            self.output.write(b"".join(line + b"\n" for line in lines))
+            self.output.flush()
+            self.sent += len(lines)
+        self.duration = time.time() - start
+
+    def receive(self, input):
+        for line in iter(input.readline, b""):
+            now = time.time()
+            with self.lock:
+                sent = self.pending.get(line.rstrip(b"\r\n").strip())
+                if sent:
+                    self.lags.append(now - sent.pop(0))
+                else:
+                    self.unmatched += 1
+            self.received += 1
+
+    def report(self, stream):
+        duration = self.duration or 1e-9
+        print("lines sent:     %d in %.2fs (%.0f lines/s)" % (
+            self.sent, self.duration, self.sent / duration), file=stream)
+        print("lines received: %d (%d not matched to a sent line)" % (
+            self.received, self.unmatched), file=stream)
+        print("sender slip:    %.1fms max behind schedule" % (
+            self.max_slip * 1000), file=stream)
+        print("lag:            p50 %.1fms  p95 %.1fms  p99 %.1fms  max %.1fms" % tuple(
+            percentile(self.lags, fraction) * 1000
+            for fraction in (0.5, 0.95, 0.99, 1.0)), file=stream)
+
+def main():
+    argv = sys.argv[1:]
+    extra = []
+    if "--" in argv:
+        index = argv.index("--")
+        argv, extra = argv[:index], argv[index + 1:]
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("capture")
+    parser.add_argument("--speed", type=float, default=1.0,
+        help="replay speed multiplier, 0 for as fast as possible")
+    parser.add_argument("--burst", type=int, default=1,
+        help="write up to N lines that are due together at once")
+    parser.add_argument("--max-gap", type=float, default=None,
+        help="shorten idle periods to at most this many seconds")
+    parser.add_argument("--loops", type=int, default=1,
+        help="replay the capture N times in a row")
+    parser.add_argument("--stdout", action="store_true",
+        help="print the paced lines instead of running logcat-color")
+    args = parser.parse_args(argv)
+
+    bursts = schedule(read_capture(args.capture), speed=args.speed,
+                      burst=max(1, args.burst), max_gap=args.max_gap,
+                      loops=args.loops)
+
+    if args.stdout:
+        try:
+            output = sys.stdout.buffer
+        except AttributeError:
+            output = sys.stdout
+        Replay(bursts, output).send()
+        return
+
+    command = [sys.executable, "-c",
+               "from logcatcolor.main import main; main()"]
+    command += extra or ["--plain"]
+    proc = subprocess.Popen(command, cwd=top_dir, stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE)
+
+    replay = Replay(bursts, proc.stdin)
+    receiver = threading.Thread(target=replay.receive, args=(proc.stdout,))
+    receiver.start()
+    try:
+        replay.send()
+    finally:
+        proc.stdin.close()
+        receiver.join()
+        proc.wait()
+
+    replay.report(sys.stderr)
+
+if __name__ == "__main__":
+    main()
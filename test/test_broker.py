@@ -0,0 +1,95 @@
+from __future__ import unicode_literals
+import json
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+
+from common import MockObject
+from logcatcolor.broker import Broker, BrokerReader, Subscriber, subscribe
+from logcatcolor.config import LogcatColorConfig
+
+this_dir = os.path.abspath(os.path.dirname(__file__))
+BRIEF_LOG = os.path.join(this_dir, "logs", "brief_log")
+BRIEF_FILTER_CONFIG = os.path.join(this_dir, "configs", "brief_filter_config")
+
+def read_all(sock):
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    sock.close()
+    return b"".join(chunks).decode("utf-8")
+
+class SubscriberTest(unittest.TestCase):
+    def test_drops_when_full(self):
+        ours, theirs = socket.socketpair()
+        subscriber = Subscriber(ours, "raw", queue_size=2)
+        for i in range(4):
+            subscriber.write_data({"line": "line %d" % i})
+            subscriber.send()
+        self.assertEqual(subscriber.lines_dropped, 2)
+
+        # once it catches up, it's told how many lines it missed
+        subscriber.start()
+        while not subscriber.queue.empty():
+            time.sleep(0.01)
+        subscriber.write_data({"line": "line 4"})
+        subscriber.send()
+        subscriber.close()
+        self.assertEqual(read_all(theirs).splitlines(),
+                         ["line 0", "line 1",
+                          "--------- logcat-color dropped 2 lines", "line 4"])
+
+class BrokerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "broker.sock")
+        options = MockObject(config=BRIEF_FILTER_CONFIG, wrap=None,
+                             stay_connected=None)
+        self.config = LogcatColorConfig(options)
+        self.broker = Broker(self.path, self.config)
+        self.broker.start()
+
+    def tearDown(self):
+        self.broker.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def serve(self, path):
+        with open(path, "rb") as f:
+            reader = BrokerReader(f, self.config, format="brief")
+            self.broker.attach(reader)
+            reader.run()
+        self.broker.close()
+
+    def test_subscribers(self):
+        everything = subscribe(self.path, layout="raw")
+        tagged = subscribe(self.path, profile="brief_filter_tag", layout="raw")
+        records = subscribe(self.path, profile="brief_filter_fn", layout="json")
+        self.serve(BRIEF_LOG)
+
+        self.assertEqual(len(read_all(everything).splitlines()), 4)
+        self.assertEqual(read_all(tagged).splitlines(),
+                         ["I/Tag2( 234): message 2", "I/Tag4( 890): message 4"])
+        self.assertEqual([json.loads(line)["tag"] for line in
+                          read_all(records).splitlines()], ["Tag2", "Tag3"])
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_refused(self):
+        self.assertRaises(ValueError, subscribe, self.path,
+                          profile="no such profile")
+        self.assertRaises(ValueError, subscribe, self.path, layout="nope")
+
+    def test_already_serving(self):
+        self.assertRaises(ValueError, Broker, self.path, self.config)
+
+    def test_disconnected_subscriber(self):
+        gone = subscribe(self.path, layout="raw")
+        gone.close()
+        staying = subscribe(self.path, layout="raw")
+        self.serve(BRIEF_LOG)
+        self.assertEqual(len(read_all(staying).splitlines()), 4)
@@ -1,8 +1,15 @@
 from __future__ import unicode_literals
 
+import os
 import os.path
+import shutil
+import sys
+import tempfile
 from common import MockObject
-from logcatcolor.config import LogcatColorConfig
+from io import BytesIO
+from logcatcolor.config import ConfigWatcher, LogcatColorConfig
+from logcatcolor.profile import Profile
+from logcatcolor.reader import LogcatReader
 import unittest
 
 this_dir = os.path.abspath(os.path.dirname(__file__))
@@ -43,3 +50,147 @@ class ConfigTest(unittest.TestCase):
     def test_simple_config_overrides(self, config):
         self.assertTrue(config.get_wrap())
         self.assertTrue(config.get_stay_connected())
+
+class ConfigCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.old_cache_dir = os.environ.get(LogcatColorConfig.CACHE_DIR_ENV)
+        os.environ[LogcatColorConfig.CACHE_DIR_ENV] = self.cache_dir
+
+    def tearDown(self):
+        if self.old_cache_dir is None:
+            del os.environ[LogcatColorConfig.CACHE_DIR_ENV]
+        else:
+            os.environ[LogcatColorConfig.CACHE_DIR_ENV] = self.old_cache_dir
+        shutil.rmtree(self.cache_dir)
+
+    def load(self, path):
+        options = MockObject(config=path, wrap=None, stay_connected=None)
+        return LogcatColorConfig(options)
+
+    def test_cached_code(self):
+        path = os.path.join(self.cache_dir, "config")
+        with open(path, "w") as f:
+            f.write("tag_width = 5\n")
+
+        config = self.load(path)
+        cache_path = config.get_cache_path()
+        self.assertTrue(os.path.exists(cache_path))
+        cache_mtime = os.stat(cache_path).st_mtime_ns
+
+        # a second load is served from the cache without rewriting it
+        self.assertEqual(self.load(path).config["tag_width"], 5)
+        self.assertEqual(os.stat(cache_path).st_mtime_ns, cache_mtime)
+
+        # changing the config invalidates the cached code
+        with open(path, "w") as f:
+            f.write("tag_width = 10\n")
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertEqual(self.load(path).config["tag_width"], 10)
+
+    def test_disabled_cache(self):
+        os.environ[LogcatColorConfig.CACHE_DIR_ENV] = ""
+        config = self.load(os.path.join(configs_dir, "simple_config"))
+        self.assertEqual(config.get_cache_path(), None)
+        self.assertEqual(config.get_column_width(MockObject(NAME="tag", DEFAULT_WIDTH=20)), 1)
+
+class ConfigReloadTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "config")
+        self.old_cache_dir = os.environ.get(LogcatColorConfig.CACHE_DIR_ENV)
+        os.environ[LogcatColorConfig.CACHE_DIR_ENV] = ""
+        self.old_stderr = sys.stderr
+
+    def tearDown(self):
+        sys.stderr = self.old_stderr
+        if self.old_cache_dir is None:
+            del os.environ[LogcatColorConfig.CACHE_DIR_ENV]
+        else:
+            os.environ[LogcatColorConfig.CACHE_DIR_ENV] = self.old_cache_dir
+        shutil.rmtree(self.dir)
+
+    def write_config(self, text):
+        with open(self.path, "w") as f:
+            f.write(text)
+        # make sure the change is seen even within the mtime resolution
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    def load(self):
+        options = MockObject(config=self.path, wrap=None, stay_connected=None)
+        return LogcatColorConfig(options)
+
+    def test_watcher(self):
+        self.write_config("tag_width = 5\nProfile(name='app', tags=['A'])\n")
+        config = self.load()
+        self.assertEqual(Profile.get_profile("app").tags, ["A"])
+
+        reloaded = []
+        watcher = ConfigWatcher(config, reloaded.append)
+        self.assertFalse(watcher.check())
+
+        self.write_config("tag_width = 8\nProfile(name='app', tags=['B'])\n")
+        self.assertTrue(watcher.check())
+        self.assertEqual(len(reloaded), 1)
+        self.assertEqual(reloaded[0].config["tag_width"], 8)
+        self.assertEqual(reloaded[0].profiles["app"].tags, ["B"])
+        self.assertIs(Profile.get_profile("app"), reloaded[0].profiles["app"])
+
+        # a broken config is reported, and the previous one stays in place
+        sys.stderr = MockObject(write=lambda text: None, flush=lambda: None)
+        self.write_config("Profile(name='app', tags=['C'])\nbroken(\n")
+        self.assertFalse(watcher.check())
+        self.assertEqual(len(reloaded), 1)
+        self.assertIs(watcher.config, reloaded[0])
+        self.assertEqual(Profile.get_profile("app").tags, ["B"])
+
+    def test_rejected_reload(self):
+        self.write_config("Profile(name='app', tags=['A'])\n")
+        watcher = ConfigWatcher(self.load(), lambda config: False)
+        app = Profile.get_profile("app")
+        outside = Profile(name="outside")
+
+        # profiles of a config the callback rejects are never looked up
+        self.write_config("Profile(name='other')\n")
+        self.assertFalse(watcher.check())
+        self.assertIs(Profile.get_profile("app"), app)
+        self.assertIs(Profile.get_profile("other"), None)
+
+        # publishing keeps the profiles created outside of the config
+        watcher.callback = lambda config: None
+        self.write_config("Profile(name='app', tags=['B'])\n")
+        self.assertTrue(watcher.check())
+        self.assertEqual(Profile.get_profile("app").tags, ["B"])
+        self.assertIs(Profile.get_profile("outside"), outside)
+
+    def test_reader_reload(self):
+        self.write_config("Profile(name='app', tags=['A'], packages=['com.app'])\n")
+        config = self.load()
+        profile = config.profiles["app"]
+        profile.pid_map["com.app"] = "123"
+
+        read_fd, write_fd = os.pipe()
+        output = BytesIO()
+        reader = LogcatReader(read_fd, config, profile=profile, format="brief",
+                              layout="raw", writer=output)
+        try:
+            reader.process_line("I/A       (  123): first")
+            reader.process_line("I/B       (  123): skipped")
+
+            self.write_config("Profile(name='app', tags=['B'], packages=['com.app'])\n")
+            reader.reload(self.load())
+            reader.process_line("I/A       (  123): skipped")
+            reader.process_line("I/B       (  123): second")
+        finally:
+            reader.del_channel()
+            os.close(read_fd)
+            os.close(write_fd)
+
+        self.assertEqual(output.getvalue().decode("utf-8").splitlines(),
+                         ["I/A       (  123): first",
+                          "I/B       (  123): second"])
+        self.assertIsNot(reader.profile, profile)
+        self.assertEqual(reader.profile.pid_map, {"com.app": "123"})
+        self.assertEqual(reader.profile.rejections, {"tags": 2})
@@ -0,0 +1,64 @@
+from __future__ import unicode_literals
+from logcatcolor.context import ContextBuffer
+import unittest
+
+def run(buffer, lines):
+    """Returns the lines shown for (message, included, pid, tid) tuples"""
+    shown = []
+    for message, included, pid, tid in lines:
+        data = {"message": message, "pid": pid, "tid": tid}
+        if included:
+            separator, context = buffer.include(data)
+            if separator:
+                shown.append(ContextBuffer.SEPARATOR)
+            shown.extend(record["message"] for record in context)
+            shown.append(message)
+        elif buffer.reject(data):
+            shown.append(message)
+    return shown
+
+def lines(spec):
+    # "ab.." -> a and b included, the others rejected
+    return [(str(i), char == "+", "1", "1") for i, char in enumerate(spec)]
+
+class ContextBufferTest(unittest.TestCase):
+    def test_before(self):
+        self.assertEqual(run(ContextBuffer(before=2), lines("...+....+")),
+                         ["1", "2", "3", "--", "6", "7", "8"])
+
+    def test_after(self):
+        self.assertEqual(run(ContextBuffer(after=1), lines("+...+.+")),
+                         ["0", "1", "--", "4", "5", "6"])
+
+    def test_adjacent_groups(self):
+        # no separator between groups that touch
+        self.assertEqual(run(ContextBuffer(before=1, after=1), lines("+..+")),
+                         ["0", "1", "2", "3"])
+        self.assertEqual(run(ContextBuffer(before=1, after=1), lines(".+.")),
+                         ["0", "1", "2"])
+
+    def test_before_copies(self):
+        buffer = ContextBuffer(before=1)
+        data = {"message": "rejected"}
+        buffer.reject(data)
+        data.clear()
+        separator, context = buffer.include({"message": "included"})
+        self.assertEqual(context, [{"message": "rejected"}])
+
+    def test_scope(self):
+        buffer = ContextBuffer(before=1, after=1, scope="pid")
+        shown = run(buffer, [
+            ("a1", False, "1", "1"),
+            ("b1", False, "2", "2"),
+            ("a2", True, "1", "1"),
+            ("b2", False, "2", "2"),
+            ("a3", False, "1", "1"),
+        ])
+        self.assertEqual(shown, ["a1", "a2", "a3"])
+
+    def test_bounded_scopes(self):
+        buffer = ContextBuffer(before=1, scope="tid")
+        buffer.MAX_KEYS = 2
+        for tid in ("1", "2", "3"):
+            buffer.reject({"tid": tid})
+        self.assertEqual(list(buffer.states.keys()), ["2", "3"])
@@ -0,0 +1,137 @@
+from __future__ import unicode_literals
+from io import BytesIO, StringIO
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from logcatcolor.crash import CrashExtractor, CrashReport
+
+this_dir = os.path.abspath(os.path.dirname(__file__))
+CRASH_LOG = os.path.join(this_dir, "logs", "crash_log")
+
+def extract(path, read_size=None, **kwargs):
+    output = BytesIO()
+    with open(path, "rb") as f:
+        extractor = CrashExtractor(f, output, **kwargs)
+        if read_size:
+            extractor.READ_SIZE = read_size
+        extractor.run()
+    return extractor, output.getvalue().decode("utf-8")
+
+class CrashExtractorTest(unittest.TestCase):
+    def test_reports(self):
+        extractor, output = extract(CRASH_LOG)
+        lines = output.splitlines()
+        headers = [line for line in lines if line.startswith("---------")]
+        self.assertTrue(headers[0].startswith(
+            "--------- java_crash in com.example.app (pid 1234) at 01-02 12:00:01.000"))
+        self.assertTrue(headers[1].startswith(
+            "--------- native_crash in com.example.native (pid 5678)"))
+        self.assertTrue(headers[2].startswith("--------- anr in com.example.slow"))
+        # the same crash in another process is only counted
+        self.assertTrue(headers[3].endswith("seen 2 times"))
+        self.assertEqual(headers[4], "--------- 4 crash reports, 3 distinct")
+
+        # only the lines of the crashing pid and tag are in its report
+        java = lines[1:lines.index(headers[1])]
+        self.assertEqual(len(java), 5)
+        self.assertFalse(any("Noise" in line for line in java))
+        self.assertEqual(extractor.total, 4)
+
+    def test_block_boundaries(self):
+        # reads that split lines and triggers anywhere give the same reports
+        expected = extract(CRASH_LOG)[1]
+        for read_size in (7, 64, 333):
+            self.assertEqual(extract(CRASH_LOG, read_size)[1], expected)
+
+    def test_idle(self):
+        data = ("I/AndroidRuntime(  1): FATAL EXCEPTION: main\n" +
+                "I/Noise(  2): noise\n" * (CrashExtractor.IDLE_LINES + 1) +
+                "I/AndroidRuntime(  1): too late\n").encode("utf-8")
+        output = BytesIO()
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, data)
+        os.close(write_fd)
+        try:
+            CrashExtractor(read_fd, output, format="brief").run()
+        finally:
+            os.close(read_fd)
+        self.assertFalse(b"too late" in output.getvalue())
+
+    def test_report_end(self):
+        data = ("01-02 12:00:04.000   300   310 E ActivityManager: ANR in com.example.slow\n" +
+                "01-02 12:00:04.000   300   310 E ActivityManager: Reason: timeout\n" +
+                "01-02 12:00:04.100   300   310 I ActivityManager: Start proc\n" +
+                "01-02 12:00:05.000  2345  2345 E AndroidRuntime: FATAL EXCEPTION: main\n" +
+                "01-02 12:00:05.000  2345  2345 E AndroidRuntime: java.lang.Error: oops\n" +
+                "01-02 12:00:05.000  2345  2345 E AndroidRuntime: \tat a.B.c(B.java:1)\n" +
+                "01-02 12:00:05.000  2345  2345 E AndroidRuntime: Caused by: java.lang.Error\n" +
+                "01-02 12:00:05.000  2345  2345 E AndroidRuntime: \t... 3 more\n" +
+                "01-02 12:00:05.000  2345  2345 E AndroidRuntime: Shutting down\n" +
+                "01-02 12:00:05.000  2345  2346 E AndroidRuntime: other thread\n"
+                ).encode("utf-8")
+        output = BytesIO()
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, data)
+        os.close(write_fd)
+        try:
+            extractor = CrashExtractor(read_fd, output)
+            extractor.run()
+        finally:
+            os.close(read_fd)
+        output = output.getvalue().decode("utf-8")
+        # the lines logged after a report aren't part of it
+        self.assertTrue("Reason: timeout" in output)
+        self.assertTrue("... 3 more" in output)
+        for line in ("Start proc", "Shutting down", "other thread"):
+            self.assertFalse(line in output)
+        self.assertEqual(extractor.total, 2)
+        # written reports don't keep their lines
+        self.assertEqual(sorted(entry[1] for entry in
+                                extractor.reports.values()),
+                         ["anr", "java_crash"])
+
+    def test_json_and_files(self):
+        crash_dir = tempfile.mkdtemp()
+        stderr = sys.stderr
+        try:
+            # the summary goes to stderr, to keep stdout JSON
+            sys.stderr = StringIO()
+            output = extract(CRASH_LOG, json=True, crash_dir=crash_dir)[1]
+            self.assertTrue(sys.stderr.getvalue().startswith(
+                "--------- 4 crash reports, 3 distinct\n"))
+            records = [json.loads(line) for line in output.splitlines()]
+            self.assertEqual([record["kind"] for record in records],
+                             ["java_crash", "native_crash", "anr", "java_crash"])
+            self.assertEqual([record["count"] for record in records], [1, 1, 1, 2])
+            self.assertEqual(records[0]["signature"], records[3]["signature"])
+            self.assertFalse("lines" in records[3])
+            self.assertEqual(len(os.listdir(crash_dir)), 3)
+        finally:
+            sys.stderr = stderr
+            shutil.rmtree(crash_dir)
+
+    def test_long_format(self):
+        long_log = os.path.join(this_dir, "logs", "long_log")
+        extractor, output = extract(long_log)
+        self.assertEqual(extractor.total, 1)
+        self.assertTrue("java.lang.RuntimeException: boom" in output)
+
+class CrashReportTest(unittest.TestCase):
+    def test_signature(self):
+        def report(pid, address):
+            report = CrashReport("native_crash", {"message": "*** ***"})
+            for message in ("pid: %s, tid: %s" % (pid, pid),
+                            "signal 11 (SIGSEGV), fault addr %s" % address,
+                            "#00 pc 0001a2b4  /system/lib/libc.so"):
+                report.add({"message": message})
+            return report
+
+        self.assertEqual(report(1, "0x1c").signature(),
+                         report(2, "0x2c").signature())
+        other = report(1, "0x1c")
+        other.add({"message": "#01 pc 0001a2b8  /system/lib/libc.so"})
+        self.assertNotEqual(other.signature(), report(1, "0x1c").signature())
@@ -0,0 +1,49 @@
+from __future__ import unicode_literals
+from logcatcolor.dedup import Deduplicator
+import unittest
+
+def record(tag, message):
+    return {"tag": tag, "message": message,
+            "line": "I/%s(  1): %s" % (tag, message)}
+
+class DeduplicatorTest(unittest.TestCase):
+    def test_consecutive(self):
+        dedup = Deduplicator()
+        self.assertEqual(dedup.add(record("Tag", "a")), (False, ()))
+        self.assertEqual(dedup.add(record("Tag", "a")), (True, ()))
+        self.assertEqual(dedup.add(record("Tag", "a")), (True, ()))
+
+        duplicate, summaries = dedup.add(record("Tag", "b"))
+        self.assertFalse(duplicate)
+        self.assertEqual(len(summaries), 1)
+        self.assertEqual(summaries[0]["message"], "repeated 2 more times: a")
+        self.assertEqual(summaries[0]["line"],
+                         "--------- repeated 2 more times: I/Tag(  1): a")
+
+        # same message, different tag
+        self.assertEqual(dedup.add(record("Tag2", "b")), (False, ()))
+        self.assertEqual(dedup.suppressed, 2)
+
+    def test_window(self):
+        dedup = Deduplicator(window=2)
+        dedup.add(record("Tag", "a"))
+        dedup.add(record("Tag", "b"))
+        self.assertEqual(dedup.add(record("Tag", "a")), (True, ()))
+        self.assertEqual(dedup.add(record("Tag", "b")), (True, ()))
+
+        duplicate, summaries = dedup.add(record("Tag", "c"))
+        self.assertFalse(duplicate)
+        self.assertEqual([s["message"] for s in summaries],
+                         ["repeated 1 more times: a"])
+
+        summaries = dedup.flush()
+        self.assertEqual([s["message"] for s in summaries],
+                         ["repeated 1 more times: b"])
+        self.assertEqual(dedup.flush(), [])
+
+    def test_hash_collision(self):
+        # hash(-1) == hash(-2), but the lines are different
+        dedup = Deduplicator()
+        self.assertEqual(hash(("Tag", -1)), hash(("Tag", -2)))
+        self.assertEqual(dedup.add(record("Tag", -1)), (False, ()))
+        self.assertEqual(dedup.add(record("Tag", -2)), (False, ()))
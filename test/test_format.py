@@ -95,8 +95,9 @@ class FormatTest(unittest.TestCase):
 
     @format_test(LongFormat)
     def test_long_format(self, format):
-        self.assertFalse(format.match(LONG_LINES[0]))
-        self.assertTrue(format.match(LONG_LINES[1]))
+        self.assertEqual(format.match(LONG_LINES[0]), None)
+        self.assertEqual(format.match(LONG_LINES[1]), None)
+        self.assertTrue(format.match(""))
 
         self.assertEqual(format.get("priority"), "I")
         self.assertEqual(format.get("tag"), "Tag")
@@ -106,6 +107,39 @@ class FormatTest(unittest.TestCase):
         self.assertEqual(format.get("time"), "12:34:56.000")
         self.assertEqual(format.get("message"), "message")
 
+    @format_test(LongFormat)
+    def test_long_format_multiline(self, format):
+        self.assertFalse(format.match("not in a record"))
+        self.assertEqual(format.match("[ 01-02 12:34:56.000  1234: 5678 E/Tag ]"), None)
+        self.assertEqual(format.match("line 1"), None)
+        self.assertEqual(format.match("line 2"), None)
+
+        # the next header completes a record without a blank line
+        self.assertTrue(format.match("[ 01-02 12:34:57.000  1234: 5678 I/Tag2 ]"))
+        self.assertEqual(format.get("tid"), "5678")
+        self.assertEqual(format.get("message"), "line 1\nline 2")
+        self.assertEqual(format.get("line"),
+            "[ 01-02 12:34:56.000  1234: 5678 E/Tag ]\nline 1\nline 2")
+        format.data.clear()
+
+        self.assertEqual(format.match("line 3"), None)
+        self.assertTrue(format.flush())
+        self.assertEqual(format.get("tag"), "Tag2")
+        self.assertEqual(format.get("message"), "line 3")
+        self.assertFalse(format.flush())
+
+    def test_interned_tags(self):
+        format = BriefFormat()
+        format.match("I/%s(  123): message" % "".join(["T", "ag"]))
+        first = format.get("tag")
+        format.match("I/%s(  123): other" % "".join(["Ta", "g"]))
+        self.assertIs(format.get("tag"), first)
+
+        format.MAX_INTERNED_TAGS = 2
+        for tag in ("A", "B", "A", "C"):
+            format.match("I/%s(  123): message" % tag)
+        self.assertEqual(list(format.tags), ["A", "C"])
+
     def test_detect_format(self):
         self.assertEqual(detect_format([MARKER_LINE, BRIEF_LINE]), "brief")
         self.assertEqual(detect_format([MARKER_LINE, PROCESS_LINE]), "process")
@@ -0,0 +1,57 @@
+from __future__ import unicode_literals
+from common import MockObject
+from logcatcolor.column import TagColumn
+from logcatcolor.layout import CsvLayout, JsonLayout
+import json
+import unittest
+
+DATA = {"priority": "I", "tag": "Tag", "pid": "123",
+        "message": "message, \"quoted\"", "line": "unused"}
+
+class LayoutTest(unittest.TestCase):
+    def test_json_layout(self):
+        layout = JsonLayout()
+        self.assertEqual(layout.columns, [])
+
+        record = json.loads(layout.layout_data(DATA))
+        self.assertEqual(record, {
+            "date": None, "time": None, "pid": "123", "tid": None,
+            "priority": "I", "tag": "Tag", "message": "message, \"quoted\""})
+
+        self.assertEqual(json.loads(layout.layout_marker("--------- marker")),
+                         {"marker": "--------- marker"})
+
+    def test_json_layout_non_utf8(self):
+        layout = JsonLayout()
+        message = b"message\xc0\x80".decode("utf-8", layout.DECODE_ERRORS)
+        rendered = layout.layout_data({"message": message})
+        encoded = rendered.encode("utf-8", layout.ENCODE_ERRORS)
+
+        # valid UTF-8 JSON that gives back the original bytes
+        decoded = json.loads(encoded.decode("utf-8"))["message"]
+        self.assertEqual(decoded.encode("utf-8", "surrogateescape"),
+                         b"message\xc0\x80")
+
+    def test_csv_layout(self):
+        layout = CsvLayout()
+        self.assertEqual(layout.layout_data(DATA),
+                         "date,time,pid,tid,priority,tag,message\n"
+                         ",,123,,I,Tag,\"message, \"\"quoted\"\"\"")
+        self.assertEqual(layout.layout_data({"message": "plain"}),
+                         ",,,,,,plain")
+        self.assertEqual(layout.layout_marker("--------- marker"), None)
+
+    def test_tag_colors_bounded(self):
+        profile = MockObject(tag_colors={"Fixed": TagColumn.COLOR_MAP["RED"]})
+        layout = MockObject(config=MockObject(get_column_width=lambda c: 20),
+                            profile=profile)
+        column = TagColumn(layout)
+        column.MAX_ALLOCATED = 2
+
+        colors = [column.allocate_color(tag) for tag in ("A", "B", "A", "C")]
+        self.assertEqual(colors[0], colors[2])
+        # B was the least recently seen, so it's forgotten first
+        self.assertEqual(list(column.allocated), ["A", "C"])
+        self.assertEqual(column.allocate_color("Fixed"),
+                         TagColumn.COLOR_MAP["RED"])
+        self.assertEqual(profile.tag_colors, {"Fixed": TagColumn.COLOR_MAP["RED"]})
@@ -8,6 +8,10 @@ import tempfile
 import unittest
 
 from common import LogcatColor, MockAdbLogcatColor
+from io import BytesIO
+from logcatcolor.config import LogcatColorConfig
+from logcatcolor.reader import LogcatReader, PassThroughReader
+from logcatcolor.stats import PipelineStats
 this_dir = os.path.dirname(os.path.abspath(__file__))
 
 def logcat_color_test(*args, **kwargs):
@@ -22,6 +26,8 @@ logs_dir = os.path.join(this_dir, "logs")
 configs_dir = os.path.join(this_dir, "configs")
 
 BRIEF_LOG = os.path.join(logs_dir, "brief_log")
+REPEATED_LOG = os.path.join(logs_dir, "repeated_log")
+LONG_LOG = os.path.join(logs_dir, "long_log")
 NON_UTF8_LOG = os.path.join(logs_dir, "non_utf8_log")
 NON_UTF8_OUTPUT = os.path.join(logs_dir, "non_utf8_output")
 BRIEF_FILTER_CONFIG = os.path.join(configs_dir, "brief_filter_config")
@@ -31,6 +37,8 @@ tmpfd, tmpin = tempfile.mkstemp()
 os.close(tmpfd)
 tmpfd, tmpout = tempfile.mkstemp()
 os.close(tmpfd)
+tmpfd, tmptee = tempfile.mkstemp()
+os.close(tmpfd)
 
 class LogcatColorTest(unittest.TestCase):
     DEBUG = False
@@ -72,7 +80,7 @@ class LogcatColorTest(unittest.TestCase):
 
         self.proc = Popen(args, stdout=PIPE, stderr=PIPE, stdin=PIPE, **kwargs)
         self.out, self.err = self.proc.communicate(piped)
-        self.out = self.out.decode('utf-8')
+        self.out = self.out.decode('utf-8', 'surrogateescape')
 
         self.filter_results = common.read_filter_results()
         if os.path.exists(common.filter_results):
@@ -96,6 +104,61 @@ class LogcatColorTest(unittest.TestCase):
             brief_data = f.read()
         self.assertEqual(self.out, brief_data)
 
+    @logcat_color_test("--plain", "--ring-size", "2", "--ring-policy", "block",
+        input=BRIEF_LOG)
+    def test_ring_buffer(self):
+        self.assertEqual(self.proc.returncode, 0)
+        with open(BRIEF_LOG, "rt") as f:
+            brief_data = f.read()
+        self.assertEqual(self.out, brief_data)
+
+    @logcat_color_test("--plain", "--threaded", "brief_filter_tag",
+        input=BRIEF_LOG, config=BRIEF_FILTER_CONFIG)
+    def test_threaded(self):
+        self.assertEqual(self.proc.returncode, 0)
+        self.assertEqual(self.out, "I/Tag2( 234): message 2\n"
+                                   "I/Tag4( 890): message 4\n")
+
+    @logcat_color_test("--plain", "--dedup", input=REPEATED_LOG)
+    def test_dedup(self):
+        self.assertEqual(self.proc.returncode, 0)
+        self.assertEqual(self.out,
+            "I/Tag(  123): message\n"
+            "--------- repeated 2 more times: I/Tag(  123): message\n"
+            "I/Tag2( 234): message 2\n"
+            "I/Tag(  123): message\n"
+            "--------- repeated 1 more times: I/Tag(  123): message\n")
+
+    @logcat_color_test("--plain", "-B", "1", "brief_filter_fn",
+        input=BRIEF_LOG, config=BRIEF_FILTER_CONFIG)
+    def test_context(self):
+        self.assertEqual(self.proc.returncode, 0)
+        self.assertEqual(self.out, "I/Tag(  123): message\n"
+                                   "I/Tag2( 234): message 2\n"
+                                   "I/Tag3( 567): message 3\n")
+
+    @logcat_color_test("--layout", "json", "--stats", input=LONG_LOG)
+    def test_long_records(self):
+        self.assertEqual(self.proc.returncode, 0)
+        records = [json.loads(line) for line in self.out.splitlines()]
+        self.assertEqual([record.get("tag") for record in records],
+                         [None, "Tag", "AndroidRuntime", "Tag2"])
+        self.assertEqual(records[2]["message"],
+                         "FATAL EXCEPTION: main\n"
+                         "java.lang.RuntimeException: boom\n"
+                         "at com.example.Main.run(Main.java:10)")
+        self.assertEqual(records[3]["tid"], "0x7b")
+        self.assertTrue("lines parsed:   3 (0 unparsed" in
+                        self.err.decode("utf-8"))
+
+    @logcat_color_test("--top", "--threaded", input=REPEATED_LOG)
+    def test_top(self):
+        self.assertEqual(self.proc.returncode, 0)
+        lines = self.out.splitlines()
+        self.assertTrue("6 lines, 2 tags, 2 pids" in lines[0])
+        self.assertTrue(lines[4].endswith(" 5  Tag"))
+        self.assertTrue(lines[5].endswith(" 1  Tag2"))
+
     @logcat_color_test("--plain", "brief_filter_fn",
         input=BRIEF_LOG, config=BRIEF_FILTER_CONFIG)
     def test_plain_logging_with_fn_filter(self):
@@ -153,6 +216,54 @@ class LogcatColorTest(unittest.TestCase):
             non_utf8_output = f.read()
         self.assertEqual(self.out, non_utf8_output)
 
+    @logcat_color_test("--plain", "--stats", "brief_filter_tag",
+        input=BRIEF_LOG, config=BRIEF_FILTER_CONFIG)
+    def test_stats(self):
+        self.assertEqual(self.proc.returncode, 0)
+        err = self.err.decode('utf-8')
+        self.assertTrue("lines read:     4" in err)
+        self.assertTrue("lines rejected: 2" in err)
+        self.assertTrue("rejected by brief_filter_tag/tags: 2" in err)
+
+    @logcat_color_test("--layout", "csv", input=NON_UTF8_LOG)
+    def test_csv_non_utf8_output(self):
+        self.assertEqual(self.proc.returncode, 0)
+        self.assertEqual(self.out.encode("utf-8", "surrogateescape"),
+                         b"date,time,pid,tid,priority,tag,message\n"
+                         b",,123,,I,Tag,message\xc0\x80\n")
+
+    @logcat_color_test("--plain", "--tee", "csv:%s:brief_filter_tag" % tmptee,
+        "brief_filter_fn", input=BRIEF_LOG, config=BRIEF_FILTER_CONFIG)
+    def test_tee(self):
+        self.assertEqual(self.proc.returncode, 0)
+        self.assertEqual(self.out, "I/Tag2( 234): message 2\n"
+                                   "I/Tag3( 567): message 3\n")
+        with open(tmptee, "rt") as f:
+            self.assertEqual(f.read(), "date,time,pid,tid,priority,tag,message\n"
+                                       ",,234,,I,Tag2,message 2\n"
+                                       ",,890,,I,Tag4,message 4\n")
+
+    @logcat_color_test("--plain", "--route", "brief_filter_tag:%s" % tmptee,
+        "--route", "brief_filter_fn:%s:csv" % tmpout,
+        input=BRIEF_LOG, config=BRIEF_FILTER_CONFIG)
+    def test_route(self):
+        self.assertEqual(self.proc.returncode, 0)
+        with open(BRIEF_LOG, "rt") as f:
+            self.assertEqual(self.out, f.read())
+        with open(tmptee, "rt") as f:
+            self.assertEqual(f.read(), "I/Tag2( 234): message 2\n"
+                                       "I/Tag4( 890): message 4\n")
+        with open(tmpout, "rt") as f:
+            self.assertEqual(f.read(), "date,time,pid,tid,priority,tag,message\n"
+                                       ",,234,,I,Tag2,message 2\n"
+                                       ",,567,,I,Tag3,message 3\n")
+
+    @logcat_color_test("--tee", "csv:%s:no_such_profile" % tmptee,
+        input=BRIEF_LOG)
+    def test_tee_unknown_profile(self):
+        self.assertNotEqual(self.proc.returncode, 0)
+        self.assertTrue(b"no_such_profile" in self.err)
+
     def test_logcat_options_with_filters(self):
         # Make sure logcat flags come before filter arguments
         # https://github.com/marshall/logcat-color/issues/5
@@ -175,6 +286,28 @@ class LogcatColorTest(unittest.TestCase):
         self.assertEqual(args[-2], "Tag1:V")
         self.assertEqual(args[-1], "*:S")
 
+    def test_pushdown(self):
+        lc = LogcatColor(args=["--config", BRIEF_FILTER_CONFIG, "-v", "brief",
+                               "brief_filter_tag"])
+        self.assertEqual(lc.get_logcat_args(),
+                         ["-v", "brief", "Tag2:V", "Tag4:V", "*:S"])
+
+        lc = LogcatColor(args=["--config", BRIEF_FILTER_CONFIG, "--no-pushdown",
+                               "brief_filter_tag"])
+        self.assertEqual(lc.get_logcat_args(), [])
+
+        lc = LogcatColor(args=["--config", BRIEF_FILTER_CONFIG, "-A", "1",
+                               "brief_filter_tag"])
+        self.assertEqual(lc.get_logcat_args(), [])
+
+        lc = LogcatColor(args=["--config", BRIEF_FILTER_CONFIG,
+                               "--flight-recorder", "100", "brief_filter_tag"])
+        self.assertEqual(lc.get_logcat_args(), [])
+
+        lc = LogcatColor(args=["--config", BRIEF_FILTER_CONFIG, "--crashes",
+                               "brief_filter_tag"])
+        self.assertEqual(lc.get_logcat_args(), [])
+
     def test_stay_connected(self):
         lc = MockAdbLogcatColor(BRIEF_LOG, tmpout,
                                 args=["-s", "serial123", "--stay-connected",
@@ -197,3 +330,85 @@ class LogcatColorTest(unittest.TestCase):
 
         for r in results:
             self.assertEqual(r["serial"], "serial123")
+
+class PassThroughReaderTest(unittest.TestCase):
+    def copy(self, data, read_size=None, verbatim=False):
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, data)
+        os.close(write_fd)
+
+        output = BytesIO()
+        stats = PipelineStats()
+        reader = PassThroughReader(read_fd, writer=output, stats=stats,
+                                   verbatim=verbatim)
+        if read_size:
+            reader.READ_SIZE = read_size
+        try:
+            reader.run()
+        finally:
+            os.close(read_fd)
+        return output.getvalue(), stats
+
+    def test_copy(self):
+        data = b"I/Tag(  123): message\nI/Tag2( 234): message 2\n"
+        output, stats = self.copy(data + b"partial", read_size=7)
+        self.assertEqual(output, data)
+        self.assertEqual(stats.lines_read, 2)
+        self.assertEqual(stats.bytes_read, len(data) + len(b"partial"))
+        self.assertEqual(stats.bytes_written, len(data))
+
+    def test_decoded_lines(self):
+        # carriage returns and invalid UTF-8 are handled like LogcatReader
+        output, stats = self.copy(b"I/Tag(  123): a\r\n"
+                                  b"I/Tag(  123): b\xc0\x80\n")
+        self.assertEqual(output, b"I/Tag(  123): a\n"
+                                 b"I/Tag(  123): b\\xc0\\x80\n")
+
+    def test_same_as_reader(self):
+        # whitespace is stripped, and blank and unparsed lines are dropped,
+        # in every block
+        lines = [b"--------- beginning of main", b"I/Tag(  123): one",
+                 b"I/Tag(  123): two", b"I/Tag(  123): three  ", b"",
+                 b"   ", b"not a logcat line", b"  I/Tag(  123): four",
+                 b"I/Tag(  123): five"]
+        data = b"".join(line + b"\n" for line in lines)
+        expected = self.render(data)
+        self.assertEqual(len(expected.splitlines()), 6)
+
+        for read_size in (None, 40):
+            output, stats = self.copy(data, read_size=read_size)
+            self.assertEqual(output, expected)
+            self.assertEqual(stats.bytes_read, len(data))
+            self.assertEqual(stats.lines_unparsed, 3)
+            self.assertEqual(stats.lines_rendered, 5)
+
+    def test_verbatim(self):
+        # lines that were already rendered are copied as they are
+        data = b"\x1b[31m  Tag\x1b[0m message  \n\n"
+        output, stats = self.copy(data + b"partial", read_size=7,
+                                  verbatim=True)
+        self.assertEqual(output, data)
+        self.assertEqual(stats.lines_rendered, 2)
+
+    def test_long_format(self):
+        with open(LONG_LOG, "rb") as f:
+            data = f.read()
+        self.assertEqual(self.copy(data)[0], self.render(data))
+
+    def render(self, data):
+        # the raw output of LogcatReader
+        options = common.MockObject(config=EMPTY_CONFIG, wrap=None,
+                                    stay_connected=None)
+        output = BytesIO()
+        read_fd, write_fd = os.pipe()
+        reader = LogcatReader(read_fd, LogcatColorConfig(options),
+                              layout="raw", writer=output)
+        try:
+            for line in data.decode("utf-8").split("\n")[:-1]:
+                reader.process_line(line)
+            reader.finish()
+        finally:
+            reader.del_channel()
+            os.close(read_fd)
+            os.close(write_fd)
+        return output.getvalue()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Memory soak test: streams synthetic threadtime lines with an ever growing
+number of distinct tags and pids through a reader with most per-key state
+enabled (rate limits, dedup, time columns), and checks that the resident set
+size stays flat once every bounded structure has filled up.
+
+The unit test runs a short soak. For a long one:
+
+usage: python test/test_memory.py --lines 300000000
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+import gc
+import os
+import sys
+import unittest
+
+this_dir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.dirname(this_dir))
+
+from common import MockObject
+from logcatcolor.config import LogcatColorConfig
+from logcatcolor.dedup import Deduplicator
+from logcatcolor.profile import Profile
+from logcatcolor.reader import LogcatReader
+
+empty_config = os.path.join(this_dir, "configs", "empty_config")
+
+def get_rss():
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+def synthetic_line(i):
+    # a new tag every 8 lines and a new pid every 16 lines, forever
+    return "01-02 %02d:%02d:%02d.%03d %5d %5d %s Tag%d: message %d" % (
+        i // 3600000 % 24, i // 60000 % 60, i // 1000 % 60, i % 1000,
+        i // 16 % 1000000, i // 16 % 1000000, "VDIWEF"[i % 6], i // 8, i % 5)
+
+def soak(lines, samples=10, report=None):
+    """Processes `lines` lines, and returns the RSS after each of `samples`
+    equal parts of them"""
+    options = MockObject(config=empty_config, wrap=None, stay_connected=None,
+                         time_columns=["elapsed", "delta"])
+    config = LogcatColorConfig(options)
+    profile = Profile(name="soak", rate_limit=1000, rate_limit_pid=True)
+
+    read_fd, write_fd = os.pipe()
+    writer = open(os.devnull, "wb")
+    reader = LogcatReader(read_fd, config, profile=profile, format="threadtime",
+                          layout="threadtime", writer=writer,
+                          dedup=Deduplicator(64))
+
+    rss = []
+    try:
+        step = max(1, lines // samples)
+        for i in range(lines):
+            reader.process_line(synthetic_line(i))
+            if (i + 1) % step == 0:
+                gc.collect()
+                rss.append(get_rss())
+                if report:
+                    report(i + 1, rss[-1])
+    finally:
+        reader.del_channel()
+        os.close(read_fd)
+        os.close(write_fd)
+        writer.close()
+    return rss
+
+@unittest.skipUnless(os.path.exists("/proc/self/statm"), "needs /proc")
+class MemorySoakTest(unittest.TestCase):
+    LINES = 180000
+
+    def test_flat_rss(self):
+        rss = soak(self.LINES, samples=3)
+        # the first third fills up the bounded structures, after that
+        # memory shouldn't grow with the number of distinct tags and pids
+        growth = rss[-1] - rss[0]
+        self.assertTrue(growth < 1024 * 1024,
+                        "RSS grew by %d bytes: %r" % (growth, rss))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=10000000)
+    parser.add_argument("--samples", type=int, default=20)
+    args = parser.parse_args()
+
+    def report(count, rss):
+        print("%12d lines  %8.1f MB" % (count, rss / 1024.0 / 1024.0))
+        sys.stdout.flush()
+
+    rss = soak(args.lines, args.samples, report)
+    print("growth after the first sample: %.1f MB" % (
+        (rss[-1] - rss[0]) / 1024.0 / 1024.0))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+from __future__ import unicode_literals
+import json
+import os
+import shutil
+from subprocess import Popen, PIPE
+import sys
+import tempfile
+import unittest
+
+from common import MockObject
+from io import BytesIO, StringIO
+from logcatcolor.config import LogcatColorConfig
+from logcatcolor.merge import (
+    MergeReader,
+    MergeSource,
+    merge_records,
+    reorder,
+    richest_format,
+    source_names,
+)
+
+this_dir = os.path.abspath(os.path.dirname(__file__))
+top_dir = os.path.dirname(this_dir)
+empty_config = os.path.join(this_dir, "configs", "empty_config")
+
+def threadtime(second, message, pid=100):
+    return "01-02 12:00:%06.3f  %4d  %4d I Tag     : %s\n" % (
+        second, pid, pid, message)
+
+MAIN = ("--------- beginning of main\n" +
+        threadtime(1, "main 1") + threadtime(3, "main 3") +
+        threadtime(2.5, "main 2.5, late") + threadtime(5, "main 5"))
+SYSTEM = ("--------- beginning of system\n" +
+          threadtime(2, "system 2", 200) + threadtime(4, "system 4", 200) +
+          threadtime(6, "system 6", 200))
+
+class MergeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.main = self.write("main.log", MAIN)
+        self.system = self.write("system.log", SYSTEM)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def merge(self, window):
+        sources = [MergeSource(self.main, "main"),
+                   MergeSource(self.system, "system")]
+        return [record.get("message", record.get("marker"))
+                for record in merge_records(sources, window)]
+
+    def test_merge(self):
+        self.assertEqual(self.merge(window=2), [
+            "--------- beginning of main", "--------- beginning of system",
+            "main 1", "system 2", "main 2.5, late", "main 3", "system 4",
+            "main 5", "system 6"])
+
+    def test_window(self):
+        # a line later than the window is left where it is in its capture
+        items = [(3, "c"), (4, "d"), (1, "a")]
+        self.assertEqual([item[3] for item in reorder(iter(items), 1, 0)],
+                         ["c", "a", "d"])
+
+    def test_reorder(self):
+        items = [(3, "c"), (1, "a"), (2, "b"), (6, "f"), (4, "d"), (5, "e")]
+        self.assertEqual([item[3] for item in reorder(iter(items), 2, 0)],
+                         ["a", "b", "c", "d", "e", "f"])
+
+    def test_source_names(self):
+        self.assertEqual(source_names(["a/main.log", "b/system.log"]),
+                         ["main.log", "system.log"])
+        self.assertEqual(source_names(["a/main.log", "b/main.log"]),
+                         ["a/main.log", "b/main.log"])
+
+    def test_mixed_formats(self):
+        # the layout can show the fields of every capture, whichever
+        # capture's lines come first
+        brief = self.write("brief.log", "I/Brief(  300): no timestamp\n" * 4)
+        options = MockObject(config=empty_config, wrap=None,
+                             stay_connected=None)
+        output = BytesIO()
+        stderr = sys.stderr
+        try:
+            sys.stderr = StringIO()
+            reader = MergeReader([brief, self.system],
+                                 LogcatColorConfig(options), writer=output)
+            reader.run()
+            warning = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+
+        self.assertEqual(reader.layout.NAME, "threadtime")
+        self.assertTrue(warning.startswith(brief + " has lines without"))
+        # lines without a timestamp at the start of a capture come first
+        lines = output.getvalue().decode("utf-8")
+        self.assertTrue(lines.index("no timestamp") < lines.index("system 2"))
+
+    def test_richest_format(self):
+        self.assertEqual(richest_format(["brief", "threadtime", "time"]),
+                         "threadtime")
+        self.assertEqual(richest_format(["tag", "process"]), "process")
+        self.assertEqual(richest_format([]), "brief")
+
+    def test_command_line(self):
+        args = [sys.executable, "-c",
+                "from logcatcolor.main import main; main()",
+                "--config", empty_config, "--layout", "json", "--source-column",
+                "--input", self.main, "--input", self.system]
+        proc = Popen(args, stdout=PIPE, stderr=PIPE, cwd=top_dir)
+        out, err = proc.communicate()
+        self.assertEqual(proc.returncode, 0, err)
+
+        records = [json.loads(line) for line in out.decode("utf-8").splitlines()]
+        records = [record for record in records if "marker" not in record]
+        self.assertEqual([record["source"] for record in records],
+                         ["main.log", "system.log", "main.log", "main.log",
+                          "system.log", "main.log", "system.log"])
+        self.assertEqual(records[1]["pid"], "200")
@@ -0,0 +1,102 @@
+from __future__ import unicode_literals
+from logcatcolor.output import FileWriter, parse_size
+import gzip
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class FileWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "out.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def read_all(self, writer):
+        data = b""
+        for segment in writer.get_segments():
+            if segment.endswith(".gz"):
+                with gzip.open(segment, "rb") as f:
+                    data += f.read()
+            else:
+                with open(segment, "rb") as f:
+                    data += f.read()
+        with open(self.path, "rb") as f:
+            return data + f.read()
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size("100"), 100)
+        self.assertEqual(parse_size("2k"), 2048)
+        self.assertEqual(parse_size("1MB"), 1024 ** 2)
+        self.assertRaises(ValueError, parse_size, "1T")
+
+    def test_no_rotation(self):
+        writer = FileWriter(self.path)
+        writer.write(b"line 1\n")
+        writer.write(b"line 2\n")
+        writer.close()
+        self.assertEqual(writer.get_segments(), [])
+        self.assertEqual(self.read_all(writer), b"line 1\nline 2\n")
+
+    def test_size_rotation(self):
+        writer = FileWriter(self.path, max_size=14, keep=2)
+        for i in range(8):
+            writer.write(b"line %d\n" % i)
+        writer.close()
+
+        # every segment holds two whole lines, and only the newest two are kept
+        segments = writer.get_segments()
+        self.assertEqual(len(segments), 2)
+        self.assertEqual(self.read_all(writer),
+                         b"line 2\nline 3\nline 4\nline 5\nline 6\nline 7\n")
+
+    def test_age_rotation(self):
+        clock = FakeClock()
+        writer = FileWriter(self.path, max_age=10, clock=clock)
+        writer.write(b"line 1\n")
+        clock.now = 10
+        writer.write(b"line 2\n")
+        writer.close()
+
+        self.assertEqual(len(writer.get_segments()), 1)
+        self.assertEqual(self.read_all(writer), b"line 1\nline 2\n")
+
+    def test_compress(self):
+        writer = FileWriter(self.path, max_size=7, keep=None, compress=True)
+        for i in range(3):
+            writer.write(b"line %d\n" % i)
+        writer.close()
+
+        segments = writer.get_segments()
+        self.assertEqual(len(segments), 2)
+        self.assertTrue(all(s.endswith(".gz") for s in segments))
+        self.assertEqual(self.read_all(writer), b"line 0\nline 1\nline 2\n")
+
+    def test_idle_flush(self):
+        # buffered lines are written out even when no more lines come in
+        class QuickFileWriter(FileWriter):
+            FLUSH_INTERVAL = 0.05
+
+        writer = QuickFileWriter(self.path, clock=FakeClock())
+        writer.write(b"line 1\n")
+        writer.flush()
+        try:
+            for i in range(100):
+                with open(self.path, "rb") as f:
+                    if f.read() == b"line 1\n":
+                        break
+                time.sleep(0.01)
+            else:
+                self.fail("the line was never flushed")
+        finally:
+            writer.close()
@@ -1,7 +1,16 @@
 from __future__ import unicode_literals
-from logcatcolor.profile import Profile
+from logcatcolor.profile import FilterChain, Profile
+from logcatcolor.ratelimit import RateLimiter
+from logcatcolor.router import ProfileRouter
 import unittest
 
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
 
 class ProfileTest(unittest.TestCase):
     def setUp(self):
@@ -20,3 +29,175 @@ class ProfileTest(unittest.TestCase):
     def test_empty_package_will_still_work(self):
         profile = Profile(name = 'package_filt')
         self.assertTrue(profile.include({'message' : 'Start proc com.example.test for activity tw.com.xxxx.android.yyyy/.333Activity: pid=123456 uid=10105 gids={3003}'}))
+
+    def test_rate_limit(self):
+        profile = Profile(name = 'rate_limit', rate_limit = {'Spam': 2, '*': 100})
+        spam = {'tag': 'Spam', 'pid': '1', 'message': 'spam'}
+        results = [profile.include(spam) for i in range(5)]
+        self.assertEqual(results, [True, True, False, False, False])
+        self.assertTrue(profile.include({'tag': 'Quiet', 'message': 'hello'}))
+        self.assertEqual(profile.rejections, {'rate_limit': 3})
+
+class FilterChainTest(unittest.TestCase):
+    def test_reorder(self):
+        calls = []
+        def slow(data):
+            calls.append("slow")
+            sum(range(2000))
+            return True
+        def picky(data):
+            calls.append("picky")
+            return data["message"] == "keep"
+
+        chain = FilterChain([("slow", slow), ("picky", picky)],
+                            sample_rate=2, reorder_samples=2)
+        lines = [{"message": "drop"}] * 3 + [{"message": "keep"}]
+        results = [chain.first_rejection(line) for line in lines]
+        self.assertEqual(results, ["picky", "picky", "picky", None])
+
+        # the picky check rejects the most lines, so it runs first now
+        self.assertEqual([c["name"] for c in chain.describe()],
+                         ["picky", "slow"])
+        self.assertEqual(chain.describe()[0]["rejection_rate"], 0.5)
+
+        del calls[:]
+        self.assertEqual(chain.first_rejection({"message": "drop"}), "picky")
+        self.assertEqual(calls, ["picky"])
+
+    def test_filters_keep_order(self):
+        # a filter may rely on an earlier one, so filters are never reordered,
+        # and only see the lines the filters before them included
+        def guard(data):
+            return "tag" in data
+        def fragile(data):
+            return data["tag"] == "A"
+
+        chain = FilterChain([], [("guard", guard), ("fragile", fragile)],
+                            sample_rate=1, reorder_samples=1)
+        for i in range(4):
+            self.assertEqual(chain.first_rejection({"message": "m"}), "guard")
+        self.assertEqual(chain.first_rejection({"tag": "B"}), "fragile")
+        self.assertEqual(chain.first_rejection({"tag": "A"}), None)
+        self.assertEqual([c["name"] for c in chain.describe()],
+                         ["guard", "fragile"])
+
+        # errors are never taken for a rejection
+        self.assertRaises(KeyError, FilterChain([], [("tag", lambda data:
+            data["tag"])], sample_rate=1).first_rejection, {})
+
+    def test_profile_order(self):
+        profile = Profile(name='filter_order', priorities=('E',),
+                          packages=['com.example.test'],
+                          filters=(lambda data: True, r'keep'))
+        chain = profile.chain
+        profile.chain = FilterChain([(c[0], c[1]) for c in chain.checks],
+                                    [(c[0], c[1]) for c in chain.filters],
+                                    sample_rate=1, reorder_samples=4)
+        for i in range(4):
+            self.assertFalse(profile.include({'priority': 'E', 'pid': '1',
+                                              'message': 'keep'}))
+        names = [c['name'] for c in profile.chain.describe()]
+        # regex filters are reordered along with the built-in checks
+        self.assertEqual(names[0], 'packages')
+        self.assertEqual(sorted(names[1:3]), ['priorities', 'regex(keep)'])
+        self.assertEqual(names[3], '<lambda>')
+        self.assertEqual(profile.rejections, {'packages': 4})
+
+        # function filters only when the profile says so
+        profile = Profile(name='filter_reorder', filters=(lambda data: True,),
+                          reorder_filters=True)
+        self.assertEqual([c[0] for c in profile.chain.checks], ['<lambda>'])
+        self.assertEqual(profile.chain.filters, [])
+
+class RateLimiterTest(unittest.TestCase):
+    def test_token_bucket(self):
+        clock = FakeClock()
+        limiter = RateLimiter(2, burst=2, clock=clock)
+        data = {'tag': 'Tag', 'message': 'message'}
+        self.assertEqual([limiter.allow(data) for i in range(3)],
+                         [True, True, False])
+
+        # refills at 2 lines per second
+        clock.now = 0.5
+        self.assertEqual([limiter.allow(data) for i in range(2)], [True, False])
+
+    def test_per_pid(self):
+        limiter = RateLimiter(1, by_pid=True, clock=FakeClock())
+        self.assertTrue(limiter.allow({'tag': 'Tag', 'pid': '1'}))
+        self.assertTrue(limiter.allow({'tag': 'Tag', 'pid': '2'}))
+        self.assertFalse(limiter.allow({'tag': 'Tag', 'pid': '1'}))
+
+    def test_summaries(self):
+        clock = FakeClock()
+        limiter = RateLimiter({'Spam': 1}, summary_interval=5, clock=clock)
+        for i in range(4):
+            limiter.allow({'tag': 'Spam', 'message': str(i), 'line': str(i)})
+        self.assertTrue(limiter.allow({'tag': 'Other', 'message': 'x'}))
+        self.assertFalse(limiter.summary_due)
+
+        clock.now = 5.0
+        limiter.allow({'tag': 'Other', 'message': 'x'})
+        self.assertTrue(limiter.summary_due)
+        summaries = limiter.take_summaries()
+        self.assertEqual(len(summaries), 1)
+        self.assertEqual(summaries[0]['message'], '3 lines suppressed by rate limit')
+        self.assertEqual(summaries[0]['line'],
+                         '--------- tag Spam: 3 lines suppressed by rate limit')
+        self.assertEqual(limiter.flush(), [])
+
+    def test_bounded_keys(self):
+        limiter = RateLimiter(1, max_keys=2, clock=FakeClock())
+        for tag in ('A', 'A', 'B', 'C'):
+            limiter.allow({'tag': tag, 'message': tag, 'line': tag})
+
+        self.assertEqual(list(limiter.buckets.keys()), ['B', 'C'])
+        # the suppressed line of the evicted tag is still reported
+        self.assertTrue(limiter.summary_due)
+        self.assertEqual([s['tag'] for s in limiter.take_summaries()], ['A'])
+        self.assertEqual(limiter.flush(), [])
+
+class ProfileRouterTest(unittest.TestCase):
+    def test_route(self):
+        net = Profile(name = 'route_net', tags = ('Net', 'Wifi'))
+        errors = Profile(name = 'route_errors', priorities = ('E',))
+        wifi_errors = Profile(name = 'route_wifi_errors', tags = ['Wifi'],
+                              priorities = ('E',))
+        router = ProfileRouter([net, errors, wifi_errors])
+
+        def route(tag, priority):
+            data = {'tag': tag, 'priority': priority, 'message': 'message'}
+            return [p.name for p in router.route(data)]
+
+        self.assertEqual(route('Net', 'I'), ['route_net'])
+        self.assertEqual(route('Wifi', 'E'),
+                         ['route_net', 'route_errors', 'route_wifi_errors'])
+        self.assertEqual(route('Other', 'E'), ['route_errors'])
+        self.assertEqual(route('Other', 'I'), [])
+        router.count_rejections()
+        self.assertEqual(net.rejections, {'tags': 2})
+        self.assertEqual(wifi_errors.rejections, {'tags': 3})
+
+        # only the lines routed since are added when counting again
+        route('Net', 'E')
+        router.count_rejections()
+        self.assertEqual(net.rejections, {'tags': 2})
+        self.assertEqual(wifi_errors.rejections, {'tags': 4})
+
+    def test_route_single_tag(self):
+        single = Profile(name = 'route_single', tags = 'Tag')
+        router = ProfileRouter([single, Profile(name = 'route_all')])
+        data = {'tag': 'Tag', 'message': 'message'}
+        self.assertTrue(single.include(data))
+        self.assertEqual(router.route(data), [single, router.profiles[1]])
+        self.assertEqual(router.route({'tag': 'Ta', 'message': 'message'}),
+                         [router.profiles[1]])
+
+    def test_route_packages(self):
+        app = Profile(name = 'route_app', packages = ['com.example.test'],
+                      tags = ('App',))
+        router = ProfileRouter([app])
+        # the start message isn't from a routed tag, but still tracks the pid
+        self.assertEqual(router.route({'tag': 'ActivityManager', 'message':
+            'Start proc 26360:com.example.test/u0a208 for activity'}), [])
+        self.assertEqual(router.route({'tag': 'App', 'pid': '26360',
+                                       'message': 'hello'}), [app])
@@ -0,0 +1,55 @@
+from __future__ import unicode_literals
+from logcatcolor.profile import Profile
+from logcatcolor.pushdown import plan_logcat_args
+import re
+import unittest
+
+class PushdownTest(unittest.TestCase):
+    def test_tags_and_priorities(self):
+        profile = Profile(name='pushdown_tags', tags=('RIL', 'RILC'),
+                          priorities=('W', 'I', 'E'))
+        self.assertEqual(plan_logcat_args(profile),
+                         ['RIL:I', 'RILC:I', '*:S'])
+
+    def test_priorities(self):
+        profile = Profile(name='pushdown_priorities', priorities=('E', 'W'))
+        self.assertEqual(plan_logcat_args(profile), ['*:W'])
+
+        profile = Profile(name='pushdown_all_priorities',
+                          priorities=('V', 'E'))
+        self.assertEqual(plan_logcat_args(profile), [])
+
+    def test_unsafe_tags(self):
+        profile = Profile(name='pushdown_unsafe', tags=('My Tag', 'Other'))
+        self.assertEqual(plan_logcat_args(profile), [])
+
+    def test_packages(self):
+        profile = Profile(name='pushdown_packages', tags=('App',),
+                          packages=['com.example.test'], filters=r'hello')
+        # Start proc messages must still reach the profile
+        self.assertEqual(plan_logcat_args(profile, sdk=30),
+                         ['App:V', 'ActivityManager:I', '*:S'])
+        self.assertEqual(plan_logcat_args(profile, sdk=30, pid='123'),
+                         ['--pid', '123', 'App:V', 'ActivityManager:I', '*:S'])
+        self.assertEqual(plan_logcat_args(profile, sdk=23, pid='123'),
+                         ['App:V', 'ActivityManager:I', '*:S'])
+
+    def test_regex(self):
+        profile = Profile(name='pushdown_regex',
+                          filters=(lambda data: True, r'(?!complex)', r'simple text'))
+        self.assertEqual(plan_logcat_args(profile, sdk=24),
+                         ['--regex', 'simple text'])
+        self.assertEqual(plan_logcat_args(profile, sdk=23), [])
+        self.assertEqual(plan_logcat_args(profile), [])
+
+    def test_regex_flags(self):
+        # logcat would match case sensitively, and drop lines the profile
+        # includes
+        profile = Profile(name='pushdown_regex_flags',
+                          filters=re.compile('hello', re.I))
+        self.assertEqual(plan_logcat_args(profile, sdk=24), [])
+
+        profile = Profile(name='pushdown_regex_unicode',
+                          filters=re.compile('hello', re.U))
+        self.assertEqual(plan_logcat_args(profile, sdk=24),
+                         ['--regex', 'hello'])
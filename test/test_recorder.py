@@ -0,0 +1,111 @@
+from __future__ import unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+
+from common import MockObject
+from logcatcolor.config import LogcatColorConfig
+from logcatcolor.profile import Profile
+from logcatcolor.reader import LogcatReader
+from logcatcolor.recorder import FlightRecorder
+
+this_dir = os.path.abspath(os.path.dirname(__file__))
+empty_config = os.path.join(this_dir, "configs", "empty_config")
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class FlightRecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.dump_dir = tempfile.mkdtemp()
+        self.clock = Clock()
+        self.dumped = []
+
+    def tearDown(self):
+        shutil.rmtree(self.dump_dir)
+
+    def recorder(self, **kwargs):
+        return FlightRecorder(directory=self.dump_dir, clock=self.clock,
+                              wall_clock=lambda: 0,
+                              on_dump=lambda path, lines:
+                                  self.dumped.append((path, lines)),
+                              **kwargs)
+
+    def read_dump(self, index=0):
+        with open(self.dumped[index][0], "rb") as f:
+            return f.read().decode("utf-8").splitlines()
+
+    def test_bounded(self):
+        recorder = self.recorder(max_lines=3)
+        for i in range(10):
+            recorder.add("line %d" % i)
+        self.assertEqual(list(recorder.lines), [b"line 7\n", b"line 8\n",
+                                                b"line 9\n"])
+
+        recorder = self.recorder(max_bytes=3 * (7 + FlightRecorder.LINE_OVERHEAD))
+        for i in range(10):
+            recorder.add("line %d" % i)
+        self.assertEqual(len(recorder.lines), 3)
+        self.assertEqual(recorder.size, 3 * (7 + FlightRecorder.LINE_OVERHEAD))
+
+    def test_dump(self):
+        recorder = self.recorder(max_lines=2, after=5)
+        recorder.add("before 1")
+        recorder.add("before 2")
+        recorder.add("E/AndroidRuntime( 123): FATAL EXCEPTION: main")
+        self.clock.now = 4
+        recorder.add("after 1")
+        self.clock.now = 5
+        recorder.add("too late")
+        self.assertEqual(self.read_dump(), [
+            "before 2", "E/AndroidRuntime( 123): FATAL EXCEPTION: main",
+            "after 1"])
+        self.assertEqual(self.dumped[0][1], 3)
+
+        # a second dump in the same second gets its own file
+        recorder.add("I/ActivityManager( 45): ANR in com.example")
+        recorder.close()
+        self.assertEqual(len(self.dumped), 2)
+        self.assertNotEqual(self.dumped[0][0], self.dumped[1][0])
+        self.assertEqual(self.read_dump(1), [
+            "too late", "I/ActivityManager( 45): ANR in com.example"])
+
+    def test_extended(self):
+        recorder = self.recorder(max_lines=10, after=5, triggers=["crash"])
+        recorder.add("crash 1")
+        self.clock.now = 4
+        recorder.add("crash 2")
+        self.clock.now = 8
+        recorder.add("still dumping")
+        self.clock.now = 9
+        recorder.add("done")
+        self.assertEqual(self.read_dump(), ["crash 1", "crash 2",
+                                            "still dumping"])
+
+    def test_reader(self):
+        # lines the profile rejects are recorded too
+        recorder = self.recorder(max_lines=10)
+        config = LogcatColorConfig(MockObject(config=empty_config, wrap=None,
+                                              stay_connected=None))
+        profile = Profile(name="recorder", tags=["Shown"])
+        read_fd, write_fd = os.pipe()
+        with open(os.devnull, "wb") as writer:
+            reader = LogcatReader(read_fd, config, profile=profile,
+                                  format="brief", layout="brief",
+                                  writer=writer, recorder=recorder)
+            try:
+                reader.process_line("I/Hidden(  1): hidden")
+                reader.process_line("I/Shown(  1): shown")
+                reader.process_line("E/AndroidRuntime(  2): FATAL EXCEPTION: main")
+            finally:
+                reader.del_channel()
+                os.close(read_fd)
+                os.close(write_fd)
+
+        recorder.close()
+        self.assertEqual(len(self.read_dump()), 3)
@@ -0,0 +1,103 @@
+from __future__ import unicode_literals
+import asyncio
+import io
+import os
+from logcatcolor import aiter_records, iter_records
+from logcatcolor.profile import Profile
+import unittest
+
+this_dir = os.path.abspath(os.path.dirname(__file__))
+BRIEF_LOG = os.path.join(this_dir, "logs", "brief_log")
+
+THREADTIME = (b"--------- beginning of main\n"
+              b"01-02 03:04:05.000   123   124 I Tag: first\n"
+              b"01-02 03:04:05.100   123   124 W Other: second\n"
+              b"01-02 03:04:05.200   234   235 E Tag: third\xc0\n")
+
+def messages(records):
+    return [record.get("message", record.get("marker")) for record in records]
+
+class IterRecordsTest(unittest.TestCase):
+    def test_path(self):
+        records = list(iter_records(BRIEF_LOG))
+        self.assertEqual(messages(records),
+                         ["message", "message 2", "message 3", "message 4"])
+        self.assertEqual(records[1]["tag"], "Tag2")
+        self.assertEqual(records[1]["pid"], "234")
+        self.assertEqual(records[1]["line"], "I/Tag2( 234): message 2")
+
+    def test_sources(self):
+        expected = ["first", "second", "third\\xc0"]
+        self.assertEqual(messages(iter_records(THREADTIME)), expected)
+        self.assertEqual(messages(iter_records(io.BytesIO(THREADTIME))), expected)
+        self.assertEqual(messages(iter_records(
+            io.StringIO(THREADTIME.decode("utf-8", "replace"))))[:2],
+            expected[:2])
+
+        # chunks don't have to line up with lines, and the last line doesn't
+        # need a newline
+        chunks = [THREADTIME[i:i + 7] for i in range(0, len(THREADTIME) - 1, 7)]
+        self.assertEqual(messages(iter_records(chunks)), expected)
+
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, THREADTIME)
+        os.close(write_fd)
+        try:
+            self.assertEqual(messages(iter_records(read_fd)), expected)
+        finally:
+            os.close(read_fd)
+
+    def test_format_and_profile(self):
+        profile = Profile(name="records", tags=["Tag"])
+        records = list(iter_records(THREADTIME, format="threadtime",
+                                    profile="records", markers=True))
+        self.assertEqual(messages(records),
+                         ["--------- beginning of main", "first", "third\\xc0"])
+        self.assertEqual(records[1]["time"], "03:04:05.000")
+        self.assertEqual(profile.rejections, {"tags": 1})
+
+        self.assertRaises(ValueError, list,
+                          iter_records(THREADTIME, profile="no such profile"))
+
+    def test_lazy(self):
+        def chunks():
+            yield THREADTIME
+            raise AssertionError("read past the first record")
+
+        records = iter_records(chunks(), format="threadtime")
+        self.assertEqual(next(records)["message"], "first")
+
+class AsyncIterRecordsTest(unittest.TestCase):
+    def collect(self, source, **kwargs):
+        async def run():
+            return [record async for record in
+                    aiter_records(source(), **kwargs)]
+        return asyncio.run(run())
+
+    def test_async_iterable(self):
+        async def chunks():
+            for i in range(0, len(THREADTIME), 5):
+                yield THREADTIME[i:i + 5]
+
+        self.assertEqual(messages(self.collect(chunks)),
+                         ["first", "second", "third\\xc0"])
+
+    def test_stream_reader(self):
+        def stream():
+            reader = asyncio.StreamReader()
+            reader.feed_data(THREADTIME)
+            reader.feed_eof()
+            return reader
+
+        self.assertEqual(messages(self.collect(stream, format="threadtime")),
+                         ["first", "second", "third\\xc0"])
+
+class LongRecordsTest(unittest.TestCase):
+    def test_long(self):
+        long_log = os.path.join(this_dir, "logs", "long_log")
+        records = list(iter_records(long_log, markers=True))
+        self.assertEqual([record.get("tag") for record in records],
+                         [None, "Tag", "AndroidRuntime", "Tag2"])
+        self.assertEqual(records[2]["message"].splitlines()[0],
+                         "FATAL EXCEPTION: main")
+        self.assertEqual(records[3]["message"], "last message")
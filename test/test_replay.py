@@ -0,0 +1,50 @@
+from __future__ import unicode_literals
+import os
+import tempfile
+import unittest
+
+import replay
+
+CAPTURE = (b"--------- beginning of main\n"
+           b"01-02 03:04:05.000   123   124 I Tag: a\n"
+           b"01-02 03:04:05.000   123   124 I Tag: b\n"
+           b"01-02 03:04:05.500   123   124 I Tag: c\n"
+           b"01-02 03:04:09.500   123   124 I Tag: d\n")
+
+class ReplayTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, "wb") as f:
+            f.write(CAPTURE)
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def schedule(self, **kwargs):
+        return [(round(offset, 3), len(lines)) for offset, lines in
+                replay.schedule(replay.read_capture(self.path), **kwargs)]
+
+    def test_read_capture(self):
+        capture = replay.read_capture(self.path)
+        self.assertEqual(len(capture), 5)
+        # the marker is due with the first timestamped line
+        self.assertEqual(capture[0][0], capture[1][0])
+        self.assertAlmostEqual(capture[4][0] - capture[0][0], 4.5, places=3)
+
+    def test_schedule(self):
+        self.assertEqual(self.schedule(burst=16),
+                         [(0.0, 3), (0.5, 1), (4.5, 1)])
+        self.assertEqual(self.schedule(burst=2),
+                         [(0.0, 2), (0.0, 1), (0.5, 1), (4.5, 1)])
+
+    def test_speed(self):
+        self.assertEqual(self.schedule(speed=10, burst=16),
+                         [(0.0, 3), (0.05, 1), (0.45, 1)])
+        self.assertEqual(self.schedule(speed=0, burst=16), [(0.0, 5)])
+        self.assertEqual(self.schedule(burst=16, max_gap=1.0),
+                         [(0.0, 3), (0.5, 1), (1.5, 1)])
+
+    def test_loops(self):
+        self.assertEqual(self.schedule(burst=16, loops=2),
+                         [(0.0, 3), (0.5, 1), (4.5, 1),
+                          (4.5, 3), (5.0, 1), (9.0, 1)])
@@ -0,0 +1,97 @@
+from __future__ import unicode_literals
+from io import BytesIO
+import os
+import threading
+import unittest
+
+from common import MockObject
+from logcatcolor.config import LogcatColorConfig
+from logcatcolor.reader import LogcatReader
+from logcatcolor.ring import RingBuffer
+
+this_dir = os.path.abspath(os.path.dirname(__file__))
+EMPTY_CONFIG = os.path.join(this_dir, "configs", "empty_config")
+
+class RingBufferTest(unittest.TestCase):
+    def test_drop_oldest(self):
+        ring = RingBuffer(3, RingBuffer.DROP_OLDEST)
+        for i in range(5):
+            ring.put(i)
+
+        self.assertEqual(ring.get(), ([2, 3, 4], 2))
+        self.assertEqual(ring.total_dropped, 2)
+
+    def test_drop_lowest(self):
+        ring = RingBuffer(3, RingBuffer.DROP_LOWEST)
+        ring.put("e1", RingBuffer.rank("E"))
+        ring.put("v1", RingBuffer.rank("V"))
+        ring.put("i1", RingBuffer.rank("I"))
+        ring.put("w1", RingBuffer.rank("W"))
+        # lower than everything in the buffer, the new line is dropped
+        ring.put("v2", RingBuffer.rank("V"))
+        ring.put("marker", RingBuffer.MARKER_RANK)
+
+        # the remaining lines keep their original order
+        self.assertEqual(ring.get(), (["e1", "w1", "marker"], 3))
+
+    def test_max_items(self):
+        ring = RingBuffer(10)
+        for i in range(5):
+            ring.put(i)
+
+        self.assertEqual(ring.get(max_items=2), ([0, 1], 0))
+        self.assertEqual(ring.get(), ([2, 3, 4], 0))
+
+    def test_block(self):
+        ring = RingBuffer(2, RingBuffer.BLOCK)
+        ring.put(0)
+        ring.put(1)
+
+        producer = threading.Thread(target=ring.put, args=(2,))
+        producer.start()
+        producer.join(0.05)
+        self.assertTrue(producer.is_alive())
+
+        self.assertEqual(ring.get(), ([0, 1], 0))
+        producer.join()
+        self.assertEqual(ring.get(), ([2], 0))
+
+    def test_close(self):
+        ring = RingBuffer(2)
+        ring.put(0)
+        ring.close()
+        ring.put(1)
+
+        self.assertEqual(ring.get(), ([0], 0))
+        self.assertEqual(ring.get(), None)
+
+    def test_invalid_policy(self):
+        self.assertRaises(ValueError, RingBuffer, 10, "drop-newest")
+
+class RingReaderTest(unittest.TestCase):
+    def test_reader_never_flushes(self):
+        # only the render thread writes and flushes the output
+        reading_thread = threading.current_thread()
+        flushes = []
+        class Writer(BytesIO):
+            def flush(self):
+                flushes.append(threading.current_thread())
+
+        options = MockObject(config=EMPTY_CONFIG, wrap=None, stay_connected=None)
+        read_fd, write_fd = os.pipe()
+        output = Writer()
+        reader = LogcatReader(read_fd, LogcatColorConfig(options),
+                              format="brief", layout="raw", writer=output,
+                              ring=RingBuffer(16))
+        try:
+            for i in range(4):
+                reader.process_line("I/Tag(  123): message %d" % i)
+            reader.finish()
+        finally:
+            reader.del_channel()
+            os.close(read_fd)
+            os.close(write_fd)
+
+        self.assertEqual(len(output.getvalue().splitlines()), 4)
+        self.assertTrue(flushes)
+        self.assertFalse(reading_thread in flushes)
@@ -0,0 +1,57 @@
+from __future__ import unicode_literals
+from logcatcolor.profile import Profile
+from logcatcolor.sink import Sink
+import os
+import shutil
+import tempfile
+import unittest
+
+class SinkTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.profile = Profile(name="sink_profile")
+        self.sinks = []
+
+    def tearDown(self):
+        for sink in self.sinks:
+            sink.close()
+        shutil.rmtree(self.dir)
+
+    def get_profile(self, name):
+        return self.profile if name == "sink_profile" else None
+
+    def parse(self, spec, route=False):
+        if route:
+            sink = Sink.parse_route(spec, "raw", get_profile=self.get_profile)
+        else:
+            sink = Sink.parse(spec, get_profile=self.get_profile)
+        self.sinks.append(sink)
+        return sink
+
+    def test_parse(self):
+        path = os.path.join(self.dir, "out.log")
+        sink = self.parse("raw:%s:sink_profile" % path)
+        self.assertIs(sink.profile, self.profile)
+        self.assertEqual(sink.writer.path, path)
+        self.assertRaises(ValueError, Sink.parse, "raw")
+        self.assertRaises(ValueError, Sink.parse, "nope:%s" % path)
+        self.assertRaises(ValueError, self.parse, "raw:%s:nope" % path)
+        self.assertRaises(ValueError, self.parse, "sink_profile:%s:nope" % path,
+                          route=True)
+
+    def test_colon_in_path(self):
+        # a last field that isn't a name is part of the path
+        path = os.path.join(self.dir, "out:2026-10-19.log")
+        sink = self.parse("raw:%s" % path)
+        self.assertEqual(sink.writer.path, path)
+        self.assertIs(sink.profile, None)
+
+        sink = self.parse("json:%s:sink_profile" % path)
+        self.assertEqual(sink.writer.path, path)
+        self.assertIs(sink.profile, self.profile)
+
+        sink = self.parse("sink_profile:%s" % path, route=True)
+        self.assertEqual(sink.writer.path, path)
+        sink = self.parse("sink_profile:%s:csv" % path, route=True)
+        self.assertEqual(sink.writer.path, path)
+        self.assertEqual(sink.layout.NAME, "csv")
@@ -0,0 +1,54 @@
+from __future__ import unicode_literals
+import json
+import os
+import tempfile
+import unittest
+
+from logcatcolor.profile import Profile
+from logcatcolor.stats import PipelineStats
+
+class StatsTest(unittest.TestCase):
+    def test_sampled_timer(self):
+        stats = PipelineStats(sample_rate=4)
+        timers = []
+        for i in range(8):
+            stats.lines_read += 1
+            timers.append(stats.timer())
+
+        self.assertEqual(len([t for t in timers if t is not None]), 2)
+        timers[3].mark("parse")
+        self.assertEqual(stats.stage_samples["parse"], 1)
+
+    def test_profile_rejections(self):
+        profile = Profile(name="stats_rejections", tags=("Tag",),
+                          filters=r"keep")
+        stats = PipelineStats()
+        stats.add_profile(profile)
+
+        self.assertFalse(profile.include({"tag": "Other", "message": "keep"}))
+        self.assertFalse(profile.include({"tag": "Tag", "message": "drop"}))
+        self.assertTrue(profile.include({"tag": "Tag", "message": "keep"}))
+
+        rejections = stats.snapshot()["rejections"]["stats_rejections"]
+        self.assertEqual(rejections, {"tags": 1, "regex(keep)": 1})
+        self.assertTrue("stats_rejections/tags: 1" in stats.format_report())
+
+        order = stats.snapshot()["filter_order"]["stats_rejections"]
+        self.assertEqual([check["name"] for check in order], ["regex(keep)"])
+        self.assertTrue("filter order stats_rejections/1: regex(keep)" in
+                        stats.format_report())
+
+    def test_write_json(self):
+        stats = PipelineStats()
+        stats.lines_read = 10
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            stats.write_json(path)
+            with open(path, "rt") as f:
+                snapshot = json.loads(f.read())
+        finally:
+            os.unlink(path)
+
+        self.assertEqual(snapshot["lines_read"], 10)
+        self.assertTrue("parse" in snapshot["stage_time"])
@@ -0,0 +1,98 @@
+from __future__ import unicode_literals
+from common import MockObject
+from logcatcolor.column import DeltaColumn, ElapsedColumn
+from logcatcolor.layout import ThreadTimeLayout, BriefLayout
+from logcatcolor.timestamp import TimestampParser, TimeTracker
+import re
+import unittest
+
+def line(time, pid="123", tag="Tag"):
+    return {"date": "01-02", "time": time, "pid": pid, "tag": tag}
+
+class TimestampParserTest(unittest.TestCase):
+    def test_parse(self):
+        parser = TimestampParser(year=2020)
+        first = parser.parse("01-02", "03:04:05.100")
+        self.assertAlmostEqual(first, 1577934245.1, places=3)
+        self.assertAlmostEqual(parser.parse("01-02", "03:04:05.250") - first, 0.15, places=3)
+        self.assertAlmostEqual(parser.parse("01-02", "03:04:06.000") - first, 0.9, places=3)
+        self.assertAlmostEqual(parser.parse("01-03", "03:04:05.100") - first, 86400, places=3)
+        self.assertEqual(len(parser.cache), 3)
+
+        # out of order lines are served from the cache
+        self.assertAlmostEqual(parser.parse("01-02", "03:04:05.999") - first, 0.899, places=3)
+        self.assertEqual(len(parser.cache), 3)
+
+    def test_invalid(self):
+        parser = TimestampParser(year=2020)
+        self.assertEqual(parser.parse(None, "03:04:05.100"), None)
+        self.assertEqual(parser.parse("01-02", None), None)
+        self.assertEqual(parser.parse("junk", "03:04:05.100"), None)
+        self.assertEqual(parser.parse("01-02", "03:04:xx.100"), None)
+        self.assertAlmostEqual(parser.parse("01-02", "03:04:05"), 1577934245, places=3)
+
+    def test_new_year(self):
+        parser = TimestampParser(year=2020)
+        before = parser.parse("12-31", "23:59:59.500")
+        after = parser.parse("01-01", "00:00:00.500")
+        self.assertAlmostEqual(after - before, 1.0, places=3)
+        self.assertEqual(parser.year, 2021)
+
+class TimeTrackerTest(unittest.TestCase):
+    def test_update(self):
+        tracker = TimeTracker(TimestampParser(year=2020))
+        lines = [line("03:04:05.100"), line("03:04:05.250"),
+                 line("03:04:06.000", pid="456"), line("03:04:07.500")]
+        for data in lines:
+            tracker.update(data)
+
+        self.assertEqual([round(data["elapsed"], 3) for data in lines],
+                         [0.0, 0.15, 0.9, 2.4])
+        self.assertEqual([data["delta"] and round(data["delta"], 3)
+                          for data in lines], [None, 0.15, None, 2.25])
+
+    def test_no_time(self):
+        data = {"pid": "1", "tag": "Tag"}
+        TimeTracker().update(data)
+        self.assertEqual((data["elapsed"], data["delta"]), (None, None))
+
+    def test_bounded_keys(self):
+        tracker = TimeTracker(max_keys=2)
+        for pid in ("1", "2", "3"):
+            tracker.update(line("03:04:05.100", pid=pid))
+        self.assertEqual(list(tracker.previous.keys()),
+                         [("2", "Tag"), ("3", "Tag")])
+
+        # the least recently seen key goes first
+        tracker.update(line("03:04:05.200", pid="2"))
+        tracker.update(line("03:04:05.300", pid="4"))
+        self.assertEqual(list(tracker.previous.keys()),
+                         [("2", "Tag"), ("4", "Tag")])
+
+class TimeColumnsTest(unittest.TestCase):
+    def config(self, time_columns):
+        return MockObject(get_column_width=lambda column: column.DEFAULT_WIDTH,
+                          get_wrap=lambda: False,
+                          get_time_columns=lambda: time_columns,
+                          get_source_column=lambda: False)
+
+    def test_layout(self):
+        layout = ThreadTimeLayout(self.config(["elapsed", "delta"]))
+        names = [column.NAME for column in layout.columns]
+        self.assertEqual(names[:4], ["date", "time", "elapsed", "delta"])
+
+        data = line("03:04:05.100")
+        data.update(tid="124", priority="I", message="first")
+        layout.layout_data(data)
+
+        data = line("03:04:05.350")
+        data.update(tid="124", priority="I", message="second")
+        text = re.sub(r"\x1b\[[0-9;]*m", "", layout.layout_data(data))
+        self.assertTrue(text.startswith("01-02 03:04:05.350      0.250     +0.250"))
+
+    def test_no_time(self):
+        # layouts without a time column have nothing to compute them from
+        layout = BriefLayout(self.config(["elapsed"]))
+        self.assertFalse(any(isinstance(column, (ElapsedColumn, DeltaColumn))
+                             for column in layout.columns))
+        self.assertEqual(layout.times, None)
@@ -0,0 +1,62 @@
+from __future__ import unicode_literals
+from io import BytesIO
+from logcatcolor.top import RateCounter, TopView
+import unittest
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class RateCounterTest(unittest.TestCase):
+    def test_decay(self):
+        counter = RateCounter(half_life=1.0)
+        for i in range(10):
+            counter.add("Tag")
+        self.assertEqual(counter.tick(1.0), 10)
+        self.assertAlmostEqual(counter.rates["Tag"][0], 5.0)
+
+        # with no new lines the rate halves every half life
+        counter.tick(1.0)
+        self.assertAlmostEqual(counter.rates["Tag"][0], 2.5)
+        self.assertEqual(counter.rates["Tag"][1], 10)
+
+    def test_top(self):
+        counter = RateCounter(half_life=1.0)
+        for key, count in (("A", 1), ("B", 3), ("C", 2)):
+            for i in range(count):
+                counter.add(key)
+        counter.tick(1.0)
+        self.assertEqual([key for key, entry in counter.top(2)], ["B", "C"])
+
+    def test_forget_quiet_keys(self):
+        counter = RateCounter(half_life=1.0)
+        counter.add("A")
+        counter.tick(1.0)
+        counter.tick(10.0)
+        self.assertEqual(counter.rates, {})
+
+class TopViewTest(unittest.TestCase):
+    def test_refresh(self):
+        clock = FakeClock()
+        output = BytesIO()
+        top = TopView(output, half_life=1.0, width=60, height=10, clear=False,
+                      clock=clock)
+        for i in range(4):
+            top.add({"tag": "Busy", "pid": "123", "priority": "D"})
+        top.add({"tag": "Quiet", "pid": "456", "priority": "E"})
+
+        clock.now = 1.0
+        top.refresh()
+        text = output.getvalue().decode("utf-8")
+        lines = text.splitlines()
+        self.assertTrue("5 lines, 2 tags, 2 pids" in lines[0])
+        self.assertTrue("D 2.0/s" in lines[1])
+
+        # only 2 rows each for tags and pids fit in 10 lines
+        self.assertTrue(lines[4].endswith("Busy"))
+        self.assertTrue(lines[5].endswith("Quiet"))
+        self.assertTrue(lines[7].endswith("123"))
+        self.assertTrue(all(len(line) <= 60 for line in lines[3:]))